@@ -4,5 +4,6 @@ from flask import Blueprint
 chat_bp = Blueprint('chat', __name__, url_prefix='/api')
 health_bp = Blueprint('health', __name__, url_prefix='/api')
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')  # tambahkan ini
+metrics_bp = Blueprint('metrics', __name__)  # /metrics untuk Prometheus
 
-from . import chat, health, admin  # tambahkan 'admin'
\ No newline at end of file
+from . import chat, health, admin, metrics
\ No newline at end of file
@@ -5,10 +5,14 @@ Protected by ADMIN_SECRET_KEY from environment.
 """
 
 import os
-from flask import request, jsonify
+from flask import request, jsonify, Response
 from . import admin_bp
-from app.redis_manager import redis_client
-import json
+from app.config import settings
+from app.redis_manager import (
+    redis_client, clear_local_caches, publish_cache_invalidation, decode_history, get_summary, get_task_status,
+)
+from app.utils import profiler
+from app.core import faq, prewarm
 
 def require_admin_auth():
     """Middleware sederhana: cek secret key di header."""
@@ -29,7 +33,7 @@ def get_stats():
 
     try:
         # Hitung jumlah user unik (approximasi via Redis keys)
-        chat_keys = redis_client.keys("chat:*")
+        chat_keys = [key for key in redis_client.keys("chat:*") if not key.endswith(b":summary")]
         user_count = len(chat_keys)
 
         # Hitung cache hit/miss (jika Anda simpan counter - opsional)
@@ -55,15 +59,75 @@ def reset_cache():
 
     try:
         # Hanya hapus key yang terkait cache, bukan riwayat
-        cache_keys = redis_client.keys("rag:resp:*")
+        cache_keys = redis_client.keys("rag:resp:*") + redis_client.keys("rag:search:*")
         for key in cache_keys:
             redis_client.delete(key)
-        return jsonify({
-            'message': f'Cache berhasil direset. {len(cache_keys)} entri dihapus.'
-        })
+        clear_local_caches()
+        # Worker lain mengosongkan cache L1 masing-masing
+        receivers = publish_cache_invalidation('reset')
     except Exception as e:
         return jsonify({'error': f'Gagal reset cache: {str(e)}'}), 500
 
+    result = {
+        'message': f'Cache berhasil direset. {len(cache_keys)} entri dihapus.',
+        'workers_notified': receivers,
+    }
+    # ?prewarm=1: langsung isi ulang pertanyaan terpopuler di latar
+    if request.args.get('prewarm') in ('1', 'true'):
+        try:
+            prewarm.start_background_prewarm(
+                [settings.QUERY_LOG_PATH], settings.PREWARM_TOP_N, settings.PREWARM_RATE_PER_MINUTE
+            )
+            result['prewarm'] = 'started'
+        except (ValueError, OSError) as e:
+            result['prewarm'] = f'tidak dimulai: {str(e)}'
+    return jsonify(result)
+
+@admin_bp.route('/cache/prewarm', methods=['POST'])
+def start_prewarm():
+    """
+    Panaskan cache jawaban dari log query (QUERY_LOG_PATH) di thread latar
+    worker ini. Progres dibaca lewat GET /cache/prewarm dari worker mana pun.
+    """
+    auth_error = require_admin_auth()
+    if auth_error:
+        return auth_error
+
+    try:
+        top_n = int(request.args.get('top', settings.PREWARM_TOP_N))
+        rate = float(request.args.get('rate', settings.PREWARM_RATE_PER_MINUTE))
+    except ValueError:
+        return jsonify({'error': 'Parameter top/rate harus angka'}), 400
+    top_n = min(max(top_n, 1), 500)
+    rate = min(max(rate, 0.1), 120.0)
+    force = request.args.get('force') in ('1', 'true')
+
+    if not os.path.exists(settings.QUERY_LOG_PATH):
+        return jsonify({'error': f'Log query tidak ditemukan: {settings.QUERY_LOG_PATH}'}), 400
+    try:
+        prewarm.start_background_prewarm([settings.QUERY_LOG_PATH], top_n, rate, force=force)
+    except ValueError as e:
+        return jsonify({'error': str(e), 'status': get_task_status(prewarm.TASK_NAME)}), 409
+    except Exception as e:
+        return jsonify({'error': f'Gagal memulai pemanasan cache: {str(e)}'}), 500
+
+    return jsonify({
+        'pid': os.getpid(),
+        'top': top_n,
+        'rate_per_minute': rate,
+        'force': force,
+        'status_url': f"{admin_bp.url_prefix}/cache/prewarm",
+    }), 202
+
+@admin_bp.route('/cache/prewarm', methods=['GET'])
+def prewarm_status():
+    """Status pemanasan cache terakhir (berjalan / selesai / dihentikan)."""
+    auth_error = require_admin_auth()
+    if auth_error:
+        return auth_error
+
+    return jsonify(get_task_status(prewarm.TASK_NAME) or {'state': 'never_run'})
+
 @admin_bp.route('/history/<user_id>', methods=['GET'])
 def get_user_history(user_id):
     """Lihat riwayat percakapan user (untuk debugging)."""
@@ -74,10 +138,164 @@ def get_user_history(user_id):
     try:
         key = f"chat:{user_id}"
         raw = redis_client.lrange(key, 0, -1)
-        history = [json.loads(item) for item in raw]
+        history = decode_history(raw)
         return jsonify({
             'user_id': user_id,
-            'history': history
+            'history': history,
+            'summary': get_summary(user_id),
         })
     except Exception as e:
-        return jsonify({'error': f'Gagal ambil riwayat: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'Gagal ambil riwayat: {str(e)}'}), 500
+# ===================================================================
+# PROFILING ON-DEMAND (CPU & MEMORI)
+# ===================================================================
+@admin_bp.route('/profile', methods=['POST'])
+def start_profile():
+    """
+    Jalankan sampler stack di worker yang melayani permintaan ini selama N detik.
+    Hasil diambil lewat GET /profile/<profile_id> setelah selesai.
+    """
+    auth_error = require_admin_auth()
+    if auth_error:
+        return auth_error
+
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval', 0.005))
+    except ValueError:
+        return jsonify({'error': 'Parameter seconds/interval harus angka'}), 400
+    seconds = min(max(seconds, 1.0), settings.PROFILE_MAX_SECONDS)
+    interval = min(max(interval, 0.001), 1.0)
+
+    try:
+        profile_id = profiler.start_stack_sampler(settings.PROFILE_DIR, seconds, interval)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': f'Gagal memulai profiling: {str(e)}'}), 500
+
+    return jsonify({
+        'profile_id': profile_id,
+        'pid': os.getpid(),
+        'seconds': seconds,
+        'interval': interval,
+        'result_url': f"{admin_bp.url_prefix}/profile/{profile_id}",
+    }), 202
+
+@admin_bp.route('/profile/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Collapsed stacks (format flamegraph.pl / speedscope) dari satu sesi profiling."""
+    auth_error = require_admin_auth()
+    if auth_error:
+        return auth_error
+
+    if not all(c.isalnum() or c == '-' for c in profile_id):
+        return jsonify({'error': 'profile_id tidak valid'}), 400
+    path = profiler.profile_path(settings.PROFILE_DIR, profile_id)
+    if not os.path.exists(path):
+        return jsonify({'status': 'pending', 'profile_id': profile_id}), 404
+    with open(path, encoding='utf-8') as f:
+        return Response(f.read(), content_type='text/plain; charset=utf-8')
+
+@admin_bp.route('/memory/snapshot', methods=['POST'])
+def memory_snapshot():
+    """
+    Ambil snapshot tracemalloc di worker ini (dua terakhir per PID disimpan).
+    Snapshot pertama menyalakan tracing, snapshot kedua mematikannya.
+    """
+    auth_error = require_admin_auth()
+    if auth_error:
+        return auth_error
+
+    try:
+        return jsonify(profiler.take_snapshot(settings.PROFILE_DIR, max_seconds=settings.MEMORY_TRACE_MAX_SECONDS))
+    except Exception as e:
+        return jsonify({'error': f'Gagal mengambil snapshot: {str(e)}'}), 500
+
+@admin_bp.route('/memory/snapshot', methods=['DELETE'])
+def memory_snapshot_stop():
+    """Matikan tracemalloc di worker ini tanpa menunggu snapshot kedua."""
+    auth_error = require_admin_auth()
+    if auth_error:
+        return auth_error
+
+    return jsonify({'pid': os.getpid(), 'stopped': profiler.stop_tracing()})
+
+@admin_bp.route('/memory/diff', methods=['GET'])
+def memory_diff():
+    """Pertumbuhan memori di antara dua snapshot terakhir sebuah worker (?pid=, default worker ini)."""
+    auth_error = require_admin_auth()
+    if auth_error:
+        return auth_error
+
+    try:
+        pid = int(request.args.get('pid', os.getpid()))
+        limit = min(int(request.args.get('limit', 20)), 200)
+    except ValueError:
+        return jsonify({'error': 'Parameter pid/limit harus bilangan bulat'}), 400
+    key_type = request.args.get('group_by', 'lineno')
+    if key_type not in ('lineno', 'filename', 'traceback'):
+        return jsonify({'error': "group_by harus 'lineno', 'filename' atau 'traceback'"}), 400
+
+    try:
+        return jsonify(profiler.diff_snapshots(settings.PROFILE_DIR, pid, limit, key_type))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': f'Gagal membandingkan snapshot: {str(e)}'}), 500
+
+# ===================================================================
+# FAQ JAWABAN LANGSUNG
+# ===================================================================
+@admin_bp.route('/faq/reload', methods=['POST'])
+def reload_faq():
+    """
+    Muat ulang FAQ_PATH di worker ini seketika. Worker lain membaca perubahan
+    file sendiri (cek mtime tiap FAQ_REFRESH_SECONDS).
+    """
+    auth_error = require_admin_auth()
+    if auth_error:
+        return auth_error
+
+    try:
+        index = faq.reload_faq_index()
+    except ValueError as e:
+        return jsonify({'error': f'File FAQ tidak valid, indeks lama tetap dipakai: {str(e)}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Gagal memuat ulang FAQ: {str(e)}'}), 500
+
+    return jsonify({
+        'message': 'FAQ dimuat ulang.',
+        'pid': os.getpid(),
+        'entries': len(index),
+        'variants': len(index.owners),
+        'other_workers_within_seconds': settings.RAG.FAQ_REFRESH_SECONDS,
+    })
+
+@admin_bp.route('/faq/match', methods=['GET'])
+def match_faq():
+    """Variasi FAQ terdekat untuk ?q= beserta skornya (untuk kurasi variasi & threshold)."""
+    auth_error = require_admin_auth()
+    if auth_error:
+        return auth_error
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': "Parameter q wajib diisi"}), 400
+
+    _, query_vec = faq.lookup_faq(query)
+    if query_vec is None:
+        return jsonify({'error': 'Embedder tidak tersedia'}), 503
+    index = faq.get_faq_index()
+    nearest = index.nearest(query_vec)
+    if nearest is None:
+        return jsonify({'query': query, 'match': None})
+    best, score = nearest
+    conflict = index.conflict(query, best)
+    return jsonify({
+        'query': query,
+        'match': {'id': index.entries[index.owners[best]]['id'], 'variant': index.variants[best], 'score': round(score, 4)},
+        'threshold': settings.RAG.FAQ_MATCH_THRESHOLD,
+        'conflict': conflict,
+        'would_answer': score >= settings.RAG.FAQ_MATCH_THRESHOLD and conflict is None,
+    })
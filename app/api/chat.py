@@ -2,54 +2,141 @@
 Chat API endpoints - inti dari chatbot RAG.
 """
 
+import hmac
+import json
+import math
+import time
 import uuid
 import logging
-from flask import request, jsonify, session
+from flask import request, jsonify, session, g, Response, stream_with_context
 from . import chat_bp
 from app.config import settings
 from app.redis_manager import (
     get_history,
+    get_summary,
     save_history,
     get_cached_response,
     cache_response,
-    REDIS_AVAILABLE,
-    redis_client
+    check_rate_limit,
 )
-from app.core.main import search_qdrant, construct_prompt, ask_gemini
+from app.core.main import (
+    search_qdrant,
+    filter_relevant,
+    construct_prompt,
+    ask_gemini,
+    build_extractive_answer,
+    is_time_sensitive,
+    is_borderline,
+    start_speculative_search,
+    collect_speculative_search,
+    discard_speculative_search,
+    format_web_context,
+    collect_sources,
+    build_rag_context,
+)
+from app.core.resilience import start_deadline, end_deadline, UpstreamUnavailable
+from app.core.admission import get_admission_controller, parse_request_start
+from app.core.faq import lookup_faq
+from app.core.batch import answer_batch, acquire_batch_slot, release_batch_slot, expected_batch_seconds
+from app.core.summarizer import build_history_context, schedule_summary
 from app.utils.validators import validate_query
+from app.metrics import observe_stage, record_cache, record_fallback, record_upstream, record_admission, STAGE_SECONDS
+from app.tracing import begin_trace, end_trace, server_timing_header, current_trace_attrs, log_query
 
 logger = logging.getLogger(__name__)
 
 
 def is_rate_limited(user_id: str, max_requests: int = 5, window_seconds: int = 60) -> bool:
-    """Rate limiting sederhana berbasis Redis."""
-    if not REDIS_AVAILABLE:
-        return False
-    key = f"rate_limit:{user_id}"
-    current = redis_client.get(key)
-    if current is None:
-        redis_client.setex(key, window_seconds, 1)
-        return False
-    elif int(current) < max_requests:
-        redis_client.incr(key)
-        return False
-    else:
-        return True
+    """Rate limiting sederhana berbasis Redis (fallback hitungan lokal per worker saat Redis down)."""
+    return check_rate_limit(user_id, max_requests, window_seconds)
+
+
+def _partner_id(api_key: str):
+    """Indeks kunci partner di BATCH_API_KEYS (dipakai sebagai id rate limit), atau None."""
+    keys = [key.strip() for key in settings.BATCH_API_KEYS.split(',') if key.strip()]
+    for i, key in enumerate(keys):
+        if api_key and hmac.compare_digest(api_key.encode(), key.encode()):
+            return i
+    return None
+
+
+def _save_turn(user_id: str, user_query: str, answer: str):
+    save_history(user_id, user_query, answer)
+    # Ringkasan diperbarui setelah respons terkirim (lihat _observe_request)
+    g.summarize_user = user_id
+
+
+@chat_bp.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+    g.trace_token = begin_trace(f"chat.{request.endpoint.rsplit('.', 1)[-1]}")
+    # Waktu antre di depan worker (header dari nginx) ikut memotong anggaran permintaan
+    g.queue_delay = parse_request_start(request.headers.get('X-Request-Start'))
+    if g.queue_delay:
+        STAGE_SECONDS.labels(stage='queue').observe(g.queue_delay)
+        current_trace_attrs(queue_ms=round(g.queue_delay * 1000, 1))
+    g.deadline_token = start_deadline(settings.REQUEST_DEADLINE_SECONDS - g.queue_delay)
+
+
+@chat_bp.after_request
+def _observe_request(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        STAGE_SECONDS.labels(stage='request').observe(time.perf_counter() - started)
+    # Penolakan admission control bukan error; tanpa ini setiap 503 saat beban lebih ikut disimpan
+    shed = g.pop('shed', False)
+
+    token = g.pop('trace_token', None)
+    if token is not None:
+        trace = token.var.get()
+        trace.attrs['status'] = response.status_code
+        error = f"HTTP {response.status_code}" if response.status_code >= 500 and not shed else None
+        end_trace(token, error=error)
+        response.headers['X-Trace-Id'] = trace.trace_id
+        if settings.TRACE_SERVER_TIMING:
+            response.headers['Server-Timing'] = server_timing_header(trace)
+
+    # Log query tanpa sampling untuk prewarm (permintaan yang ditolak pun tetap permintaan)
+    logged_query = g.pop('logged_query', None)
+    if logged_query is not None:
+        log_query(logged_query, status=response.status_code)
+
+    summarize_user = g.pop('summarize_user', None)
+    if summarize_user is not None:
+        response.call_on_close(lambda: schedule_summary(summarize_user))
+    return response
+
+
+@chat_bp.teardown_request
+def _end_unfinished_trace(exc):
+    end_deadline(g.pop('deadline_token', None))
+    admitted_at = g.pop('admitted_at', None)
+    if admitted_at is not None:
+        get_admission_controller().release(time.perf_counter() - admitted_at)
+    # Jika after_request tidak berjalan (exception tak tertangkap), trace tetap ditutup
+    token = g.pop('trace_token', None)
+    if token is not None:
+        end_trace(token, error=f"{type(exc).__name__}: {exc}" if exc else "aborted")
 
 
 @chat_bp.route('/ask', methods=['POST'])
 def ask():
     try:
         # === 1. Validasi input ===
-        data = request.get_json()
-        if not data:
-            return jsonify({'error': 'Body harus berupa JSON.'}), 400
+        with observe_stage('validate'):
+            data = request.get_json()
+            if not data:
+                return jsonify({'error': 'Body harus berupa JSON.'}), 400
 
-        user_query = data.get('query', '').strip()
-        if not validate_query(user_query):
-            return jsonify({'error': 'Pertanyaan minimal 3 karakter.'}), 400
+            user_query = data.get('query', '').strip()
+            current_trace_attrs(query=user_query)
+            if not validate_query(user_query):
+                return jsonify({'error': 'Pertanyaan minimal 3 karakter.'}), 400
+            g.logged_query = user_query
 
-        if is_rate_limited(session.get('user_id', str(uuid.uuid4()))):
+        with observe_stage('rate_limit'):
+            limited = is_rate_limited(session.get('user_id', str(uuid.uuid4())))
+        if limited:
             return jsonify({'error': 'Terlalu banyak permintaan. Silakan coba lagi nanti.'}), 429
 
         # === 2. Session & cache ===
@@ -58,60 +145,126 @@ def ask():
         user_id = session['user_id']
 
         # Cek cache terlebih dahulu
-        cached = get_cached_response(user_query)
+        with observe_stage('cache_lookup'):
+            cached = get_cached_response(user_query)
+        record_cache('response', bool(cached))
+        current_trace_attrs(cache_hit=bool(cached))
         if cached:
-            save_history(user_id, user_query, cached)
+            _save_turn(user_id, user_query, cached)
             return jsonify({'answer': cached})
 
-        # === 3. Riwayat percakapan (aman dari None) ===
-        history = get_history(user_id, limit=5) or []
-        history_text = "\n".join([
-            f"User: {h['user']}\nAI: {h['ai']}" for h in history
-        ]) if history else ""
+        # === 2b. FAQ jawaban langsung (tanpa Qdrant & LLM, tidak di-cache) ===
+        query_vec = None
+        if settings.RAG.FAQ_ENABLED:
+            with observe_stage('faq'):
+                faq_match, query_vec = lookup_faq(user_query)
+            record_cache('faq', faq_match is not None)
+            if faq_match:
+                entry, score, variant = faq_match
+                logger.info(f"[FAQ] '{user_query}' cocok dengan '{variant}' (skor {score:.3f})")
+                current_trace_attrs(faq_id=entry['id'], faq_score=round(score, 3))
+                _save_turn(user_id, user_query, entry['answer'])
+                if entry['sources']:
+                    return jsonify({'answer': entry['answer'], 'sources': entry['sources']})
+                return jsonify({'answer': entry['answer']})
+
+        # === 2c. Admission control (cache hit & FAQ di atas selalu dilayani) ===
+        if settings.ADMISSION_ENABLED:
+            admitted, retry_after = get_admission_controller().try_admit(g.queue_delay)
+            record_admission(admitted)
+            if not admitted:
+                logger.warning(f"[ADMISSION] Ditolak: perkiraan tunggu melebihi {settings.ADMISSION_MAX_WAIT_SECONDS} detik")
+                return _busy_response(retry_after)
+            g.admitted_at = time.perf_counter()
 
-        # === 4. RAG: Cari di Qdrant ===
-        retrieved_results = search_qdrant(user_query, top_k=3)
+        # === 3. Riwayat percakapan: ringkasan berjalan + giliran yang belum diringkas ===
+        with observe_stage('history'):
+            history = get_history(user_id, limit=5) or []
+            summary = get_summary(user_id) if settings.SUMMARY_ENABLED and history else None
+        history_text = build_history_context(summary, history)
+
+        # === 4. RAG: Cari di Qdrant (Custom Search spekulatif sejajar untuk query peka waktu) ===
+        speculative = None
+        if settings.SPECULATIVE_SEARCH_ENABLED and is_time_sensitive(user_query):
+            speculative = start_speculative_search(user_query)
+        retrieved_results = search_qdrant(user_query, top_k=settings.RAG.TOP_K_RETRIEVAL, query_vec=query_vec)
 
         # === 5. Evaluasi relevansi & keputusan Google Search ===
         rag_context = ""
+        sources = []
+        relevant_docs = []
         enable_google_search = False
 
         if retrieved_results:
-            # Filter berdasarkan threshold relevansi
-            relevant_docs = [
-                doc for doc in retrieved_results
-                if doc.get("score", 0) > settings.RAG.RAG_RELEVANCE_THRESHOLD
-            ]
+            # Filter berdasarkan threshold relevansi (atau kecocokan leksikal)
+            relevant_docs = filter_relevant(retrieved_results)
             if relevant_docs:
-                rag_context = "\n".join([doc["text"] for doc in relevant_docs])
+                rag_context = build_rag_context(user_query, relevant_docs, query_vec)
+                sources = collect_sources(relevant_docs)
                 logger.info("[RAG] Konteks relevan ditemukan. Google Search dinonaktifkan.")
                 enable_google_search = False
             else:
                 logger.warning("[RAG] Hasil ditemukan tetapi tidak relevan. Mengaktifkan Google Search.")
                 enable_google_search = True
+                record_fallback('below_threshold')
         else:
             logger.warning("[RAG] Tidak ada hasil dari Qdrant. Mengaktifkan Google Search.")
             enable_google_search = True
+            record_fallback('no_results')
+
+        # === 5b. Pencarian web spekulatif: hasil langsung masuk prompt, tanpa round trip tool ===
+        web_context = ""
+        if settings.SPECULATIVE_SEARCH_ENABLED:
+            needs_web = enable_google_search or is_borderline(relevant_docs)
+            if needs_web and speculative is None:
+                speculative = start_speculative_search(user_query)
+            if speculative is not None and needs_web:
+                with observe_stage('speculative_wait'):
+                    web_context = format_web_context(collect_speculative_search(speculative))
+                record_upstream('custom_search', 'speculative_used' if web_context else 'speculative_empty')
+                if web_context:
+                    enable_google_search = False
+            elif speculative is not None:
+                # Konteks internal kuat: batalkan, atau biarkan selesai ke cache pencarian
+                discard_speculative_search(speculative)
+                record_upstream('custom_search', 'speculative_discarded')
 
         # === 6. Bangun prompt ===
-        system_prompt, user_prompt = construct_prompt(
-            user_query=user_query,
-            rag_context=rag_context,
-            conversation_history=history_text
-        )
+        with observe_stage('prompt_build'):
+            system_prompt, user_prompt = construct_prompt(
+                user_query=user_query,
+                rag_context=rag_context,
+                conversation_history=history_text,
+                web_context=web_context,
+            )
 
         # === 7. Panggil LLM utama ===
-        answer = ask_gemini(
-            system_prompt=system_prompt,
-            user_prompt=user_prompt,
-            rag_context=rag_context,
-            enable_google_search=enable_google_search
-        )
+        try:
+            answer = ask_gemini(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                rag_context=rag_context,
+                enable_google_search=enable_google_search
+            )
+        except UpstreamUnavailable as e:
+            # Gemini sakit/lambat: jangan tahan worker. Dengan konteks RAG yang relevan,
+            # kembalikan kutipan ekstraktif (tidak di-cache); tanpa konteks, 503 cepat.
+            logger.warning(f"[LLM] Upstream tidak tersedia: {e}")
+            if not relevant_docs:
+                response = jsonify({'error': 'Layanan sedang sibuk. Silakan coba lagi sebentar lagi.'})
+                response.headers['Retry-After'] = str(int(e.retry_after))
+                return response, 503
+            record_upstream('gemini', 'degraded')
+            answer = build_extractive_answer(user_query, relevant_docs)
+            _save_turn(user_id, user_query, answer)
+            return jsonify({'answer': answer, 'sources': sources, 'degraded': True})
 
         # === 8. Simpan cache & riwayat ===
         cache_response(user_query, answer, ttl=3600)  # Cache 1 jam
-        save_history(user_id, user_query, answer)
+        _save_turn(user_id, user_query, answer)
 
+        if sources:
+            return jsonify({'answer': answer, 'sources': sources})
         return jsonify({'answer': answer})
 
     except ValueError as e:
@@ -128,4 +281,77 @@ def ask():
         logger.error(f"Error tak terduga di /ask: {e}", exc_info=True)
         return jsonify({
             'error': 'Terjadi gangguan teknis. Tim sedang memperbaiki.'
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+@chat_bp.route('/ask/batch', methods=['POST'])
+def ask_batch():
+    """
+    Jawab daftar pertanyaan partner; body {"queries": [...]}, header X-API-Key.
+    Respons NDJSON yang mengalir: satu baris per pertanyaan begitu selesai
+    (lihat app/core/batch.py), diakhiri {"done": true, ...}.
+    """
+    if not settings.BATCH_API_KEYS.strip():
+        return jsonify({'error': 'Batch API tidak diaktifkan.'}), 404
+    partner = _partner_id(request.headers.get('X-API-Key', ''))
+    if partner is None:
+        return jsonify({'error': 'Akses ditolak'}), 403
+
+    data = request.get_json(silent=True) or {}
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not queries:
+        return jsonify({'error': "Body harus berupa JSON dengan daftar 'queries'."}), 400
+    if len(queries) > settings.BATCH_MAX_QUESTIONS:
+        return jsonify({'error': f'Maksimal {settings.BATCH_MAX_QUESTIONS} pertanyaan per permintaan.'}), 400
+
+    if is_rate_limited(f"batch:{partner}", settings.BATCH_RATE_LIMIT_PER_MINUTE, 60):
+        return jsonify({'error': 'Terlalu banyak permintaan. Silakan coba lagi nanti.'}), 429
+    current_trace_attrs(partner=partner, batch_size=len(queries))
+
+    # Satu batch per worker, dan durasinya dipesan di admission controller /api/ask
+    controller = get_admission_controller()
+    if not acquire_batch_slot():
+        return _busy_response(max(1, math.ceil(controller.stats()['reserved_s'])))
+    reservation = None
+    if settings.ADMISSION_ENABLED:
+        reservation, retry_after = controller.reserve(
+            expected_batch_seconds(len(queries), controller.service_ewma), g.queue_delay)
+        record_admission(reservation is not None)
+        if reservation is None:
+            release_batch_slot()
+            return _busy_response(retry_after)
+
+    released = []
+
+    def release():
+        if not released:  # call_on_close bisa terpanggil lebih dari sekali
+            released.append(True)
+            controller.unreserve(reservation)
+            release_batch_slot()
+
+    def generate():
+        started = time.perf_counter()
+        answered = failed = 0
+        for item in answer_batch(queries):
+            if 'error' in item:
+                failed += 1
+            else:
+                answered += 1
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info(f"[BATCH] Partner {partner}: {answered} terjawab, {failed} gagal dalam {elapsed_ms} ms")
+        yield json.dumps({'done': True, 'answered': answered, 'failed': failed, 'elapsed_ms': elapsed_ms}) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: kirim tiap baris segera
+    # Dilepas saat respons ditutup: selesai mengalir, klien putus, atau generator tidak pernah dimulai
+    response.call_on_close(release)
+    return response
+
+
+def _busy_response(retry_after: int):
+    g.shed = True
+    current_trace_attrs(shed=True)
+    response = jsonify({'error': 'Layanan sedang sibuk. Silakan coba lagi sebentar lagi.'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 503
@@ -6,8 +6,10 @@ Health check endpoints for monitoring and readiness probes.
 from flask import jsonify
 from . import health_bp
 from app.config import settings
-from app.redis_manager import redis_client, REDIS_AVAILABLE
+from app.redis_manager import redis_client, is_redis_available, redis_health
 from app.rag_initializer import get_runtime_components
+from app.core.resilience import breaker_states
+from app.core.admission import get_admission_controller
 
 @health_bp.route('/health', methods=['GET'])
 def health_check():
@@ -19,7 +21,8 @@ def health_check():
     }
 
     # --- Cek Redis (gunakan klien yang sama dengan aplikasi) ---
-    if REDIS_AVAILABLE and redis_client is not None:
+    # Saat down, cache/riwayat/limiter dilayani fallback lokal sambil reconnect di latar
+    if is_redis_available():
         try:
             redis_client.ping()
             checks['redis'] = 'ok'
@@ -27,7 +30,8 @@ def health_check():
             checks['redis'] = 'down'
             checks['redis_error'] = str(e)
     else:
-        checks['redis'] = 'disabled'
+        checks['redis'] = 'fallback'
+    checks['redis_state'] = redis_health()
 
     # --- Cek Qdrant (gunakan klien dari rag_initializer) ---
     try:
@@ -39,6 +43,10 @@ def health_check():
         checks['qdrant'] = 'down'
         checks['qdrant_error'] = str(e)
 
+    # --- Circuit breaker upstream (per worker; informatif, tidak memengaruhi status) ---
+    checks['circuits'] = breaker_states()
+    checks['admission'] = get_admission_controller().stats()
+
     # --- Status HTTP ---
     # Redis opsional, jadi hanya Qdrant + App yang wajib
     healthy = (checks['qdrant'] == 'ok')
@@ -0,0 +1,13 @@
+# app/api/metrics.py
+"""
+Endpoint Prometheus. Diblokir dari publik di nginx; di-scrape dari localhost.
+"""
+
+from flask import Response
+from . import metrics_bp
+from app.metrics import render_metrics
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
@@ -46,10 +46,11 @@ def create_app():
         app.logger.warning(f"RAG system offline: {e}")
 
     # --- Blueprints ---
-    from app.api import chat_bp, health_bp, admin_bp
+    from app.api import chat_bp, health_bp, admin_bp, metrics_bp
     app.register_blueprint(chat_bp)
     app.register_blueprint(health_bp)  # tetap di /health
     app.register_blueprint(admin_bp)   # tetap di /admin
+    app.register_blueprint(metrics_bp)  # /metrics (Prometheus)
 
     app.logger.info("Application started")
     return app
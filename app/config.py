@@ -1,5 +1,6 @@
 # app/config.py
 import sys
+from typing import Optional
 from pydantic_settings import BaseSettings
 from pydantic import Field, ValidationError
 from dotenv import load_dotenv
@@ -8,11 +9,40 @@ load_dotenv()  # Cukup sekali di sini
 
 class RAGSettings(BaseSettings):
     EMBEDDING_MODEL_NAME: str = Field(default="firqaaa/indo-sentence-bert-base")
+    EMBEDDING_QUANTIZED: bool = Field(default=False)  # encoder query int8 (dynamic quantization, CPU)
     QDRANT_URL: str
     QDRANT_API_KEY: str
     TOP_K_RETRIEVAL: int = Field(default=3)
-    COLLECTION_NAME: str = Field(default="uin_knowledge_base") 
+    CHUNK_MAX_SIZE: int = Field(default=512)  # karakter per chunk saat ingestion
+    CHUNK_OVERLAP: int = Field(default=64)
+    COLLECTION_NAME: str = Field(default="uin_knowledge_base")  # nama alias, bukan collection fisik
+    COLLECTION_KEEP_VERSIONS: int = Field(default=3)  # versi lama yang disimpan untuk rollback
+    COLLECTION_ALIAS_REFRESH_SECONDS: int = Field(default=30)
     RAG_RELEVANCE_THRESHOLD: float = Field(default=0.8)  
+    RAG_LEAN_RETRIEVAL: bool = Field(default=True)  # skor & threshold dari server, tanpa transfer vektor
+    RAG_SLIM_PAYLOAD: bool = Field(default=False)  # teks chunk di docstore lokal, bukan di payload Qdrant
+    DOCSTORE_PATH: str = Field(default="data/docstore.sqlite3")
+    INDEX_DIR: str = Field(default="data/index")  # artefak per versi collection (BM25, dst.)
+    RAG_HYBRID_RETRIEVAL: bool = Field(default=False)  # BM25 + dense, digabung dengan RRF
+    RAG_HYBRID_CANDIDATES: int = Field(default=20)
+    RAG_RRF_K: int = Field(default=60)
+    RAG_LEXICAL_MATCH_RATIO: float = Field(default=0.7)  # kecocokan leksikal yang dianggap relevan
+    RAG_LEXICAL_MIN_TERMS: int = Field(default=2)  # term query yang harus cocok agar lolos tanpa threshold dense
+    RAG_LEXICAL_MIN_DENSE_SCORE: float = Field(default=0.5)  # ...atau skor dense minimum (mis. query satu akronim)
+    EMBED_CACHE_MAX_ENTRIES: int = Field(default=1024)  # vektor query per worker, kunci canonical_text; 0 = nonaktif
+    RAG_TOPIC_ROUTING: bool = Field(default=False)  # persempit pencarian dense ke satu kategori (app/core/topics.py)
+    RAG_TOPIC_MARGIN: float = Field(default=0.05)   # selisih skor minimum kategori teratas vs kedua
+    RAG_TOPIC_KEYWORD_WEIGHT: float = Field(default=0.05)  # tambahan skor per kata kunci kategori (maks 2)
+    RAG_EMBEDDING_DIM: int = Field(default=0)  # ingestion: proyeksi PCA ke dimensi ini (app/core/projection.py); 0 = penuh
+    RAG_BINARY_QUANTIZATION: bool = Field(default=False)  # ingestion: vektor biner di RAM, asli di disk (hanya dengan proyeksi)
+    RAG_QUANTIZATION_OVERSAMPLING: float = Field(default=3.0)  # kandidat tahap biner = top_k x nilai ini
+    RAG_CONTEXT_COMPRESSION: bool = Field(default=False)  # konteks = kalimat paling mirip query saja (compress_context)
+    RAG_CONTEXT_BUDGET_CHARS: int = Field(default=700)  # batas karakter konteks internal setelah kompresi
+    CONTEXT_SENTENCE_CACHE_CHUNKS: int = Field(default=512)  # vektor kalimat per chunk, per worker
+    FAQ_ENABLED: bool = Field(default=True)
+    FAQ_PATH: str = Field(default="data/faq.jsonl")  # variasi pertanyaan + jawaban yang disetujui
+    FAQ_MATCH_THRESHOLD: float = Field(default=0.92)  # sengaja ketat; tambah variasi, jangan turunkan
+    FAQ_REFRESH_SECONDS: int = Field(default=30)
 class AppConfig(BaseSettings):
     GEMINI_API_KEY: str
     GEMINI_MODEL_NAME: str = Field(default="gemini-2.5-flash")
@@ -22,6 +52,70 @@ class AppConfig(BaseSettings):
     FLASK_SECRET_KEY: str = Field(min_length=16)
     ADMIN_SECRET_KEY: str = Field(min_length=16)
     RAG: RAGSettings = Field(default_factory=RAGSettings) 
+    # --- Redis (lihat app/redis_manager.py) ---
+    REDIS_SOCKET_TIMEOUT: float = Field(default=1.0)       # detik; gagal cepat lalu pindah ke fallback lokal
+    REDIS_FALLBACK_MAX_ENTRIES: int = Field(default=2000)  # per struktur lokal, per worker
+    RESPONSE_L1_MAX_ENTRIES: int = Field(default=256)      # cache jawaban in-process di depan Redis, per worker
+    RESPONSE_L1_TTL_SECONDS: float = Field(default=60)     # 0 = L1 nonaktif
+    CACHE_CANONICAL_KEYS: bool = Field(default=True)       # kunci cache jawaban/pencarian dari canonical_key (app/utils/text.py)
+    CACHE_INVALIDATION_CHANNEL: str = Field(default="rag:cache:invalidate")  # pub/sub reset cache & reindex
+    COMPACT_STORAGE_ENABLED: bool = Field(default=True)    # tulis riwayat & jawaban cache sebagai msgpack+zstd
+    COMPACT_DICT_PATH: str = Field(default="data/redis_codec.dict")  # kamus zstd bersama (scripts/bench_storage.py --save-dict)
+    COMPACT_ZSTD_LEVEL: int = Field(default=3)
+    COMPACT_MIN_COMPRESS_BYTES: int = Field(default=64)    # nilai lebih kecil disimpan msgpack polos
+    # --- Endpoint layanan eksternal (override untuk load test / staging) ---
+    GEMINI_API_ENDPOINT: Optional[str] = Field(default=None)  # mis. http://127.0.0.1:9100 (transport REST)
+    GOOGLE_SEARCH_URL: str = Field(default="https://www.googleapis.com/customsearch/v1")
+    # --- Tracing (lihat app/tracing.py) ---
+    TRACE_ENABLED: bool = Field(default=True)
+    TRACE_LOG_PATH: str = Field(default="logs/traces.jsonl")
+    TRACE_SAMPLE_RATE: float = Field(default=0.01)  # porsi permintaan normal yang disimpan
+    TRACE_SLOW_MS: float = Field(default=3000)      # permintaan selambat ini selalu disimpan
+    TRACE_SERVER_TIMING: bool = Field(default=False)  # header Server-Timing (aktifkan di staging)
+    QUERY_LOG_ENABLED: bool = Field(default=True)
+    QUERY_LOG_PATH: str = Field(default="logs/queries.jsonl")  # satu baris per /api/ask valid, tanpa sampling (sumber prewarm)
+    # --- Ketahanan upstream (lihat app/core/resilience.py) ---
+    REQUEST_DEADLINE_SECONDS: float = Field(default=25)  # jauh di bawah timeout gunicorn/nginx 90 detik
+    LLM_TIMEOUT_SECONDS: float = Field(default=20)       # batas satu round trip Gemini
+    LLM_HEDGE_AFTER_SECONDS: float = Field(default=8)    # kirim percobaan kedua bila belum ada jawaban
+    LLM_MAX_TOOL_ROUNDS: int = Field(default=2)          # ronde function calling sebelum dipaksa menjawab
+    LLM_TOOL_LOOP_SECONDS: float = Field(default=12)     # anggaran waktu seluruh loop tool
+    TOOL_RESULT_MAX_CHARS: int = Field(default=300)      # panjang string hasil tool di riwayat
+    # --- Ringkasan percakapan berjalan (lihat app/core/summarizer.py) ---
+    SUMMARY_ENABLED: bool = Field(default=True)
+    SUMMARY_MODEL_NAME: Optional[str] = Field(default=None)  # default: GEMINI_MODEL_NAME
+    SUMMARY_KEEP_TURNS: int = Field(default=2)       # giliran terbaru yang tetap dikirim utuh
+    SUMMARY_TRIGGER_TURNS: int = Field(default=4)    # ringkas ulang bila giliran di luar ringkasan sebanyak ini
+    SUMMARY_MAX_CHARS: int = Field(default=800)
+    SEARCH_TIMEOUT_SECONDS: float = Field(default=5)
+    SEARCH_HEDGE_AFTER_SECONDS: float = Field(default=1.5)
+    SEARCH_CACHE_TTL_SECONDS: int = Field(default=3600)  # hasil Custom Search per query (hemat kuota)
+    # --- Pemanasan cache jawaban (lihat app/core/prewarm.py) ---
+    PREWARM_TOP_N: int = Field(default=50)              # pertanyaan terpopuler dari log query
+    PREWARM_RATE_PER_MINUTE: float = Field(default=10)  # batas panggilan Gemini selama pemanasan
+    PREWARM_LOCK_SECONDS: int = Field(default=1800)     # kunci lintas worker; lepas sendiri bila proses mati
+    # Custom Search dimulai sejajar retrieval untuk query peka waktu, atau segera setelah
+    # retrieval bila skor tipis (borderline); hasilnya langsung masuk prompt tanpa round trip tool
+    SPECULATIVE_SEARCH_ENABLED: bool = Field(default=False)
+    SPECULATIVE_BORDERLINE_MARGIN: float = Field(default=0.05)
+    BREAKER_FAILURE_THRESHOLD: int = Field(default=5)    # kegagalan beruntun sebelum sirkuit dibuka
+    BREAKER_RESET_SECONDS: float = Field(default=30)
+    # --- Admission control /api/ask (lihat app/core/admission.py) ---
+    ADMISSION_ENABLED: bool = Field(default=True)
+    ADMISSION_MAX_WAIT_SECONDS: float = Field(default=5)          # perkiraan tunggu maksimum sebelum ditolak
+    ADMISSION_CONCURRENCY: int = Field(default=1)                 # samakan dengan GUNICORN_THREADS
+    ADMISSION_INITIAL_SERVICE_SECONDS: float = Field(default=2)   # tebakan awal sebelum ada pengukuran
+    # --- Batch pertanyaan partner, POST /api/ask/batch (lihat app/core/batch.py) ---
+    BATCH_API_KEYS: str = Field(default="")              # kunci partner (header X-API-Key), dipisah koma; kosong = nonaktif
+    BATCH_MAX_QUESTIONS: int = Field(default=50)         # pertanyaan per permintaan
+    BATCH_MAX_CONCURRENCY: int = Field(default=4)        # panggilan Gemini sejajar per batch
+    BATCH_DEADLINE_SECONDS: float = Field(default=75)    # seluruh batch; di bawah timeout worker gunicorn 90 detik
+    BATCH_RATE_LIMIT_PER_MINUTE: int = Field(default=6)  # permintaan batch per kunci partner
+    BATCH_MAX_IN_FLIGHT: int = Field(default=1)          # batch berjalan per worker; selebihnya 503 + Retry-After
+    # --- Profiling on-demand (lihat app/utils/profiler.py) ---
+    PROFILE_DIR: str = Field(default="logs/profiles")
+    PROFILE_MAX_SECONDS: float = Field(default=60)
+    MEMORY_TRACE_MAX_SECONDS: float = Field(default=900) # tracemalloc dimatikan otomatis bila snapshot kedua tak kunjung diambil
 
     class Config:
         extra = "ignore"
@@ -0,0 +1,128 @@
+# app/core/admission.py
+"""
+Admission control /api/ask per proses worker.
+
+Worker sync gunicorn hanya melayani satu permintaan sekaligus; kelebihan
+beban menumpuk di backlog gunicorn/nginx dan baru terlihat saat sudah
+terlambat. Controller ini memperkirakan waktu tunggu permintaan yang baru
+masuk dari:
+
+- antrean di depan worker: selisih jam sekarang dengan header
+  X-Request-Start yang dipasang nginx (lihat deployments/nginx.conf);
+- antrean di dalam worker (gthread): jumlah permintaan in-flight x rata-rata
+  waktu layanan terbaru (EWMA) / jumlah thread;
+- pekerjaan panjang yang dipesan lewat reserve() (batch partner,
+  /api/ask/batch): sisa perkiraan durasinya / jumlah thread.
+
+Bila perkiraan tunggu melebihi ADMISSION_MAX_WAIT_SECONDS, permintaan
+ditolak seketika (503 + Retry-After) sehingga backlog cepat terkuras dan
+permintaan yang diterima tetap selesai dalam anggaran. Cache hit diperiksa
+sebelum admission dan selalu dilayani.
+"""
+
+import math
+import time
+import threading
+
+from app.config import settings
+
+
+def parse_request_start(header: str, now: float = None) -> float:
+    """
+    Waktu antre (detik) dari header X-Request-Start ("t=1697712345.123" dari
+    nginx $msec, atau epoch dalam ms/us). 0 bila header kosong/tidak valid.
+    """
+    if not header:
+        return 0.0
+    value = header.strip()
+    if value.startswith('t='):
+        value = value[2:]
+    try:
+        started = float(value)
+    except ValueError:
+        return 0.0
+    if started > 1e14:      # mikrodetik
+        started /= 1e6
+    elif started > 1e11:    # milidetik
+        started /= 1e3
+    now = time.time() if now is None else now
+    return max(0.0, now - started)
+
+
+class AdmissionController:
+    def __init__(self, concurrency: int = 1, max_wait_seconds: float = 5.0,
+                 initial_service_seconds: float = 2.0, alpha: float = 0.2):
+        self.concurrency = max(1, concurrency)
+        self.max_wait_seconds = max_wait_seconds
+        self.alpha = alpha
+        self.service_ewma = initial_service_seconds
+        self.in_flight = 0
+        self._reserved = {}  # token -> perkiraan selesai (time.monotonic)
+        self._lock = threading.Lock()
+
+    def _reserved_seconds(self) -> float:
+        now = time.monotonic()
+        return sum(max(0.0, until - now) for until in self._reserved.values())
+
+    def predicted_wait(self, queue_delay: float = 0.0) -> float:
+        busy = self.in_flight * self.service_ewma + self._reserved_seconds()
+        return queue_delay + busy / self.concurrency
+
+    def try_admit(self, queue_delay: float = 0.0) -> tuple:
+        """(diterima, retry_after_detik). Bila diterima, wajib diikuti release()."""
+        with self._lock:
+            wait = self.predicted_wait(queue_delay)
+            if wait > self.max_wait_seconds:
+                # Perkiraan kapan backlog (termasuk permintaan ini) sudah terkuras
+                return False, max(1, math.ceil(wait - self.max_wait_seconds + self.service_ewma))
+            self.in_flight += 1
+            return True, 0
+
+    def reserve(self, expected_seconds: float, queue_delay: float = 0.0) -> tuple:
+        """
+        Seperti try_admit untuk pekerjaan panjang: (token | None, retry_after_detik).
+        Sisa `expected_seconds` ikut dihitung dalam perkiraan tunggu permintaan lain
+        sampai unreserve(token); tidak memengaruhi EWMA waktu layanan /api/ask.
+        """
+        with self._lock:
+            wait = self.predicted_wait(queue_delay)
+            if wait > self.max_wait_seconds:
+                return None, max(1, math.ceil(wait - self.max_wait_seconds + self.service_ewma))
+            token = object()
+            self._reserved[token] = time.monotonic() + expected_seconds
+            return token, 0
+
+    def unreserve(self, token):
+        with self._lock:
+            self._reserved.pop(token, None)
+
+    def release(self, service_seconds: float = None):
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            if service_seconds is not None:
+                self.service_ewma += self.alpha * (service_seconds - self.service_ewma)
+
+    def stats(self) -> dict:
+        return {
+            'in_flight': self.in_flight,
+            'reserved_s': round(self._reserved_seconds(), 3),
+            'service_ewma_s': round(self.service_ewma, 3),
+            'max_wait_s': self.max_wait_seconds,
+        }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    concurrency=settings.ADMISSION_CONCURRENCY,
+                    max_wait_seconds=settings.ADMISSION_MAX_WAIT_SECONDS,
+                    initial_service_seconds=settings.ADMISSION_INITIAL_SERVICE_SECONDS,
+                )
+    return _controller
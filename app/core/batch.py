@@ -0,0 +1,163 @@
+# app/core/batch.py
+"""
+Jawaban untuk daftar pertanyaan sekaligus (POST /api/ask/batch), mis. portal
+fakultas yang menyiapkan jawaban FAQ-nya sendiri.
+
+Dibanding memanggil /api/ask berulang kali:
+- cache jawaban dicek sekaligus (L1, lalu satu MGET ke Redis);
+- semua pertanyaan yang miss di-encode dengan satu embedder.encode, dicocokkan
+  ke FAQ dengan vektor yang sama, lalu dicari dengan satu search_batch ke Qdrant;
+- hanya sisanya yang dikirim ke Gemini, paling banyak `max_concurrency`
+  sekaligus, masing-masing dengan deadline REQUEST_DEADLINE_SECONDS sendiri
+  yang dipotong sisa BATCH_DEADLINE_SECONDS (di bawah timeout worker gunicorn);
+  pertanyaan yang belum sempat dimulai saat waktu batch habis dikembalikan
+  sebagai error agar dikirim ulang.
+
+Tanpa riwayat percakapan. answer_batch() adalah generator: hasil dikirim begitu
+tiap pertanyaan selesai (urutan selesai, bukan urutan masukan; pakai 'index').
+
+Satu respons batch menahan worker hingga BATCH_DEADLINE_SECONDS, jadi per worker
+hanya BATCH_MAX_IN_FLIGHT batch sekaligus (acquire_batch_slot) dan perkiraan
+durasinya dipesan di admission controller agar /api/ask ikut memperhitungkannya.
+"""
+
+import math
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app.config import settings
+from app.rag_initializer import get_runtime_components
+from app.redis_manager import get_cached_responses, cache_response
+from app.core.main import (
+    embed_queries, search_qdrant_batch, filter_relevant, construct_prompt, ask_gemini,
+    build_extractive_answer, collect_sources, build_rag_context,
+)
+from app.core.faq import get_faq_index
+from app.core.resilience import start_deadline, end_deadline, UpstreamUnavailable
+from app.metrics import observe_stage, record_cache, record_fallback, record_upstream
+from app.utils.validators import validate_query
+
+logger = logging.getLogger(__name__)
+
+_batch_slots = threading.BoundedSemaphore(max(1, settings.BATCH_MAX_IN_FLIGHT))
+
+
+def acquire_batch_slot() -> bool:
+    """Slot batch di worker ini tanpa menunggu; False bila sudah penuh. Diikuti release_batch_slot()."""
+    return _batch_slots.acquire(blocking=False)
+
+
+def release_batch_slot():
+    _batch_slots.release()
+
+
+def expected_batch_seconds(n_queries: int, service_seconds: float) -> float:
+    """Perkiraan durasi batch untuk admission: gelombang Gemini x waktu layanan /api/ask, maks deadline batch."""
+    waves = math.ceil(n_queries / max(1, settings.BATCH_MAX_CONCURRENCY))
+    return min(settings.BATCH_DEADLINE_SECONDS, waves * service_seconds)
+
+
+def _result(index: int, query, **fields) -> dict:
+    return {'index': index, 'query': query, **fields}
+
+
+def _answer_one(index: int, query: str, query_vec, retrieved: list, batch_deadline: float) -> dict:
+    """Langkah 5-8 /api/ask untuk satu pertanyaan (dijalankan di thread pool batch)."""
+    budget = min(settings.REQUEST_DEADLINE_SECONDS, batch_deadline - time.monotonic())
+    if budget < 1:
+        return _result(index, query, error='Waktu batch habis. Kirim ulang pertanyaan ini.')
+    token = start_deadline(budget)
+    try:
+        relevant_docs = filter_relevant(retrieved) if retrieved else []
+        if not relevant_docs:
+            record_fallback('below_threshold' if retrieved else 'no_results')
+        rag_context = build_rag_context(query, relevant_docs, query_vec)
+        sources = collect_sources(relevant_docs)
+        system_prompt, user_prompt = construct_prompt(user_query=query, rag_context=rag_context)
+        try:
+            answer = ask_gemini(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                rag_context=rag_context,
+                enable_google_search=not relevant_docs,
+            )
+        except UpstreamUnavailable as e:
+            logger.warning(f"[BATCH] Upstream tidak tersedia untuk '{query}': {e}")
+            if not relevant_docs:
+                return _result(index, query, error='Layanan sedang sibuk. Silakan coba lagi sebentar lagi.',
+                               retry_after=int(e.retry_after))
+            record_upstream('gemini', 'degraded')
+            return _result(index, query, answer=build_extractive_answer(query, relevant_docs),
+                           sources=sources, origin='rag', degraded=True)
+
+        cache_response(query, answer, ttl=3600)
+        return _result(index, query, answer=answer, sources=sources, origin='rag')
+    except Exception as e:
+        logger.error(f"[BATCH] Gagal menjawab '{query}': {e}", exc_info=True)
+        return _result(index, query, error='Terjadi gangguan teknis. Tim sedang memperbaiki.')
+    finally:
+        end_deadline(token)
+
+
+def answer_batch(queries: list, max_concurrency: int = None):
+    """
+    Yield satu dict per pertanyaan: {'index', 'query', 'answer', 'sources', 'origin'}
+    dengan origin 'cache' | 'faq' | 'rag' (plus 'degraded': True bila jawaban ekstraktif),
+    atau {'index', 'query', 'error'} untuk pertanyaan yang tidak valid / gagal.
+    """
+    max_concurrency = max_concurrency or settings.BATCH_MAX_CONCURRENCY
+    batch_deadline = time.monotonic() + settings.BATCH_DEADLINE_SECONDS
+    valid = []
+    for index, query in enumerate(queries):
+        query = query.strip() if isinstance(query, str) else query
+        if isinstance(query, str) and validate_query(query):
+            valid.append((index, query))
+        else:
+            yield _result(index, query, error='Pertanyaan minimal 3 karakter.')
+    if not valid:
+        return
+
+    # === Cache jawaban, sekaligus ===
+    with observe_stage('cache_lookup'):
+        cached = get_cached_responses([query for _, query in valid])
+    misses = []
+    for (index, query), answer in zip(valid, cached):
+        record_cache('response', answer is not None)
+        if answer is not None:
+            yield _result(index, query, answer=answer, sources=[], origin='cache')
+        else:
+            misses.append((index, query))
+    if not misses:
+        return
+
+    # === Satu encode untuk semua miss, FAQ dari vektor yang sama ===
+    with observe_stage('embed'):
+        vectors = embed_queries([query for _, query in misses], get_runtime_components()['embedder'])
+    faq_index = get_faq_index() if settings.RAG.FAQ_ENABLED else None
+    pending = []
+    for (index, query), query_vec in zip(misses, vectors):
+        faq_match = faq_index.match(query, query_vec, settings.RAG.FAQ_MATCH_THRESHOLD) if faq_index is not None else None
+        if faq_index is not None:
+            record_cache('faq', faq_match is not None)
+        if faq_match:
+            entry = faq_match[0]
+            yield _result(index, query, answer=entry['answer'], sources=entry['sources'], origin='faq')
+        else:
+            pending.append((index, query, query_vec))
+    if not pending:
+        return
+
+    # === Satu search_batch ke Qdrant, lalu Gemini dengan konkurensi terbatas ===
+    retrieved = search_qdrant_batch([query for _, query, _ in pending], [vec for _, _, vec in pending],
+                                    top_k=settings.RAG.TOP_K_RETRIEVAL)
+    executor = ThreadPoolExecutor(max_workers=min(max_concurrency, len(pending)), thread_name_prefix='ask-batch')
+    try:
+        futures = [executor.submit(_answer_one, index, query, query_vec, results, batch_deadline)
+                   for (index, query, query_vec), results in zip(pending, retrieved)]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # Klien putus di tengah jalan: pertanyaan yang belum mulai tidak dikirim ke Gemini
+        executor.shutdown(wait=False, cancel_futures=True)
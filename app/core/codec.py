@@ -0,0 +1,149 @@
+# app/core/codec.py
+"""
+Serialisasi ringkas untuk nilai Redis: item riwayat chat, ringkasan percakapan
+dan jawaban cache.
+
+Format: b'\\xc1' + 1 byte jenis + payload.
+
+- 0xc1 tidak pernah menjadi byte awal teks UTF-8 (dan tidak dipakai msgpack),
+  sehingga nilai format lama (JSON / teks polos) tetap terbaca tanpa migrasi.
+- Jenis 'm': msgpack polos, untuk nilai kecil yang tidak untung dikompres.
+- Jenis 'z': msgpack + zstd. Bila file kamus COMPACT_DICT_PATH ada (dilatih
+  dengan scripts/bench_storage.py --save-dict), kamus dipakai bersama oleh
+  semua worker; frame menyimpan dict_id sehingga nilai yang ditulis dengan kamus
+  lain terdeteksi (CodecError) dan diperlakukan sebagai cache miss, bukan
+  sampah.
+- Item riwayat disimpan sebagai array [user, ai, ts] dengan ts detik bulat.
+"""
+
+import os
+import json
+import logging
+import threading
+
+import msgpack
+import zstandard
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'\xc1'
+KIND_MSGPACK = b'm'
+KIND_ZSTD = b'z'
+
+
+class CodecError(ValueError):
+    """Nilai berformat ringkas yang tidak bisa dibaca (rusak / kamus berbeda)."""
+
+
+def load_dictionary(path: str):
+    """Kamus zstd dari file, atau None bila file tidak ada."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        data = zstandard.ZstdCompressionDict(f.read())
+    logger.info(f"[CODEC] Kamus zstd dimuat: {path} (dict_id {data.dict_id()})")
+    return data
+
+
+class CompactCodec:
+    """msgpack + zstd (opsional dengan kamus bersama). Aman dipakai banyak thread."""
+
+    def __init__(self, dictionary=None, level: int = 3, min_compress_bytes: int = 64):
+        self.dictionary = dictionary
+        self.level = level
+        self.min_compress_bytes = min_compress_bytes
+        # Objek (de)kompresor zstd tidak aman dipakai bersamaan: satu per thread
+        self._local = threading.local()
+
+    def _zstd(self):
+        local = self._local
+        if not hasattr(local, 'compressor'):
+            if self.dictionary is not None:
+                local.compressor = zstandard.ZstdCompressor(level=self.level, dict_data=self.dictionary)
+                local.decompressor = zstandard.ZstdDecompressor(dict_data=self.dictionary)
+            else:
+                local.compressor = zstandard.ZstdCompressor(level=self.level)
+                local.decompressor = zstandard.ZstdDecompressor()
+        return local.compressor, local.decompressor
+
+    def pack(self, obj) -> bytes:
+        raw = msgpack.packb(obj, use_bin_type=True)
+        if len(raw) >= self.min_compress_bytes:
+            compressed = self._zstd()[0].compress(raw)
+            if len(compressed) < len(raw):
+                return MAGIC + KIND_ZSTD + compressed
+        return MAGIC + KIND_MSGPACK + raw
+
+    def unpack(self, data: bytes):
+        kind, payload = data[1:2], data[2:]
+        try:
+            if kind == KIND_ZSTD:
+                payload = self._zstd()[1].decompress(payload)
+            elif kind != KIND_MSGPACK:
+                raise CodecError(f"jenis tidak dikenal: {kind!r}")
+            return msgpack.unpackb(payload, raw=False)
+        except (zstandard.ZstdError, ValueError, msgpack.UnpackException) as e:
+            raise CodecError(str(e)) from e
+
+
+def is_compact(data) -> bool:
+    return isinstance(data, bytes) and data[:1] == MAGIC
+
+
+_codec = {'instance': None}
+_codec_lock = threading.Lock()
+
+
+def get_codec() -> CompactCodec:
+    if _codec['instance'] is None:
+        with _codec_lock:
+            if _codec['instance'] is None:
+                _codec['instance'] = CompactCodec(
+                    load_dictionary(settings.COMPACT_DICT_PATH),
+                    level=settings.COMPACT_ZSTD_LEVEL,
+                    min_compress_bytes=settings.COMPACT_MIN_COMPRESS_BYTES,
+                )
+    return _codec['instance']
+
+
+# ===================================================================
+# RIWAYAT CHAT & JAWABAN CACHE
+# ===================================================================
+def encode_history_item(item: dict, codec: CompactCodec = None):
+    if not settings.COMPACT_STORAGE_ENABLED and codec is None:
+        return json.dumps(item)
+    return (codec or get_codec()).pack([item['user'], item['ai'], int(item['ts'])])
+
+
+def decode_history_item(data, codec: CompactCodec = None) -> dict:
+    if is_compact(data):
+        user, ai, ts = (codec or get_codec()).unpack(data)
+        return {'user': user, 'ai': ai, 'ts': ts}
+    return json.loads(data)
+
+
+def encode_text(text: str, codec: CompactCodec = None):
+    if not settings.COMPACT_STORAGE_ENABLED and codec is None:
+        return text
+    return (codec or get_codec()).pack(text)
+
+
+def decode_text(data, codec: CompactCodec = None) -> str:
+    if is_compact(data):
+        return (codec or get_codec()).unpack(data)
+    return data.decode('utf-8') if isinstance(data, bytes) else data
+
+
+def encode_object(obj, codec: CompactCodec = None):
+    """dict/list kecil (mis. ringkasan percakapan); JSON bila format ringkas dimatikan."""
+    if not settings.COMPACT_STORAGE_ENABLED and codec is None:
+        return json.dumps(obj)
+    return (codec or get_codec()).pack(obj)
+
+
+def decode_object(data, codec: CompactCodec = None):
+    if is_compact(data):
+        return (codec or get_codec()).unpack(data)
+    return json.loads(data)
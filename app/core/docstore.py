@@ -0,0 +1,123 @@
+# app/core/docstore.py
+"""
+Penyimpanan teks chunk lokal (SQLite) untuk mode payload ramping.
+
+Dengan RAG_SLIM_PAYLOAD aktif, Qdrant hanya menyimpan ID dan metadata ringkas
+(source, page, chunk_index); teks chunk ditulis ke sini oleh ingestion dan
+diambil setelah ranking, hanya untuk top_k hasil akhir.
+
+ID chunk berbasis hash isi teks, sehingga satu file bisa dipakai bersama
+oleh semua versi collection (blue/green) tanpa konflik. Tabel chunk_versions
+mencatat versi mana saja yang memakai sebuah chunk; saat versi lama dihapus
+(prune), chunk yang tidak lagi dipakai versi lain ikut dihapus.
+"""
+
+import os
+import uuid
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    source TEXT,
+    page INTEGER,
+    chunk_index INTEGER
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS chunk_versions (
+    version TEXT NOT NULL,
+    id TEXT NOT NULL,
+    PRIMARY KEY (version, id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS chunk_versions_id ON chunk_versions (id);
+"""
+
+# Pemilik chunk yang ditulis sebelum chunk_versions ada
+LEGACY_VERSION = "__legacy__"
+
+_local = threading.local()
+
+
+def normalize_id(point_id) -> str:
+    """Qdrant mengembalikan ID hex md5 dalam format UUID; samakan ke hex polos."""
+    return uuid.UUID(str(point_id)).hex
+
+
+def write_chunks(path: str, records, version: str) -> int:
+    """
+    Tulis/replace chunk ke docstore dan catat bahwa `version` memakainya.
+    records: iterable dict {'id', 'text', 'source', 'page', 'chunk_index'}
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    rows = [
+        (normalize_id(r["id"]), r["text"], r.get("source"), r.get("page"), r.get("chunk_index"))
+        for r in records
+    ]
+    with sqlite3.connect(path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")  # pembaca (worker) tidak terblokir saat ingestion
+        conn.executescript(_SCHEMA)
+        if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM chunk_versions)").fetchone()[0]:
+            # File dari sebelum chunk_versions: versi pemilik chunk lama tidak diketahui
+            conn.execute("INSERT INTO chunk_versions SELECT ?, id FROM chunks", (LEGACY_VERSION,))
+        conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?, ?)", rows)
+        conn.executemany("INSERT OR IGNORE INTO chunk_versions VALUES (?, ?)", [(version, row[0]) for row in rows])
+    return len(rows)
+
+
+def delete_versions(path: str, versions: list, retained: list) -> int:
+    """
+    Lepaskan `versions` dari docstore dan hapus chunk yang tidak dipakai versi lain.
+    Chunk dari sebelum chunk_versions ada (LEGACY_VERSION) ikut dihapus begitu
+    semua versi `retained` tercatat. Mengembalikan jumlah chunk yang dihapus.
+    """
+    if not os.path.exists(path):
+        return 0
+    with sqlite3.connect(path) as conn:
+        conn.executescript(_SCHEMA)
+        tracked = {row[0] for row in conn.execute("SELECT DISTINCT version FROM chunk_versions")}
+        versions = [version for version in versions if version in tracked]
+        if LEGACY_VERSION in tracked and all(version in tracked for version in retained):
+            versions.append(LEGACY_VERSION)
+        if not versions:
+            return 0
+        placeholders = ",".join("?" * len(versions))
+        deleted = conn.execute(
+            f"DELETE FROM chunks WHERE id IN (SELECT id FROM chunk_versions WHERE version IN ({placeholders})) "
+            f"AND id NOT IN (SELECT id FROM chunk_versions WHERE version NOT IN ({placeholders}))",
+            versions * 2,
+        ).rowcount
+        conn.execute(f"DELETE FROM chunk_versions WHERE version IN ({placeholders})", versions)
+    return deleted
+
+
+def _connection(path: str) -> sqlite3.Connection:
+    """Koneksi read-only per thread, dibuka sekali lalu dipakai ulang."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != path:
+        conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True, check_same_thread=False)
+        conn.execute("PRAGMA mmap_size=268435456")  # baca via memory-map, hemat syscall
+        _local.conn, _local.path = conn, path
+    return conn
+
+
+def fetch_chunks(ids, path: str) -> dict:
+    """
+    Ambil teks & metadata untuk daftar ID (format apa pun yang diterima normalize_id).
+    Mengembalikan: {id_hex: {'text', 'source', 'page', 'chunk_index'}}; ID yang tidak ada dilewati.
+    """
+    keys = [normalize_id(i) for i in ids]
+    if not keys:
+        return {}
+    placeholders = ",".join("?" * len(keys))
+    rows = _connection(path).execute(
+        f"SELECT id, text, source, page, chunk_index FROM chunks WHERE id IN ({placeholders})",
+        keys,
+    ).fetchall()
+    return {
+        row[0]: {"text": row[1], "source": row[2], "page": row[3], "chunk_index": row[4]}
+        for row in rows
+    }
@@ -0,0 +1,200 @@
+# app/core/faq.py
+"""
+Indeks FAQ jawaban langsung: variasi pertanyaan yang sudah dikurasi beserta
+jawaban yang disetujui. Bila query user sangat mirip (cosine >= FAQ_MATCH_THRESHOLD)
+dengan salah satu variasi, jawaban tersimpan dikembalikan tanpa Qdrant dan
+tanpa Gemini.
+
+Format file (JSONL, satu entri per baris):
+    {"id": "rektor", "questions": ["Siapa rektor UIN Salatiga?", ...],
+     "answer": "...", "sources": [{"source": "....pdf", "page": 1}]}
+
+Variasi di-embed sekali saat dimuat. Setiap worker memeriksa mtime file
+berkala (FAQ_REFRESH_SECONDS) sehingga perubahan terbaca tanpa restart;
+POST /api/admin/faq/reload memuat ulang worker yang melayani seketika.
+Threshold sengaja ketat: pertanyaan yang hanya mirip topik (mis. UKT prodi
+berbeda) harus tetap lewat RAG + LLM, jadi tambahkan variasi, jangan turunkan
+threshold.
+
+Cosine saja tidak cukup: "Warek 3 ... siapa?" dan "Warek 2 ... siapa?" hanya
+berbeda satu angka dan hampir pasti di atas threshold. Karena itu kecocokan
+juga ditolak bila angka di query berbeda dengan angka di variasi, atau query
+memuat kata yang di FAQ hanya milik entri lain (lihat FAQIndex.conflict).
+
+data/faq.jsonl di repo hanya contoh format; isi dengan jawaban yang sudah
+diverifikasi bagian akademik sebelum dipakai di produksi.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+import numpy as np
+
+from app.config import settings
+from app.rag_initializer import get_runtime_components
+from app.core.main import embed_query
+from app.utils.text import canonical_tokens, INDONESIAN_STOPWORDS
+from app.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+
+def _numbers(tokens) -> set:
+    return {token for token in tokens if any(ch.isdigit() for ch in token)}
+
+
+class FAQIndex:
+    def __init__(self, entries: list, vectors: np.ndarray, owners: list, variants: list, mtime: float = 0.0):
+        self.entries = entries      # entri asli dari file
+        self.vectors = vectors      # (n_variasi, dim), ternormalisasi
+        self.owners = owners        # indeks entri untuk tiap baris vectors
+        self.variants = variants    # teks variasi, untuk log/debug
+        self.mtime = mtime
+        self.variant_tokens = [set(canonical_tokens(variant)) for variant in variants]
+        # token (selain kata fungsi) -> entri yang variasinya memuat token itu
+        self.token_entries = {}
+        for owner, tokens in zip(owners, self.variant_tokens):
+            for token in tokens - INDONESIAN_STOPWORDS:
+                self.token_entries.setdefault(token, set()).add(owner)
+
+    @classmethod
+    def empty(cls):
+        return cls([], np.zeros((0, 0), dtype=np.float32), [], [])
+
+    @classmethod
+    def build(cls, entries: list, embedder, mtime: float = 0.0):
+        owners, variants, vectors = [], [], []
+        for i, entry in enumerate(entries):
+            for question in entry['questions']:
+                owners.append(i)
+                variants.append(question)
+                vectors.append(embed_query(question, embedder))
+        if not vectors:
+            return cls.empty()
+        return cls(entries, np.vstack(vectors).astype(np.float32), owners, variants, mtime)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def nearest(self, query_vec: np.ndarray):
+        """(indeks_variasi, skor) terdekat, atau None bila indeks kosong."""
+        if not len(self.owners):
+            return None
+        scores = self.vectors @ query_vec
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+    def conflict(self, query: str, variant_idx: int):
+        """
+        Alasan variasi `variant_idx` tidak boleh menjawab `query` walau skornya
+        tinggi, atau None: angkanya berbeda ("warek 3" vs "warek 2"), atau query
+        memuat kata yang di FAQ hanya muncul pada entri lain.
+        """
+        tokens = set(canonical_tokens(query))
+        if _numbers(tokens) != _numbers(self.variant_tokens[variant_idx]):
+            return 'angka berbeda'
+        owner = self.owners[variant_idx]
+        foreign = sorted(t for t in tokens if owner not in self.token_entries.get(t, {owner}))
+        if foreign:
+            return f"kata milik entri lain: {', '.join(foreign)}"
+        return None
+
+    def match(self, query: str, query_vec: np.ndarray, threshold: float):
+        """(entri, skor, variasi) terdekat bila skor >= threshold dan tidak ada konflik; selain itu None."""
+        nearest = self.nearest(query_vec)
+        if nearest is None or nearest[1] < threshold:
+            return None
+        best, score = nearest
+        reason = self.conflict(query, best)
+        if reason:
+            logger.info(f"[FAQ] '{query}' ~ '{self.variants[best]}' ({score:.3f}) ditolak: {reason}")
+            return None
+        return self.entries[self.owners[best]], score, self.variants[best]
+
+
+def load_entries(path: str) -> list:
+    """Baca & validasi file FAQ. ValueError bila ada baris yang tidak valid."""
+    entries = []
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path}:{line_no}: JSON tidak valid ({e})")
+            questions = [q.strip() for q in entry.get('questions', []) if q and q.strip()]
+            answer = (entry.get('answer') or '').strip()
+            if not questions or not answer:
+                raise ValueError(f"{path}:{line_no}: 'questions' dan 'answer' wajib diisi")
+            entries.append({
+                'id': entry.get('id') or f"faq-{line_no}",
+                'questions': questions,
+                'answer': answer,
+                'sources': entry.get('sources', []),
+            })
+    return entries
+
+
+# ===================================================================
+# INDEKS PER WORKER
+# ===================================================================
+_faq = {'index': None, 'checked_at': 0.0}
+_faq_lock = threading.Lock()
+
+
+def reload_faq_index() -> FAQIndex:
+    """Muat ulang dari FAQ_PATH. Indeks lama tetap dipakai bila file tidak valid (raise ValueError)."""
+    path = settings.RAG.FAQ_PATH
+    with _faq_lock:
+        if not os.path.exists(path):
+            logger.info(f"[FAQ] {path} tidak ada; indeks FAQ kosong.")
+            index = FAQIndex.empty()
+        else:
+            mtime = os.path.getmtime(path)
+            entries = load_entries(path)
+            index = FAQIndex.build(entries, get_runtime_components()['embedder'], mtime)
+            logger.info(f"[FAQ] {len(index)} entri, {len(index.owners)} variasi pertanyaan dimuat dari {path}")
+        _faq['index'] = index
+        _faq['checked_at'] = time.monotonic()
+        return index
+
+
+def get_faq_index() -> FAQIndex:
+    """Indeks aktif; dimuat ulang bila mtime file berubah (dicek tiap FAQ_REFRESH_SECONDS). Tidak pernah raise."""
+    index = _faq['index']
+    now = time.monotonic()
+    if index is not None and now - _faq['checked_at'] < settings.RAG.FAQ_REFRESH_SECONDS:
+        return index
+
+    path = settings.RAG.FAQ_PATH
+    try:
+        mtime = os.path.getmtime(path) if os.path.exists(path) else 0.0
+        if index is None or mtime != index.mtime:
+            return reload_faq_index()
+    except Exception as e:
+        logger.warning(f"[FAQ] Gagal memuat indeks FAQ: {e}")
+        if index is None:
+            index = _faq['index'] = FAQIndex.empty()
+    _faq['checked_at'] = now
+    return index
+
+
+def lookup_faq(query: str) -> tuple:
+    """
+    (match, query_vec): match = (entri, skor, variasi) bila ada FAQ yang cocok.
+    query_vec dikembalikan agar search_qdrant tidak meng-encode query dua kali;
+    None bila embedder tidak tersedia.
+    """
+    index = get_faq_index()
+    try:
+        embedder = get_runtime_components()['embedder']
+        with observe_stage('embed'):
+            query_vec = embed_query(query, embedder)
+    except Exception as e:
+        logger.warning(f"[FAQ] Query tidak dapat di-embed: {e}")
+        return None, None
+    return index.match(query, query_vec, settings.RAG.FAQ_MATCH_THRESHOLD), query_vec
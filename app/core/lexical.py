@@ -0,0 +1,136 @@
+# app/core/lexical.py
+"""
+Indeks leksikal BM25 untuk retrieval hibrida (leksikal + dense).
+
+Query yang menyebut nomor dokumen, nama, atau akronim ("B-01/In.21", "SIAKAD",
+"UKT") sering ter-embed buruk. Indeks ini dibangun saat ingestion dengan
+normalisasi yang sama seperti preprocess_query, lalu di-query berdampingan
+dengan pencarian dense dan digabung memakai reciprocal-rank fusion.
+
+Postings disimpan dalam array numpy berformat CSR (offset per term, lalu
+doc index + term frequency), sehingga ringkas di memori dan cepat dimuat.
+"""
+
+import numpy as np
+
+from app.utils.text import tokenize, INDONESIAN_STOPWORDS
+
+
+class BM25Index:
+    """Indeks BM25 berbasis array. Dokumen diidentifikasi dengan ID chunk (str)."""
+
+    def __init__(self, terms, offsets, postings_doc, postings_tf, doc_len, doc_ids, k1=1.2, b=0.75):
+        self.terms = terms
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets            # int64[n_terms + 1]
+        self.postings_doc = postings_doc  # int32[n_postings]
+        self.postings_tf = postings_tf    # uint16[n_postings]
+        self.doc_len = doc_len            # uint32[n_docs]
+        self.doc_ids = doc_ids            # List[str], sejajar dengan doc_len
+        self.k1 = k1
+        self.b = b
+
+        n_docs = len(doc_ids)
+        df = np.diff(offsets).astype(np.float32)
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(doc_len.mean()) if n_docs else 1.0
+        # Bagian normalisasi panjang dokumen dihitung sekali saat load
+        self._norm = (k1 * (1 - b + b * doc_len / max(avgdl, 1e-9))).astype(np.float32)
+
+    @classmethod
+    def build(cls, doc_ids, texts, k1=1.2, b=0.75) -> "BM25Index":
+        postings = {}
+        doc_len = np.zeros(len(texts), dtype=np.uint32)
+        for doc_idx, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_len[doc_idx] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((doc_idx, min(tf, 65535)))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        for i, term in enumerate(terms):
+            offsets[i + 1] = offsets[i] + len(postings[term])
+        postings_doc = np.empty(offsets[-1], dtype=np.int32)
+        postings_tf = np.empty(offsets[-1], dtype=np.uint16)
+        for i, term in enumerate(terms):
+            docs, tfs = zip(*postings[term])
+            postings_doc[offsets[i]:offsets[i + 1]] = docs
+            postings_tf[offsets[i]:offsets[i + 1]] = tfs
+
+        return cls(terms, offsets, postings_doc, postings_tf, doc_len, list(doc_ids), k1, b)
+
+    def save(self, path: str):
+        np.savez(
+            path,
+            terms=np.array(self.terms, dtype=str),
+            offsets=self.offsets,
+            postings_doc=self.postings_doc,
+            postings_tf=self.postings_tf,
+            doc_len=self.doc_len,
+            doc_ids=np.array(self.doc_ids, dtype=str),
+            params=np.array([self.k1, self.b], dtype=np.float32),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path) as data:
+            k1, b = (float(x) for x in data["params"])
+            return cls(
+                data["terms"].tolist(), data["offsets"], data["postings_doc"],
+                data["postings_tf"], data["doc_len"], data["doc_ids"].tolist(), k1, b,
+            )
+
+    def search(self, query: str, top_k: int = 10) -> list:
+        """
+        Mengembalikan: List[(doc_id, skor_bm25, match_ratio, matched_terms)], terurut menurun.
+        match_ratio = porsi bobot IDF query yang termuat di dokumen (0..1), dipakai
+        untuk memutuskan apakah kecocokan leksikal cukup kuat dianggap relevan;
+        matched_terms = jumlah term query yang termuat (query satu term selalu 1.0).
+        Term yang tidak ada di vocab tetap dihitung di penyebut dengan IDF maksimum;
+        kata tanya/kata fungsi diabaikan agar tidak menurunkan rasio.
+        """
+        tokens = set(tokenize(query)) - INDONESIAN_STOPWORDS
+        term_idx = [self.vocab[t] for t in tokens if t in self.vocab]
+        if not term_idx or not self.doc_ids:
+            return []
+
+        n_docs = len(self.doc_ids)
+        unknown_idf = np.log1p((n_docs + 0.5) / 0.5)
+        total_idf = float(self.idf[term_idx].sum()) + unknown_idf * (len(tokens) - len(term_idx))
+
+        scores = np.zeros(n_docs, dtype=np.float32)
+        coverage = np.zeros(n_docs, dtype=np.float32)
+        matched = np.zeros(n_docs, dtype=np.int32)
+        for t in term_idx:
+            start, end = self.offsets[t], self.offsets[t + 1]
+            docs = self.postings_doc[start:end]
+            tf = self.postings_tf[start:end].astype(np.float32)
+            # Doc unik per term, jadi penjumlahan fancy-index aman (tanpa np.add.at)
+            scores[docs] += self.idf[t] * tf * (self.k1 + 1) / (tf + self._norm[docs])
+            coverage[docs] += self.idf[t]
+            matched[docs] += 1
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [
+            (self.doc_ids[i], float(scores[i]), float(coverage[i] / total_idf) if total_idf else 0.0, int(matched[i]))
+            for i in candidates
+        ]
+
+
+def reciprocal_rank_fusion(rankings, k: int = 60) -> list:
+    """
+    Gabungkan beberapa daftar ID terurut dengan RRF: skor = Σ 1 / (k + rank).
+    Mengembalikan: List[(doc_id, skor_rrf)], terurut menurun.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -1,7 +1,7 @@
 import re
 import logging
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from qdrant_client import models
 
 # --- Google Generative AI SDK (Resmi & Terbaru) ---
 from google import genai
@@ -10,10 +10,20 @@ from google.genai import types
 
 import google.generativeai as genai 
 from google.genai.types import HarmCategory, HarmBlockThreshold, GenerateContentConfig
+from google.api_core import exceptions as google_exceptions
 
 # --- Konfigurasi & Komponen Internal ---
 from app.config import settings
-from app.rag_initializer import get_runtime_components
+from app.rag_initializer import (
+    get_runtime_components, get_active_collection, get_lexical_index, get_topic_router, get_projection, is_quantized,
+)
+from app.core.docstore import fetch_chunks, normalize_id
+from app.core.lexical import reciprocal_rank_fusion
+from app.metrics import observe_stage, record_cache, record_topic_route, record_context_chars, LLM_ROUNDS
+from app.tracing import traced, detached_from_trace
+from app.core.tool_loop import run_tool_loop
+from app.core.resilience import call_upstream, get_breaker, submit_in_context, remaining, UpstreamUnavailable
+from app.redis_manager import LocalLRU, get_cached_search, cache_search
 
 logger = logging.getLogger(__name__)
 
@@ -21,44 +31,9 @@ logger = logging.getLogger(__name__)
 # ===================================================================
 # 1. PREPROCESSING QUERY (Bahasa Indonesia)
 # ===================================================================
-# Fungsi preprocessing query
-def preprocess_query(query):
-    """
-    Preprocessing query untuk meningkatkan hasil pencarian
-    """
-    # 1. Convert ke lowercase
-    processed = query.lower()
-    
-    # 2. Hapus karakter khusus tapi pertahankan yang penting
-    processed = re.sub(r'[^\w\s\u00C0-\u017F]', ' ', processed)
-    
-    # 3. Normalisasi whitespace
-    processed = re.sub(r'\s+', ' ', processed).strip()
-    
-    # 4. Untuk bahasa Indonesia, bisa tambah stemming sederhana
-    # Misalnya: "pendaftaran" -> "daftar", "penerimaan" -> "terima"
-    indonesian_stem = {
-        'pendaftaran': 'daftar',
-        'penerimaan': 'terima',
-        'pengumuman': 'umum',
-        'mahasiswa': 'mhs',
-        'kampus': 'kampus',
-        'universitas': 'univ',
-        'fakultas': 'fak',
-        'jurusan': 'jur',
-        'program': 'prodi',
-        'studi': 'prodi'
-    }
-    
-    words = processed.split()
-    processed_words = []
-    for word in words:
-        if word in indonesian_stem:
-            processed_words.append(indonesian_stem[word])
-        else:
-            processed_words.append(word)
-    
-    return ' '.join(processed_words)
+# Dipindah ke app.utils.text agar bisa dipakai ingestion (indeks leksikal)
+# tanpa memuat klien LLM; tetap diekspor dari sini untuk kompatibilitas.
+from app.utils.text import preprocess_query, canonical_text, tokenize, INDONESIAN_STOPWORDS
 
 
 # ===================================================================
@@ -81,10 +56,269 @@ def _google_search_tool(query: str) -> str:
 # ===================================================================
 # 3. RAG: PENCARIAN DI QDRANT
 # ===================================================================
-def search_qdrant(query: str, top_k: int = 3):
+# Vektor query per worker, kunci (embedder, canonical_text). Entri memegang
+# referensi embedder sehingga id() tidak mungkin dipakai ulang objek lain.
+_embedding_cache = LocalLRU(settings.RAG.EMBED_CACHE_MAX_ENTRIES)
+
+
+def _encode(texts: list, embedder) -> np.ndarray:
+    return embedder.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+
+
+def embed_query(query: str, embedder) -> np.ndarray:
+    """Kanonikkan & encode query menjadi vektor ternormalisasi (lihat canonical_text)."""
+    return embed_queries([query], embedder)[0]
+
+
+def embed_queries(queries: list, embedder) -> np.ndarray:
+    """Versi batch embed_query (mis. pemanasan cache); hanya query yang belum di cache di-encode."""
+    texts = [canonical_text(query) for query in queries]
+    if settings.RAG.EMBED_CACHE_MAX_ENTRIES <= 0:
+        return _encode(texts, embedder)
+
+    vectors = {}
+    for text in texts:
+        cached = _embedding_cache.get((id(embedder), text))
+        if cached is not None:
+            vectors[text] = cached[1]
+        record_cache('embedding', cached is not None)
+    missing = list(dict.fromkeys(text for text in texts if text not in vectors))
+    if missing:
+        for text, vec in zip(missing, _encode(missing, embedder)):
+            _embedding_cache.set((id(embedder), text), (embedder, vec))
+            vectors[text] = vec
+    return np.stack([vectors[text] for text in texts])
+
+
+def _hydrate_texts(results: list) -> list:
+    """Isi teks hasil dari docstore lokal (mode payload ramping); hasil tanpa teks dibuang."""
+    missing = [r["id"] for r in results if not r["text"]]
+    if missing and settings.RAG.RAG_SLIM_PAYLOAD:
+        stored = fetch_chunks(missing, settings.RAG.DOCSTORE_PATH)
+        for r in results:
+            if not r["text"]:
+                r["text"] = stored.get(normalize_id(r["id"]), {}).get("text", "").strip()
+    return [r for r in results if r["text"]]
+
+
+def _postprocess_hits(hits, top_k: int) -> list:
+    """
+    Ubah ScoredPoint Qdrant menjadi List[{'id', 'text', 'score', 'source', 'page'}]
+    memakai skor dari server. Teks diambil dari docstore hanya untuk top_k akhir.
+    """
+    results = []
+    for hit in hits[:top_k]:
+        payload = hit.payload or {}
+        results.append({
+            "id": str(hit.id),
+            "text": payload.get("text", "").strip(),
+            "score": float(hit.score),
+            "source": payload.get("source"),
+            "page": payload.get("page"),
+        })
+    return _hydrate_texts(results)
+
+
+def project_vectors(vectors, collection_name: str) -> np.ndarray:
+    """Vektor query dalam ruang collection: proyeksi PCA versi itu bila ada (app/core/projection.py)."""
+    projection = get_projection(collection_name)
+    return vectors if projection is None else projection.transform(vectors)
+
+
+def _search_params(collection_name: str):
+    """Collection terkuantisasi: tahap pertama di vektor biner, lalu rescoring dengan vektor asli."""
+    try:
+        quantized = is_quantized(collection_name)
+    except Exception as e:
+        logger.warning(f"[RAG] Konfigurasi collection '{collection_name}' tidak terbaca: {e}")
+        return None
+    if not quantized:
+        return None
+    return models.SearchParams(quantization=models.QuantizationSearchParams(
+        rescore=True, oversampling=settings.RAG.RAG_QUANTIZATION_OVERSAMPLING))
+
+
+def _payload_fields() -> list:
+    if settings.RAG.RAG_SLIM_PAYLOAD:
+        return ["source", "page"]
+    return ["text", "source", "page"]
+
+
+def _search_lean(client, collection_name: str, query_vec, top_k: int, score_threshold, query_filter=None):
+    """
+    Jalur ramping: skor cosine dari Qdrant dipakai langsung, threshold diterapkan
+    di server, dan hanya field payload yang diperlukan yang dikirim (tanpa vektor).
+    """
+    hits = client.search(
+        collection_name=collection_name,
+        query_vector=query_vec.tolist(),
+        limit=top_k,
+        with_payload=_payload_fields(),
+        with_vectors=False,
+        score_threshold=score_threshold,
+        query_filter=query_filter,
+        search_params=_search_params(collection_name)
+    )
+    return _postprocess_hits(hits, top_k)
+
+
+def _search_legacy(client, collection_name: str, query_vec, top_k: int, query_filter=None):
+    """
+    Jalur lama: ambil top_k*2 kandidat beserta vektornya lalu hitung ulang
+    cosine similarity di klien. Dipertahankan untuk perbandingan benchmark.
+    """
+    hits = client.search(
+        collection_name=collection_name,
+        query_vector=query_vec.tolist(),
+        limit=top_k * 2,  # Ambil lebih banyak untuk fleksibilitas
+        with_payload=True,
+        with_vectors=True,
+        query_filter=query_filter,
+        search_params=_search_params(collection_name)
+    )
+
+    if not hits:
+        return []
+
+    # Filter dokumen valid
+    candidates, vectors = [], []
+    for hit in hits:
+        vector = hit.vector
+        if vector is None:
+            continue
+        if np.any(np.isnan(vector)):
+            logger.warning("Melewati dokumen dengan vektor NaN")
+            continue
+        payload = hit.payload or {}
+        candidates.append({
+            "id": str(hit.id),
+            "text": payload.get("text", "").strip(),
+            "source": payload.get("source"),
+            "page": payload.get("page"),
+        })
+        vectors.append(vector)
+
+    if not vectors:
+        return []
+
+    # Hitung cosine similarity
+    vectors = np.array(vectors)
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vec)
+    sims = (vectors @ query_vec) / np.where(norms == 0, 1.0, norms)
+
+    # Bangun hasil
+    for candidate, sim in zip(candidates, sims):
+        candidate["score"] = float(sim)
+    candidates.sort(key=lambda x: x["score"], reverse=True)
+    return _hydrate_texts(candidates[:top_k])
+
+
+def _search_hybrid(client, collection_name: str, query: str, query_vec, top_k: int, lexical_index,
+                   query_filter=None):
+    """
+    Jalur hibrida: kandidat dense (tanpa threshold, agar peringkatnya lengkap) dan
+    kandidat BM25 digabung dengan RRF. 'score' tetap cosine dense (0.0 bila dokumen
+    hanya ditemukan secara leksikal); 'lexical_match' menandai kecocokan leksikal kuat
+    (lihat _is_lexical_match).
+    `query_filter` (partisi topik) hanya membatasi sisi dense; BM25 selalu seluruh korpus.
+    """
+    hits = client.search(
+        collection_name=collection_name,
+        query_vector=query_vec.tolist(),
+        limit=max(top_k, settings.RAG.RAG_HYBRID_CANDIDATES),
+        with_payload=_payload_fields(),
+        with_vectors=False,
+        query_filter=query_filter,
+        search_params=_search_params(collection_name)
+    )
+    return _fuse_hybrid(client, collection_name, query, hits, top_k, lexical_index)
+
+
+def _is_lexical_match(lexical_hit, dense_score: float) -> bool:
+    """
+    Kecocokan leksikal yang cukup kuat untuk melewati threshold dense: rasio IDF
+    tinggi DAN (minimal RAG_LEXICAL_MIN_TERMS term query cocok, atau skor dense
+    minimal RAG_LEXICAL_MIN_DENSE_SCORE). Query satu term selalu berrasio 1.0,
+    jadi rasio saja akan meloloskan dokumen apa pun yang memuat kata itu.
+    """
+    if lexical_hit is None:
+        return False
+    ratio, matched = lexical_hit
+    if ratio < settings.RAG.RAG_LEXICAL_MATCH_RATIO:
+        return False
+    return matched >= settings.RAG.RAG_LEXICAL_MIN_TERMS or dense_score >= settings.RAG.RAG_LEXICAL_MIN_DENSE_SCORE
+
+
+def _fuse_hybrid(client, collection_name: str, query: str, hits, top_k: int, lexical_index):
+    """Gabungkan kandidat dense `hits` dengan kandidat BM25 (RRF); lihat _search_hybrid."""
+    limit = max(top_k, settings.RAG.RAG_HYBRID_CANDIDATES)
+    dense = {normalize_id(hit.id): hit for hit in hits}
+    with observe_stage('lexical_search'):
+        lexical = {doc_id: (ratio, matched) for doc_id, _, ratio, matched in lexical_index.search(query, limit)}
+
+    fused = reciprocal_rank_fusion([list(dense), list(lexical)], k=settings.RAG.RAG_RRF_K)[:top_k]
+
+    # Payload untuk dokumen yang hanya muncul di sisi leksikal
+    lexical_only = [doc_id for doc_id, _ in fused if doc_id not in dense]
+    payloads = {}
+    if lexical_only:
+        points = client.retrieve(
+            collection_name=collection_name,
+            ids=lexical_only,  # hex md5, format yang sama dengan saat ingestion
+            with_payload=_payload_fields()
+        )
+        payloads = {normalize_id(p.id): p.payload or {} for p in points}
+
+    results = []
+    for doc_id, rrf_score in fused:
+        hit = dense.get(doc_id)
+        payload = (hit.payload if hit else payloads.get(doc_id)) or {}
+        results.append({
+            "id": doc_id,
+            "text": payload.get("text", "").strip(),
+            "score": float(hit.score) if hit else 0.0,
+            "source": payload.get("source"),
+            "page": payload.get("page"),
+            "rrf_score": rrf_score,
+            "lexical_match": _is_lexical_match(lexical.get(doc_id), float(hit.score) if hit else 0.0),
+        })
+    return _hydrate_texts(results)
+
+
+def topic_filter(topic):
+    """Filter payload Qdrant untuk satu kategori (app/core/topics.py); None = semua partisi."""
+    if topic is None:
+        return None
+    return models.Filter(must=[models.FieldCondition(key="category", match=models.MatchValue(value=topic))])
+
+
+def route_topic(query: str, query_vec, collection_name: str):
+    """Kategori tujuan query, atau None bila routing nonaktif / router belum dibangun / ragu."""
+    if not settings.RAG.RAG_TOPIC_ROUTING:
+        return None
+    router = get_topic_router(collection_name)
+    if router is None:
+        return None
+    return router.route(query, query_vec, settings.RAG.RAG_TOPIC_MARGIN, settings.RAG.RAG_TOPIC_KEYWORD_WEIGHT)
+
+
+def _search_partition(client, collection_name: str, query: str, query_vec, top_k: int, score_threshold,
+                      lexical_index, query_filter):
+    if lexical_index is not None:
+        return _search_hybrid(client, collection_name, query, query_vec, top_k, lexical_index, query_filter)
+    if settings.RAG.RAG_LEAN_RETRIEVAL:
+        return _search_lean(client, collection_name, query_vec, top_k, score_threshold, query_filter)
+    return _search_legacy(client, collection_name, query_vec, top_k, query_filter)
+
+
+@traced('search_qdrant')
+def search_qdrant(query: str, top_k: int = 3, score_threshold: float = None, query_vec=None):
     """
-    Cari dokumen relevan di Qdrant dengan preprocessing, embedding, dan validasi vektor.
-    Mengembalikan: List[{'text': str, 'score': float}]
+    Cari dokumen relevan di Qdrant dengan preprocessing dan embedding.
+    `score_threshold` default ke RAG_RELEVANCE_THRESHOLD (hanya pada jalur ramping).
+    `query_vec` (hasil embed_query) dipakai bila sudah dihitung, mis. oleh lookup FAQ.
+    Mengembalikan: List[{'id', 'text', 'score', 'source', 'page'}]; jalur hibrida
+    menambahkan 'rrf_score' dan 'lexical_match'.
     """
     logger.info(f"[RAG] Mencari dokumen untuk query: '{query}'")
     
@@ -92,81 +326,237 @@ def search_qdrant(query: str, top_k: int = 3):
         rag = get_runtime_components()
         client = rag["qdrant_client"]
         embedder = rag["embedder"]
-        collection_name = rag["collection_name"]
+        collection_name = get_active_collection()  # collection fisik di balik alias
     except Exception as e:
         logger.error(f"[RAG] Gagal memuat komponen RAG: {e}")
         return []
 
+    if score_threshold is None:
+        score_threshold = settings.RAG.RAG_RELEVANCE_THRESHOLD
+
     try:
-        # Preprocess & encode
-        processed_query = preprocess_query(query)
-        query_vec = embedder.encode(
-            [processed_query],
-            normalize_embeddings=True,
-            convert_to_numpy=True
-        )[0]
-
-        # Ambil kandidat dari Qdrant
-        hits = client.search(
-            collection_name=collection_name,
-            query_vector=query_vec.tolist(),
-            limit=top_k * 2,  # Ambil lebih banyak untuk fleksibilitas
-            with_payload=True,
-            with_vectors=True
-        )
+        if query_vec is None:
+            with observe_stage('embed'):
+                query_vec = embed_query(query, embedder)
+        lexical_index = get_lexical_index(collection_name) if settings.RAG.RAG_HYBRID_RETRIEVAL else None
+
+        with observe_stage('vector_search'):
+            topic = route_topic(query, query_vec, collection_name)
+            search_vec = project_vectors(query_vec, collection_name)
+            final_results = _search_partition(client, collection_name, query, search_vec, top_k,
+                                              score_threshold, lexical_index, topic_filter(topic))
+            if topic is not None and not filter_relevant(final_results, score_threshold):
+                logger.info(f"[RAG] Partisi '{topic}' tanpa hasil relevan; mencari di semua partisi")
+                record_topic_route(topic, 'widened')
+                final_results = _search_partition(client, collection_name, query, search_vec, top_k,
+                                                  score_threshold, lexical_index, None)
+            elif settings.RAG.RAG_TOPIC_ROUTING:
+                record_topic_route(topic, 'routed' if topic else 'unrouted')
 
-        if not hits:
-            return []
+        logger.info(f"[RAG] Skor relevansi: {[round(r['score'], 3) for r in final_results]}")
+        return final_results
 
-        # Filter dokumen valid
-        texts, vectors = [], []
-        for hit in hits:
-            text = hit.payload.get("text", "").strip()
-            vector = hit.vector
-            if not text or vector is None:
-                continue
-            if np.any(np.isnan(vector)):
-                logger.warning("Melewati dokumen dengan vektor NaN")
-                continue
-            texts.append(text)
-            vectors.append(vector)
+    except Exception as e:
+        logger.error(f"[RAG] Error saat pencarian: {e}", exc_info=True)
+        return []
 
-        if not vectors:
-            return []
 
-        # Hitung cosine similarity
-        vectors = np.array(vectors)
-        sims = cosine_similarity([query_vec], vectors)[0]
+@traced('search_qdrant_batch')
+def search_qdrant_batch(queries: list, query_vecs, top_k: int = 3, score_threshold: float = None) -> list:
+    """
+    search_qdrant untuk banyak query: satu permintaan search_batch ke Qdrant untuk
+    semua vektor (hasil embed_queries). Mengembalikan satu daftar hasil per query,
+    format sama dengan search_qdrant. Jalur lama (non-ramping) tetap per query.
+    """
+    if not queries:
+        return []
 
-        # Bangun hasil
-        results = [
-            {"text": text, "score": float(sim)}
-            for text, sim in zip(texts, sims)
-        ]
-        results.sort(key=lambda x: x["score"], reverse=True)
+    try:
+        rag = get_runtime_components()
+        client = rag["qdrant_client"]
+        collection_name = get_active_collection()
+    except Exception as e:
+        logger.error(f"[RAG] Gagal memuat komponen RAG: {e}")
+        return [[] for _ in queries]
 
-        # Ambil top_k terbaik
-        final_results = results[:top_k]
-        logger.info(f"[RAG] Skor relevansi: {[round(r['score'], 3) for r in final_results]}")
-        return final_results
+    if score_threshold is None:
+        score_threshold = settings.RAG.RAG_RELEVANCE_THRESHOLD
+
+    try:
+        lexical_index = get_lexical_index(collection_name) if settings.RAG.RAG_HYBRID_RETRIEVAL else None
+        if lexical_index is None and not settings.RAG.RAG_LEAN_RETRIEVAL:
+            return [search_qdrant(q, top_k, score_threshold, query_vec=v) for q, v in zip(queries, query_vecs)]
+        if lexical_index is not None:
+            limit, threshold = max(top_k, settings.RAG.RAG_HYBRID_CANDIDATES), None
+        else:
+            limit, threshold = top_k, score_threshold
+
+        def run(indices: list, topics: list) -> list:
+            requests = [
+                models.SearchRequest(vector=search_vecs[i].tolist(), limit=limit, with_payload=_payload_fields(),
+                                     with_vector=False, score_threshold=threshold, filter=topic_filter(topic),
+                                     params=_search_params(collection_name))
+                for i, topic in zip(indices, topics)
+            ]
+            batches = client.search_batch(collection_name=collection_name, requests=requests)
+            if lexical_index is not None:
+                return [_fuse_hybrid(client, collection_name, queries[i], hits, top_k, lexical_index)
+                        for i, hits in zip(indices, batches)]
+            return [_postprocess_hits(hits, top_k) for hits in batches]
+
+        with observe_stage('vector_search'):
+            topics = [route_topic(q, v, collection_name) for q, v in zip(queries, query_vecs)]
+            search_vecs = project_vectors(np.asarray(query_vecs), collection_name)
+            results = run(list(range(len(queries))), topics)
+            # Partisi tanpa hasil relevan: ulangi tanpa filter, tetap dalam satu permintaan
+            widen = [i for i, topic in enumerate(topics)
+                     if topic is not None and not filter_relevant(results[i], score_threshold)]
+            if widen:
+                for i, widened in zip(widen, run(widen, [None] * len(widen))):
+                    results[i] = widened
+            if settings.RAG.RAG_TOPIC_ROUTING:
+                widened = set(widen)
+                for i, topic in enumerate(topics):
+                    record_topic_route(topic, 'widened' if i in widened else ('routed' if topic else 'unrouted'))
+        logger.info(f"[RAG] Pencarian batch: {len(queries)} query dalam satu permintaan")
+        return results
 
     except Exception as e:
-        logger.error(f"[RAG] Error saat pencarian: {e}", exc_info=True)
-        return []
+        logger.error(f"[RAG] Error saat pencarian batch: {e}", exc_info=True)
+        return [[] for _ in queries]
+
+
+def filter_relevant(results: list, threshold: float = None) -> list:
+    """
+    Hasil retrieval yang cukup relevan untuk dijadikan konteks: skor di atas
+    threshold, atau cocok secara leksikal (nomor dokumen/akronim, jalur hibrida).
+    Daftar kosong berarti permintaan jatuh ke Google Search.
+    """
+    if threshold is None:
+        threshold = settings.RAG.RAG_RELEVANCE_THRESHOLD
+    return [
+        doc for doc in results
+        if doc.get("score", 0) > threshold or doc.get("lexical_match", False)
+    ]
+
+
+def collect_sources(docs: list) -> list:
+    """Sitasi unik (dokumen + halaman) dari metadata hasil retrieval."""
+    sources = []
+    for doc in docs:
+        if not doc.get("source"):
+            continue
+        citation = {'source': doc["source"], 'page': doc.get("page")}
+        if citation not in sources:
+            sources.append(citation)
+    return sources
+
+
+MIN_SENTENCE_CHARS = 20  # potongan lebih pendek (nomor butir, judul, sisa overlap) tidak dipilih
+
+# Vektor kalimat per chunk, kunci (embedder, id chunk): chunk yang sering terambil
+# tidak di-encode ulang. Entri memegang referensi embedder seperti _embedding_cache.
+_sentence_cache = LocalLRU(settings.RAG.CONTEXT_SENTENCE_CACHE_CHUNKS)
+
+
+def split_sentences(text: str) -> list:
+    """Kalimat dari teks chunk (batas . ! ?), spasi dan baris baru hasil ekstraksi PDF dirapikan."""
+    sentences = (" ".join(sentence.split()) for sentence in re.split(r'(?<=[.!?])\s+', text or ""))
+    return [sentence for sentence in sentences if sentence]
+
+
+def _sentence_vectors(docs: list, embedder) -> list:
+    """(kalimat, matriks vektor) per dokumen; kalimat chunk yang belum di cache di-encode dalam satu batch."""
+    per_doc, missing = [None] * len(docs), []
+    for i, doc in enumerate(docs):
+        cached = _sentence_cache.get((id(embedder), doc["id"]))
+        if cached is not None:
+            per_doc[i] = cached[1:]
+        else:
+            missing.append((i, [s for s in split_sentences(doc["text"]) if len(s) >= MIN_SENTENCE_CHARS]))
+
+    texts = [sentence for _, sentences in missing for sentence in sentences]
+    vectors = _encode(texts, embedder) if texts else None
+    offset = 0
+    for i, sentences in missing:
+        per_doc[i] = (sentences, vectors[offset:offset + len(sentences)] if sentences else None)
+        _sentence_cache.set((id(embedder), docs[i]["id"]), (embedder, *per_doc[i]))
+        offset += len(sentences)
+    return per_doc
+
+
+def compress_context(docs: list, query_vec, embedder, budget_chars: int) -> str:
+    """
+    Konteks ekstraktif: kalimat dari `docs` diskor dengan cosine ke `query_vec` (vektor
+    embed_query yang sudah dihitung) dalam satu perkalian matriks, lalu yang teratas
+    diambil selama muat di `budget_chars` dan disusun kembali sesuai urutan dokumen.
+    Kalimat terbaik selalu ikut walau melebihi budget.
+    """
+    per_doc = _sentence_vectors(docs, embedder)
+    candidates = [(doc_rank, position, sentence)
+                  for doc_rank, (sentences, _) in enumerate(per_doc)
+                  for position, sentence in enumerate(sentences)]
+    if not candidates:
+        return "\n".join(doc["text"] for doc in docs)
+    matrix = np.vstack([vectors for sentences, vectors in per_doc if sentences])
+    scores = matrix @ np.asarray(query_vec, dtype=np.float32)
+
+    chosen, used = [], 0
+    for i in np.argsort(-scores, kind='stable'):
+        length = len(candidates[i][2]) + 1
+        if chosen and used + length > budget_chars:
+            continue
+        chosen.append(candidates[i])
+        used += length
+    chosen.sort()
+
+    lines = {}
+    for doc_rank, _, sentence in chosen:
+        lines.setdefault(doc_rank, []).append(sentence)
+    return "\n".join(" ".join(sentences) for sentences in lines.values())
+
+
+def build_rag_context(user_query: str, docs: list, query_vec=None) -> str:
+    """
+    Teks konteks internal untuk prompt dari dokumen relevan. Dengan
+    RAG_CONTEXT_COMPRESSION, konteks yang melebihi RAG_CONTEXT_BUDGET_CHARS
+    dipadatkan dengan compress_context (tanpa panggilan LLM); `query_vec`
+    dihitung dari cache embedding bila belum ada.
+    """
+    full = "\n".join(doc["text"] for doc in docs)
+    budget = settings.RAG.RAG_CONTEXT_BUDGET_CHARS
+    if not settings.RAG.RAG_CONTEXT_COMPRESSION or len(full) <= budget:
+        return full
+    try:
+        with observe_stage('context_compress'):
+            embedder = get_runtime_components()['embedder']
+            if query_vec is None:
+                query_vec = embed_query(user_query, embedder)
+            context = compress_context(docs, query_vec, embedder, budget)
+    except Exception as e:
+        logger.warning(f"[RAG] Kompresi konteks gagal, memakai konteks penuh: {e}")
+        return full
+    record_context_chars(len(full), len(context))
+    logger.info(f"[RAG] Konteks dipadatkan {len(full)} -> {len(context)} karakter")
+    return context
 
 
 # ===================================================================
 # 4. KONSTRUKSI PROMPT
 # ===================================================================
-def construct_prompt(user_query: str, rag_context: str = "", conversation_history: str = "") -> tuple[str, str]:
+def construct_prompt(user_query: str, rag_context: str = "", conversation_history: str = "",
+                     web_context: str = "") -> tuple[str, str]:
     """
     Bangun system prompt dan user prompt untuk LLM.
+    `web_context` berisi hasil Custom Search yang sudah diambil (spekulatif), sehingga
+    model tidak perlu memanggil tool search_google.
     """
     system_prompt = (
         "Anda adalah Customer Service resmi Kampus UIN Salatiga. "
         "Jawab dengan profesional, ramah, sopan, dan akurat. "
         "1. Jika ada KONTEKS INTERNAL, gunakan hanya informasi tersebut. "
         "2. Jika tidak ada konteks, gunakan Google Search untuk mencari informasi terkini. "
+        "Jika HASIL PENCARIAN WEB tersedia, gunakan hasil itu untuk melengkapi konteks internal. "
         "3. Jangan mengarang, jangan menyebut proses teknis, dan batasi jawaban maksimal 2 kalimat."
     )
 
@@ -177,12 +567,38 @@ def construct_prompt(user_query: str, rag_context: str = "", conversation_histor
         parts.append(f"KONTEKS INTERNAL:\n{rag_context}")
     else:
         parts.append("KONTEKS INTERNAL: Tidak tersedia.")
+    if web_context.strip():
+        parts.append(f"HASIL PENCARIAN WEB:\n{web_context}")
     parts.append(f"PERTANYAAN USER:\n{user_query}")
 
     user_prompt = "\n\n".join(parts)
     return system_prompt, user_prompt
 
 
+DEGRADED_NOTICE = "Layanan AI sedang sibuk; berikut kutipan langsung dari dokumen kampus yang paling relevan."
+
+
+def build_extractive_answer(user_query: str, docs: list, max_sentences: int = 2) -> str:
+    """
+    Jawaban terdegradasi tanpa LLM: kalimat dari chunk teratas dengan tumpang-tindih
+    term query terbanyak (stopword diabaikan), disusun sesuai urutan dokumen.
+    """
+    query_terms = set(tokenize(user_query)) - INDONESIAN_STOPWORDS
+    candidates = []
+    for doc_rank, doc in enumerate(docs):
+        for position, sentence in enumerate(split_sentences(doc["text"])):
+            if len(sentence) < MIN_SENTENCE_CHARS:
+                continue
+            overlap = len(query_terms & set(tokenize(sentence)))
+            candidates.append((overlap, -doc_rank, -position, sentence))
+
+    if not candidates:
+        return f"{DEGRADED_NOTICE}\n\n{docs[0]['text'][:500]}" if docs else DEGRADED_NOTICE
+    best = sorted(candidates, reverse=True)[:max_sentences]
+    best.sort(key=lambda c: (-c[1], -c[2]))  # kembalikan ke urutan dokumen
+    return f"{DEGRADED_NOTICE}\n\n" + " ".join(c[3] for c in best)
+
+
 # ===================================================================
 # 5. FUNGSI UTAMA: ORKESTRATOR LLM (RAG + GOOGLE SEARCH)
 # ===================================================================
@@ -194,6 +610,30 @@ import os
 GOOGLE_SEARCH_API_KEY = settings.GOOGLE_SEARCH_API_KEY
 SEARCH_ENGINE_ID = settings.SEARCH_ENGINE_ID
 
+
+def _gemini_breaker():
+    return get_breaker('gemini', settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RESET_SECONDS)
+
+
+def _search_breaker():
+    return get_breaker('custom_search', settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RESET_SECONDS)
+
+
+def _is_search_failure(exc) -> bool:
+    """4xx karena permintaan kita (selain kuota/limit) bukan tanda upstream sakit."""
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        status = exc.response.status_code
+        return status >= 500 or status in (403, 429)
+    return True
+
+
+def _is_llm_failure(exc) -> bool:
+    """Argumen/konten tidak valid (4xx selain 429) tidak menghitung kegagalan Gemini."""
+    if isinstance(exc, google_exceptions.ClientError):
+        return isinstance(exc, google_exceptions.TooManyRequests)
+    return True
+
+@traced('search_google')
 def search_google(query: str) -> dict: # <-- UBAH TIPE OUTPUT MENJADI DICT
     """
     Melakukan pencarian di Google dan mengembalikan hasil terstruktur
@@ -204,7 +644,12 @@ def search_google(query: str) -> dict: # <-- UBAH TIPE OUTPUT MENJADI DICT
         # Kembalikan dictionary error
         return {"error": "Layanan pencarian tidak terkonfigurasi."}
 
-    url = "https://www.googleapis.com/customsearch/v1"
+    cached = get_cached_search(query)
+    if cached:
+        logger.info(f"[TOOL] Hasil Google Search dari cache untuk: '{query}'")
+        return cached
+
+    url = settings.GOOGLE_SEARCH_URL
     params = {
         'key': GOOGLE_SEARCH_API_KEY,
         'cx': SEARCH_ENGINE_ID,
@@ -212,10 +657,19 @@ def search_google(query: str) -> dict: # <-- UBAH TIPE OUTPUT MENJADI DICT
         'num': 3 # Ambil 3 hasil teratas
     }
     
-    try:
-        response = requests.get(url, params=params, timeout=5)
+    def fetch(timeout):
+        response = requests.get(url, params=params, timeout=timeout)
         response.raise_for_status()
-        results = response.json()
+        return response.json()
+
+    try:
+        results = call_upstream(
+            _search_breaker(),
+            fetch,
+            hedge_after=settings.SEARCH_HEDGE_AFTER_SECONDS,
+            default_timeout=settings.SEARCH_TIMEOUT_SECONDS,
+            is_failure=_is_search_failure,
+        )
         
         snippets_list = []
         if 'items' in results:
@@ -229,19 +683,27 @@ def search_google(query: str) -> dict: # <-- UBAH TIPE OUTPUT MENJADI DICT
         
         if not snippets_list:
             # Kembalikan dictionary "tidak ditemukan"
-            return {"status": "not_found", "message": "Tidak ada hasil pencarian yang relevan."}
-            
-        # --- PERUBAHAN KRITIS ---
-        # Kembalikan dictionary yang berisi list hasil
-        return {"status": "success", "results": snippets_list}
+            result = {"status": "not_found", "message": "Tidak ada hasil pencarian yang relevan."}
+        else:
+            # Kembalikan dictionary yang berisi list hasil
+            result = {"status": "success", "results": snippets_list}
+        cache_search(query, result, ttl=settings.SEARCH_CACHE_TTL_SECONDS)
+        return result
         
+    except UpstreamUnavailable as e:
+        # Sirkuit terbuka / anggaran habis: model menjawab tanpa hasil pencarian
+        logger.warning(f"[TOOL] Google Search tidak tersedia: {e}")
+        return {"error": "Layanan pencarian sedang tidak tersedia."}
+
     except requests.exceptions.RequestException as e:
         logger.error(f"[TOOL] Error saat memanggil Google Search API: {e}")
         return {"error": f"Error saat menghubungi layanan pencarian: {e}"}
 
+
 # ... (Kode di atas tetap sama) ...
 
 # Asumsi: settings, logger, dan fungsi search_google sudah didefinisikan di atas
+@traced('ask_gemini')
 def ask_gemini(
     system_prompt: str,
     user_prompt: str,
@@ -283,59 +745,39 @@ def ask_gemini(
         {'role': 'user', 'parts': [{"text": "\n\n".join(prompt_to_send)}]}
     ]
 
+    rounds = 0
+
+    def generate(contents, allow_tools=True):
+        nonlocal rounds
+        rounds += 1
+        # Ronde terakhir setelah anggaran tool habis: paksa jawaban teks
+        tool_config = None if allow_tools or not tools else {'function_calling_config': {'mode': 'NONE'}}
+        with observe_stage('llm_round'):
+            # Setiap round hanya memakai sisa deadline permintaan; hedge bila Gemini lambat
+            return call_upstream(
+                _gemini_breaker(),
+                lambda timeout: model.generate_content(
+                    contents,
+                    generation_config=generation_config,
+                    tool_config=tool_config,
+                    request_options={'timeout': timeout},
+                ),
+                hedge_after=settings.LLM_HEDGE_AFTER_SECONDS,
+                default_timeout=settings.LLM_TIMEOUT_SECONDS,
+                is_failure=_is_llm_failure,
+            )
+
     try:
-        # --- 3. Panggil Model (Stateless) ---
-        response = model.generate_content(
-            history, # Kirim list [dict]
-            generation_config=generation_config
+        # --- 3 & 4. Panggil model + eksekusi function calling (paralel per giliran, dibatasi) ---
+        response, _ = run_tool_loop(
+            generate,
+            history,
+            {tool.__name__: tool for tool in tools},
+            max_rounds=settings.LLM_MAX_TOOL_ROUNDS,
+            budget_seconds=settings.LLM_TOOL_LOOP_SECONDS,
+            max_chars=settings.TOOL_RESULT_MAX_CHARS,
         )
 
-        # --- 4. Loop Eksekusi Function Calling (Stateless) ---
-        while response.candidates[0].content.parts[0].function_call:
-            fc = response.candidates[0].content.parts[0].function_call
-            
-            # --- PERBAIKAN KRITIS 1: Konversi 'Content' object (permintaan model) ke 'dict' ---
-            model_request_dict = {
-                'role': 'model',
-                'parts': [
-                    # Ubah objek 'Part' menjadi 'dict'
-                    {'function_call': {'name': fc.name, 'args': dict(fc.args)}}
-                ]
-            }
-            history.append(model_request_dict)
-            # -------------------------------------------------------------------------
-
-            if fc.name == "search_google":
-                logger.info(f"[TOOL] Model meminta Google Search dengan query: {dict(fc.args)}")
-                
-                result_dict = search_google(**dict(fc.args)) # Ini dict, sudah benar
-                
-                # --- PERBAIKAN KRITIS 2: Konversi 'FunctionResponse' (jawaban kita) ke 'dict' ---
-                history.append({
-                    'role': 'function',
-                    'parts': [
-                        # Ubah objek 'types.FunctionResponse' menjadi 'dict'
-                        {'function_response': {'name': 'search_google', 'response': result_dict}}
-                    ]
-                })
-                # --------------------------------------------------------------------------
-
-                # Panggil model LAGI dengan riwayat [dict, dict, dict]
-                response = model.generate_content(
-                    history,
-                    generation_config=generation_config
-                )
-            else:
-                # ... (Handle fungsi tidak dikenal) ...
-                logger.error(f"Model meminta fungsi yang tidak dikenal: {fc.name}")
-                history.append({
-                    'role': 'function',
-                    'parts': [
-                        {'function_response': {'name': fc.name, 'response': {"error": "Fungsi tidak tersedia."}}}
-                    ]
-                })
-                response = model.generate_content(history, generation_config=generation_config)
-
         # --- 5. Ambil Jawaban Final ---
         answer = response.text.strip()
         
@@ -344,6 +786,122 @@ def ask_gemini(
             
         return answer
 
+    except UpstreamUnavailable:
+        raise  # ditangani pemanggil (jawaban terdegradasi / 503 cepat)
+
     except Exception as e:
         logger.error(f"[LLM] Error kritis: {e}", exc_info=True)
-        raise ConnectionError(f"Gagal memproses permintaan: {str(e)}")
\ No newline at end of file
+        raise ConnectionError(f"Gagal memproses permintaan: {str(e)}")
+
+    finally:
+        LLM_ROUNDS.observe(rounds)
+
+
+# ===================================================================
+# 6. GOOGLE SEARCH SPEKULATIF
+# ===================================================================
+# Query yang jawabannya cenderung berubah (jadwal, pengumuman, tahun berjalan):
+# dokumen internal mungkin usang, jadi pencarian web dimulai sejajar retrieval.
+TIME_SENSITIVE_PATTERN = re.compile(
+    r"\b(terbaru|terkini|sekarang|saat ini|hari ini|minggu ini|bulan ini|tahun ini|besok|kemarin|"
+    r"kapan|jadwal|pengumuman|berita|deadline|batas waktu|dibuka|ditutup|20\d\d)\b",
+    re.IGNORECASE,
+)
+
+
+def is_time_sensitive(query: str) -> bool:
+    return bool(TIME_SENSITIVE_PATTERN.search(query))
+
+
+def is_borderline(results: list, threshold: float = None) -> bool:
+    """Skor teratas hanya tipis di atas threshold (dan bukan kecocokan leksikal)."""
+    if threshold is None:
+        threshold = settings.RAG.RAG_RELEVANCE_THRESHOLD
+    if not results or any(doc.get("lexical_match") for doc in results):
+        return False
+    top = max(doc.get("score", 0) for doc in results)
+    return threshold < top <= threshold + settings.SPECULATIVE_BORDERLINE_MARGIN
+
+
+def _search_detached(query: str) -> dict:
+    # Bisa selesai setelah permintaan berakhir: jangan menulis span ke trace permintaan
+    with detached_from_trace():
+        return search_google(query)
+
+
+def start_speculative_search(query: str):
+    """Mulai Custom Search di latar (deadline permintaan ikut terbawa). Mengembalikan Future."""
+    logger.info(f"[SPEKULATIF] Google Search dimulai untuk: '{query}'")
+    return submit_in_context(_search_detached, query)
+
+
+def collect_speculative_search(future) -> dict:
+    """Tunggu hasil spekulatif dalam sisa anggaran; None bila belum selesai/gagal."""
+    request_left = remaining()
+    timeout = settings.SEARCH_TIMEOUT_SECONDS if request_left is None else max(0.0, min(request_left, settings.SEARCH_TIMEOUT_SECONDS))
+    try:
+        result = future.result(timeout=timeout)
+    except Exception as e:
+        logger.warning(f"[SPEKULATIF] Hasil tidak tersedia: {type(e).__name__}: {e}")
+        future.cancel()
+        return None
+    return None if 'error' in result else result
+
+
+def discard_speculative_search(future):
+    """
+    Hasil tidak dipakai: batalkan bila belum berjalan; bila sudah berjalan,
+    search_google menyimpannya ke cache saat selesai untuk permintaan berikutnya.
+    """
+    future.cancel()
+
+
+def format_web_context(result: dict) -> str:
+    if not result or result.get('status') != 'success':
+        return ""
+    return "\n".join(
+        f"- {item['source_title']}: {item['snippet']} ({item['url']})"
+        for item in result['results']
+    )
+
+
+# ===================================================================
+# 7. RINGKASAN PERCAKAPAN (dipanggil di latar oleh app/core/summarizer.py)
+# ===================================================================
+SUMMARY_SYSTEM_PROMPT = (
+    "Anda merangkum percakapan antara pengguna dan Customer Service UIN Salatiga. "
+    "Tulis satu paragraf ringkasan berjalan maksimal 80 kata dalam bahasa Indonesia: topik yang "
+    "ditanyakan, fakta penting yang sudah dijawab, dan hal yang masih dicari pengguna. "
+    "Gabungkan RINGKASAN SEBELUMNYA dengan GILIRAN BARU; jangan menambah informasi baru."
+)
+
+
+def summarize_conversation(previous_summary: str, turns: list) -> str:
+    """Ringkasan baru = ringkasan lama + giliran yang dilipat. "" bila model tidak menjawab."""
+    sections = []
+    if previous_summary:
+        sections.append(f"RINGKASAN SEBELUMNYA:\n{previous_summary}")
+    sections.append("GILIRAN BARU:\n" + "\n".join(f"User: {t['user']}\nAI: {t['ai']}" for t in turns))
+
+    model = genai.GenerativeModel(
+        model_name=settings.SUMMARY_MODEL_NAME or settings.GEMINI_MODEL_NAME,
+        system_instruction=SUMMARY_SYSTEM_PROMPT,
+    )
+    # Tanpa hedging: tidak ada pengguna yang menunggu, jangan menambah beban Gemini
+    response = call_upstream(
+        _gemini_breaker(),
+        lambda timeout: model.generate_content(
+            "\n\n".join(sections),
+            generation_config=genai.GenerationConfig(temperature=0.1, max_output_tokens=1024),
+            request_options={'timeout': timeout},
+        ),
+        hedge_after=settings.LLM_TIMEOUT_SECONDS,
+        default_timeout=settings.LLM_TIMEOUT_SECONDS,
+        max_attempts=1,
+        is_failure=_is_llm_failure,
+    )
+    try:
+        text = response.text.strip()
+    except ValueError:  # tidak ada part teks (diblokir / token habis)
+        return ""
+    return text[:settings.SUMMARY_MAX_CHARS]
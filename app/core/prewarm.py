@@ -0,0 +1,201 @@
+# app/core/prewarm.py
+"""
+Pemanasan cache jawaban dari log query, setelah deploy atau reset cache.
+
+- mine_top_queries(): hitung frekuensi pertanyaan per canonical_key (kunci yang
+  sama dengan cache jawaban) dari log JSONL berfield 'query' (QUERY_LOG_PATH,
+  tanpa sampling; bukan log trace yang condong ke permintaan lambat)
+  atau file teks satu query per baris; tiap kelompok membawa beberapa bentuk
+  asli terseringnya sebagai informasi.
+- warm_cache(): embedding semua pertanyaan dihitung sekaligus (batch), lalu
+  per kelompok: lewati bila sudah ada di cache atau dijawab FAQ, selain itu
+  jalankan pipeline RAG + Gemini yang sama dengan /api/ask (tanpa riwayat)
+  dan simpan jawabannya (satu entri kanonik melayani semua bentuk asli). Panggilan Gemini dibatasi
+  rate_per_minute; berhenti bila sirkuit Gemini terbuka atau versi knowledge
+  base berubah di tengah jalan.
+- run_prewarm() membungkus warm_cache dengan kunci lintas worker dan status
+  di Redis; dipakai CLI scripts/prewarm_cache.py dan POST /api/admin/cache/prewarm.
+"""
+
+import json
+import time
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from app.config import settings
+from app.rag_initializer import get_runtime_components, get_active_collection
+from app.redis_manager import (
+    cache_response, has_cached_response, acquire_task_lock, release_task_lock, set_task_status,
+)
+from app.core.main import (
+    search_qdrant, filter_relevant, construct_prompt, ask_gemini, embed_queries, build_rag_context,
+)
+from app.core.faq import get_faq_index
+from app.core.resilience import start_deadline, end_deadline, UpstreamUnavailable
+from app.utils.validators import validate_query
+from app.utils.text import canonical_key
+
+logger = logging.getLogger(__name__)
+
+TASK_NAME = 'prewarm'
+
+
+# ===================================================================
+# MENAMBANG LOG QUERY
+# ===================================================================
+def read_query_log(path: str):
+    """Query dari satu file log; baris JSON tanpa field 'query' atau rusak dilewati."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith('.jsonl'):
+                try:
+                    query = json.loads(line).get('query')
+                except (ValueError, AttributeError):
+                    continue
+            else:
+                query = line
+            if isinstance(query, str) and query.strip():
+                yield query.strip()
+
+
+def mine_top_queries(paths: list, top_n: int, max_variants: int = 3) -> list:
+    """[{'query': bentuk_tersering, 'variants': [...], 'count': n}] terurut dari yang terpopuler."""
+    counts = Counter()
+    variants = defaultdict(Counter)
+    for path in paths:
+        for query in read_query_log(path):
+            if not validate_query(query):
+                continue
+            key = canonical_key(query)
+            counts[key] += 1
+            variants[key][query] += 1
+
+    top = []
+    for key, count in counts.most_common(top_n):
+        forms = [query for query, _ in variants[key].most_common(max_variants)]
+        top.append({'query': forms[0], 'variants': forms, 'count': count})
+    return top
+
+
+# ===================================================================
+# PEMANASAN
+# ===================================================================
+def answer_query(query: str, query_vec=None) -> str:
+    """Pipeline /api/ask tanpa riwayat percakapan (langkah 4-7)."""
+    results = search_qdrant(query, top_k=settings.RAG.TOP_K_RETRIEVAL, query_vec=query_vec)
+    relevant_docs = filter_relevant(results) if results else []
+    rag_context = build_rag_context(query, relevant_docs, query_vec)
+    system_prompt, user_prompt = construct_prompt(user_query=query, rag_context=rag_context)
+    return ask_gemini(
+        system_prompt=system_prompt,
+        user_prompt=user_prompt,
+        rag_context=rag_context,
+        enable_google_search=not relevant_docs,
+    )
+
+
+def warm_cache(groups: list, rate_per_minute: float, ttl: int = 3600, force: bool = False,
+               on_progress=None) -> dict:
+    """Isi cache jawaban untuk `groups` (hasil mine_top_queries). Mengembalikan statistik."""
+    version = get_active_collection()
+    stats = {'state': 'running', 'version': version, 'total': len(groups), 'done': 0, 'warmed': 0,
+             'skipped_cached': 0, 'skipped_faq': 0, 'failed': 0, 'started_at': round(time.time(), 3)}
+
+    embedder = get_runtime_components()['embedder']
+    vectors = embed_queries([group['query'] for group in groups], embedder) if groups else []
+    faq_index = get_faq_index() if settings.RAG.FAQ_ENABLED else None
+    interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+    next_call = time.monotonic()
+
+    for group, query_vec in zip(groups, vectors):
+        if get_active_collection() != version:
+            logger.warning("[PREWARM] Versi knowledge base berubah; pemanasan dihentikan")
+            stats['state'] = 'stopped'
+            break
+
+        query = group['query']
+        if not force and has_cached_response(query):
+            stats['skipped_cached'] += 1
+        elif faq_index is not None and faq_index.match(query, query_vec, settings.RAG.FAQ_MATCH_THRESHOLD):
+            # FAQ dilayani setelah cache: jawaban LLM di cache akan menutupinya
+            stats['skipped_faq'] += 1
+        else:
+            time.sleep(max(0.0, next_call - time.monotonic()))
+            next_call = time.monotonic() + interval
+            token = start_deadline(settings.REQUEST_DEADLINE_SECONDS)
+            try:
+                answer = answer_query(query, query_vec)
+                # Kunci kanonik: satu entri melayani semua variasi; tanpa itu tiap bentuk asli ditulis
+                for variant in ([query] if settings.CACHE_CANONICAL_KEYS else group['variants']):
+                    cache_response(variant, answer, ttl=ttl)
+                stats['warmed'] += 1
+            except UpstreamUnavailable as e:
+                logger.warning(f"[PREWARM] Gemini tidak tersedia, pemanasan dihentikan: {e}")
+                stats['failed'] += 1
+                stats['state'] = 'aborted'
+                break
+            except Exception as e:
+                logger.warning(f"[PREWARM] Gagal memanaskan '{query}': {type(e).__name__}: {e}")
+                stats['failed'] += 1
+            finally:
+                end_deadline(token)
+
+        stats['done'] += 1
+        if on_progress:
+            on_progress(dict(stats))
+
+    if stats['state'] == 'running':
+        stats['state'] = 'finished'
+    stats['finished_at'] = round(time.time(), 3)
+    logger.info(f"[PREWARM] Selesai: {stats}")
+    return stats
+
+
+def _run_locked(paths: list, top_n: int, rate_per_minute: float, ttl: int, force: bool) -> dict:
+    try:
+        groups = mine_top_queries(paths, top_n)
+        logger.info(f"[PREWARM] {len(groups)} pertanyaan teratas dari {paths}")
+        stats = warm_cache(groups, rate_per_minute, ttl, force,
+                           on_progress=lambda progress: set_task_status(TASK_NAME, progress))
+        set_task_status(TASK_NAME, stats)
+        return stats
+    except Exception as e:
+        set_task_status(TASK_NAME, {'state': 'error', 'error': f"{type(e).__name__}: {e}"})
+        raise
+    finally:
+        release_task_lock(TASK_NAME)
+
+
+def _acquire():
+    if not acquire_task_lock(TASK_NAME, ttl=settings.PREWARM_LOCK_SECONDS):
+        raise ValueError("Pemanasan cache lain sedang berjalan.")
+    set_task_status(TASK_NAME, {'state': 'starting', 'started_at': round(time.time(), 3)})
+
+
+def run_prewarm(paths: list, top_n: int, rate_per_minute: float, ttl: int = 3600, force: bool = False) -> dict:
+    """
+    warm_cache dengan kunci lintas worker/proses dan status di Redis (get_task_status('prewarm')).
+    ValueError bila pemanasan lain sedang berjalan.
+    """
+    _acquire()
+    return _run_locked(paths, top_n, rate_per_minute, ttl, force)
+
+
+def start_background_prewarm(paths: list, top_n: int, rate_per_minute: float, ttl: int = 3600,
+                             force: bool = False) -> threading.Thread:
+    """Seperti run_prewarm tetapi di thread latar worker ini (endpoint admin). Kunci diambil sebelum kembali."""
+    _acquire()
+
+    def target():
+        try:
+            _run_locked(paths, top_n, rate_per_minute, ttl, force)
+        except Exception as e:
+            logger.error(f"[PREWARM] Gagal: {e}", exc_info=True)
+
+    thread = threading.Thread(target=target, name='cache-prewarm', daemon=True)
+    thread.start()
+    return thread
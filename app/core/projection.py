@@ -0,0 +1,68 @@
+# app/core/projection.py
+"""
+Proyeksi embedding ke dimensi lebih kecil (PCA) untuk collection Qdrant.
+
+indo-sentence-bert-base menghasilkan vektor 768 dimensi; memori Qdrant dan
+biaya pencarian sebanding dengan dimensi itu. Bila RAG_EMBEDDING_DIM diisi,
+ingestion mempelajari PCA dari embedding chunk korpus sendiri, menyimpan
+collection di dimensi tersebut, dan menulis proyeksinya sebagai artefak
+'<versi>.projection.npz'. Jalur query menerapkan proyeksi yang sama persis
+(lihat project_vectors di app/core/main.py) tepat sebelum ke Qdrant; FAQ dan
+router topik tetap memakai vektor penuh.
+
+Masukan dinormalisasi L2 sebelum dipusatkan (encode ingestion tidak
+dinormalisasi, embed_query dinormalisasi) dan hasil proyeksi dinormalisasi
+ulang karena collection memakai jarak cosine. Vektor terpusat juga membuat
+bit tanda kuantisasi biner lebih informatif. Akibatnya skala skor cosine
+berubah: tetapkan ulang RAG_RELEVANCE_THRESHOLD dengan scripts/eval_retrieval.py
+(--dim) sebelum mengaktifkan RAG_EMBEDDING_DIM.
+"""
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class EmbeddingProjection:
+    """PCA: (x/|x| - mean) @ components.T, lalu normalisasi L2."""
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, explained: float):
+        self.mean = mean.astype(np.float32)              # float32[dim_asli]
+        self.components = components.astype(np.float32)  # float32[dim, dim_asli]
+        self.explained = float(explained)                # porsi varians korpus yang dipertahankan
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def source_dim(self) -> int:
+        return self.components.shape[1]
+
+    @classmethod
+    def fit(cls, embeddings, dim: int) -> "EmbeddingProjection":
+        """Pelajari proyeksi dari embedding korpus; butuh lebih banyak chunk daripada `dim`."""
+        embeddings = _normalize(np.asarray(embeddings, dtype=np.float32))
+        if not 0 < dim < embeddings.shape[1]:
+            raise ValueError(f"Dimensi proyeksi harus di antara 1 dan {embeddings.shape[1] - 1}, bukan {dim}.")
+        if embeddings.shape[0] <= dim:
+            raise ValueError(f"PCA {dim} dimensi butuh lebih dari {dim} chunk (ada {embeddings.shape[0]}).")
+        mean = embeddings.mean(axis=0)
+        _, singular, vt = np.linalg.svd(embeddings - mean, full_matrices=False)
+        variance = singular ** 2
+        return cls(mean, vt[:dim], variance[:dim].sum() / variance.sum())
+
+    def transform(self, vectors) -> np.ndarray:
+        """Proyeksikan satu vektor atau matriks (baris = vektor)."""
+        return _normalize((_normalize(np.asarray(vectors, dtype=np.float32)) - self.mean) @ self.components.T)
+
+    def save(self, path: str):
+        np.savez(path, mean=self.mean, components=self.components, explained=np.array(self.explained))
+
+    @classmethod
+    def load(cls, path: str) -> "EmbeddingProjection":
+        with np.load(path) as data:
+            return cls(data['mean'], data['components'], float(data['explained']))
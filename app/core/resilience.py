@@ -0,0 +1,233 @@
+# app/core/resilience.py
+"""
+Ketahanan terhadap upstream yang lambat/sakit (Gemini, Google Custom Search).
+
+- Deadline per permintaan (contextvar): setiap panggilan upstream hanya boleh
+  memakai sisa anggaran waktu permintaan, bukan timeout gunicorn/nginx 90 detik.
+- Circuit breaker per upstream (per proses worker): setelah sejumlah kegagalan
+  beruntun, panggilan ditolak seketika selama RESET detik, lalu satu
+  percobaan (half-open) menentukan apakah sirkuit ditutup kembali.
+- Hedged call: bila percobaan pertama belum selesai setelah `hedge_after`
+  detik (atau gagal) dan anggaran masih ada, percobaan kedua dikirim;
+  hasil pertama yang berhasil dipakai.
+"""
+
+import os
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from app.metrics import record_upstream
+
+logger = logging.getLogger(__name__)
+
+_deadline = contextvars.ContextVar('request_deadline', default=None)
+
+
+class UpstreamUnavailable(ConnectionError):
+    """Upstream tidak dapat melayani dalam anggaran waktu (gagal, timeout, atau sirkuit terbuka)."""
+
+    def __init__(self, message: str, retry_after: float = 5.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    pass
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    pass
+
+
+# ===================================================================
+# DEADLINE
+# ===================================================================
+def start_deadline(seconds: float):
+    """Pasang deadline untuk konteks saat ini. Mengembalikan token untuk end_deadline."""
+    return _deadline.set(time.monotonic() + seconds)
+
+
+def end_deadline(token):
+    if token is not None:
+        _deadline.reset(token)
+
+
+def remaining() -> float:
+    """Sisa anggaran (detik); None bila tidak ada deadline (mis. skrip offline)."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+# ===================================================================
+# CIRCUIT BREAKER
+# ===================================================================
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        return max(1.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True  # hanya satu permintaan percobaan
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"[BREAKER] {self.name}: pulih, sirkuit ditutup")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"[BREAKER] {self.name}: {self.failures} kegagalan, sirkuit dibuka "
+                                   f"{self.reset_seconds:.0f} detik")
+                    record_upstream(self.name, 'breaker_opened')
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, failure_threshold: int, reset_seconds: float) -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, failure_threshold, reset_seconds)
+        return _breakers[name]
+
+
+def breaker_states() -> dict:
+    return {name: breaker.state for name, breaker in _breakers.items()}
+
+
+# ===================================================================
+# HEDGED CALL
+# ===================================================================
+_pools = {}  # nama -> (pid, ThreadPoolExecutor)
+_pools_lock = threading.Lock()
+
+
+def _get_pool(name: str, max_workers: int) -> ThreadPoolExecutor:
+    """Pool per proses (dibuat ulang setelah fork worker gunicorn)."""
+    entry = _pools.get(name)
+    if entry is None or entry[0] != os.getpid():
+        with _pools_lock:
+            entry = _pools.get(name)
+            if entry is None or entry[0] != os.getpid():
+                entry = (os.getpid(), ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name))
+                _pools[name] = entry
+    return entry[1]
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Pool percobaan upstream (call_upstream), termasuk hedge."""
+    return _get_pool('upstream', 16)
+
+
+def submit_in_context(func, *args):
+    """
+    Jalankan func(*args) di pool latar dengan contextvars pemanggil (deadline
+    permintaan ikut terbawa). Mengembalikan Future.
+
+    Pool-nya terpisah dari pool percobaan upstream: func biasanya memanggil
+    call_upstream sendiri, dan bila keduanya berbagi pool, tugas luar yang
+    menunggu percobaan di dalamnya bisa menghabiskan thread sampai macet.
+    """
+    ctx = contextvars.copy_context()
+    return _get_pool('request-task', 8).submit(ctx.run, func, *args)
+
+
+def call_upstream(breaker: CircuitBreaker, func, hedge_after: float, default_timeout: float,
+                  max_attempts: int = 2, is_failure=lambda exc: True):
+    """
+    Panggil func(timeout) lewat breaker, dibatasi sisa deadline permintaan (atau
+    default_timeout bila lebih kecil / tanpa deadline), dengan hedging.
+    `timeout` yang diterima func adalah sisa anggaran saat percobaan dikirim.
+    Exception yang is_failure(exc) == False (mis. 400 dari input kita) diteruskan
+    apa adanya tanpa menghitung kegagalan upstream.
+    """
+    local_deadline = time.monotonic() + default_timeout
+
+    def budget():
+        left = local_deadline - time.monotonic()
+        request_left = remaining()
+        return left if request_left is None else min(left, request_left)
+
+    if budget() <= 0:
+        raise DeadlineExceeded(f"{breaker.name}: anggaran waktu habis sebelum dipanggil")
+    if not breaker.allow():
+        record_upstream(breaker.name, 'rejected')
+        raise CircuitOpenError(f"{breaker.name}: sirkuit terbuka", retry_after=breaker.retry_after())
+
+    pool = _get_executor()
+    pending = set()
+    attempts = 0
+    last_error = None
+
+    def launch(event=None):
+        nonlocal attempts
+        attempts += 1
+        if event:
+            record_upstream(breaker.name, event)
+        pending.add(pool.submit(func, budget()))
+
+    launch()
+    while pending:
+        left = budget()
+        if left <= 0:
+            break
+        can_hedge = attempts < max_attempts
+        done, _ = wait(pending, timeout=min(hedge_after, left) if can_hedge else left,
+                       return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.discard(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                if not is_failure(e):
+                    breaker.record_success()  # upstream sehat; kesalahan ada di permintaan
+                    raise
+                last_error = e
+                logger.warning(f"[UPSTREAM] {breaker.name} percobaan gagal: {type(e).__name__}: {e}")
+                continue
+            breaker.record_success()
+            return result
+        if attempts < max_attempts and budget() > 0 and (not done or not pending):
+            # Belum ada jawaban setelah hedge_after (hedge), atau semua percobaan gagal (retry)
+            launch('hedge' if not done else 'retry')
+
+    breaker.record_failure()
+    if last_error is None or budget() <= 0:
+        record_upstream(breaker.name, 'timeout')
+        raise DeadlineExceeded(f"{breaker.name}: anggaran waktu habis")
+    raise UpstreamUnavailable(f"{breaker.name}: {type(last_error).__name__}: {last_error}") from last_error
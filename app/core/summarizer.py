@@ -0,0 +1,118 @@
+# app/core/summarizer.py
+"""
+Ringkasan percakapan berjalan agar ukuran prompt tetap datar per sesi.
+
+- Prompt membawa ringkasan (key chat:{user_id}:summary) + giliran yang belum
+  tercakup ringkasan, bukan lagi 5 giliran mentah.
+- Setelah respons terkirim (response.call_on_close), schedule_summary()
+  menjadwalkan pembaruan di thread latar: bila giliran di luar ringkasan
+  mencapai SUMMARY_TRIGGER_TURNS, semua kecuali SUMMARY_KEEP_TURNS terbaru
+  dilipat ke ringkasan oleh Gemini. Jalur permintaan tidak pernah menunggu
+  LLM ringkasan; bila belum selesai, prompt cukup membawa giliran mentah.
+- Ringkasan menyimpan penanda giliran terakhir yang dilipat (ts + teks user),
+  sehingga giliran yang belum diringkas selalu ikut terkirim apa adanya.
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config import settings
+from app.metrics import observe_stage
+from app.redis_manager import HISTORY_MAX_ITEMS, get_history, get_summary, save_summary
+from app.core.main import summarize_conversation
+
+logger = logging.getLogger(__name__)
+
+
+def _marker(turn: dict) -> tuple:
+    return int(turn['ts']), turn['user']
+
+
+def unsummarized_turns(history: list, summary: dict) -> list:
+    """Giliran (terlama dulu) sesudah giliran terakhir yang sudah tercakup ringkasan."""
+    if not summary:
+        return list(history)
+    marker = (int(summary['until_ts']), summary['until_user'])
+    for i in range(len(history) - 1, -1, -1):
+        if _marker(history[i]) == marker:
+            return history[i + 1:]
+    return list(history)
+
+
+def build_history_context(summary: dict, history: list) -> str:
+    """Teks RIWAYAT PERCAKAPAN untuk prompt: ringkasan + giliran mentah yang belum diringkas."""
+    if not history:
+        return ""
+    lines = []
+    if summary:
+        lines.append(f"Ringkasan percakapan sebelumnya: {summary['text']}")
+    lines.extend(f"User: {h['user']}\nAI: {h['ai']}" for h in unsummarized_turns(history, summary))
+    return "\n".join(lines)
+
+
+def refresh_summary(user_id: str, summarize) -> dict:
+    """
+    Lipat giliran lama ke ringkasan bila sudah waktunya. summarize(ringkasan_lama, giliran) -> teks.
+    Mengembalikan ringkasan baru, atau None bila tidak ada yang perlu/berhasil diringkas.
+    """
+    history = get_history(user_id, limit=HISTORY_MAX_ITEMS)
+    summary = get_summary(user_id)
+    pending = unsummarized_turns(history, summary)
+    if len(pending) < max(settings.SUMMARY_TRIGGER_TURNS, settings.SUMMARY_KEEP_TURNS + 1):
+        return None
+
+    fold = pending[:len(pending) - settings.SUMMARY_KEEP_TURNS]
+    text = summarize(summary['text'] if summary else "", fold)
+    if not text:
+        return None
+    until_ts, until_user = _marker(fold[-1])
+    new_summary = {'text': text, 'until_ts': until_ts, 'until_user': until_user, 'updated_at': int(time.time())}
+    save_summary(user_id, new_summary)
+    return new_summary
+
+
+# ===================================================================
+# EKSEKUSI LATAR
+# ===================================================================
+_executor = {'pool': None, 'pid': None}
+_in_flight = set()
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Satu thread per proses (dibuat ulang setelah fork): ringkasan tidak mendesak."""
+    with _lock:
+        if _executor['pool'] is None or _executor['pid'] != os.getpid():
+            _executor['pool'] = ThreadPoolExecutor(max_workers=1, thread_name_prefix='summarizer')
+            _executor['pid'] = os.getpid()
+            _in_flight.clear()
+        return _executor['pool']
+
+
+def _run(user_id: str):
+    try:
+        with observe_stage('summarize'):
+            summary = refresh_summary(user_id, summarize_conversation)
+        if summary:
+            logger.info(f"[SUMMARY] Ringkasan {user_id} diperbarui ({len(summary['text'])} karakter)")
+    except Exception as e:
+        logger.warning(f"[SUMMARY] Gagal meringkas {user_id}: {type(e).__name__}: {e}")
+    finally:
+        with _lock:
+            _in_flight.discard(user_id)
+
+
+def schedule_summary(user_id: str):
+    """Jadwalkan pembaruan ringkasan; paling banyak satu antrean per user per worker."""
+    if not settings.SUMMARY_ENABLED:
+        return
+    executor = _get_executor()
+    with _lock:
+        if user_id in _in_flight:
+            return
+        _in_flight.add(user_id)
+    # submit() biasa: deadline & trace permintaan sengaja tidak ikut terbawa
+    executor.submit(_run, user_id)
@@ -0,0 +1,140 @@
+# app/core/tool_loop.py
+"""
+Eksekusi function calling Gemini dengan batas ronde dan waktu.
+
+- Semua function_call dalam satu giliran model dijalankan sekaligus (paralel
+  bila lebih dari satu), lalu dikirim balik dalam satu giliran 'function';
+  jadi N pemanggilan tool = 1 round trip LLM, bukan N.
+- Hasil tool diringkas (string dipotong, list dibatasi) sebelum masuk riwayat,
+  karena seluruh riwayat dikirim ulang di setiap round.
+- Setelah LLM_MAX_TOOL_ROUNDS ronde tool atau LLM_TOOL_LOOP_SECONDS, model
+  dipanggil sekali lagi tanpa tool sehingga wajib menjawab dengan teks.
+
+Modul ini tidak bergantung pada SDK: `generate(contents, allow_tools)` dan
+objek respons (candidates[0].content.parts[i].function_call) disediakan
+pemanggil, sehingga loop bisa diuji dengan model tiruan.
+"""
+
+import time
+import json
+import logging
+
+from app.metrics import observe_stage, record_tool_call
+from app.core.resilience import submit_in_context
+from app.tracing import detached_from_trace
+
+logger = logging.getLogger(__name__)
+
+
+def function_calls(response) -> list:
+    """[(nama, args)] dari semua part function_call pada kandidat pertama."""
+    try:
+        parts = response.candidates[0].content.parts
+    except (AttributeError, IndexError):
+        return []
+    calls = []
+    for part in parts:
+        fc = getattr(part, 'function_call', None)
+        if fc and getattr(fc, 'name', None):
+            calls.append((fc.name, dict(fc.args or {})))
+    return calls
+
+
+def compact_result(value, max_chars: int = 300, max_items: int = 3):
+    """Ringkas hasil tool: string dipotong, list dibatasi, rekursif untuk dict/list."""
+    if isinstance(value, str):
+        return value if len(value) <= max_chars else value[:max_chars].rstrip() + "…"
+    if isinstance(value, dict):
+        return {k: compact_result(v, max_chars, max_items) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [compact_result(v, max_chars, max_items) for v in value[:max_items]]
+    return value
+
+
+def _run_tool(tools: dict, name: str, args: dict) -> dict:
+    func = tools.get(name)
+    if func is None:
+        logger.error(f"Model meminta fungsi yang tidak dikenal: {name}")
+        record_tool_call(name, 'unknown')
+        return {"error": "Fungsi tidak tersedia."}
+    try:
+        result = func(**args)
+    except Exception as e:
+        logger.error(f"[TOOL] {name} gagal: {e}")
+        record_tool_call(name, 'error')
+        return {"error": f"Tool gagal: {type(e).__name__}"}
+    record_tool_call(name, 'error' if isinstance(result, dict) and 'error' in result else 'ok')
+    return result if isinstance(result, dict) else {"result": result}
+
+
+def _run_detached(tools: dict, name: str, args: dict) -> dict:
+    # Thread paralel tidak boleh menyentuh stack span trace permintaan
+    with detached_from_trace():
+        return _run_tool(tools, name, args)
+
+
+def execute_calls(tools: dict, calls: list, timeout: float) -> list:
+    """
+    Jalankan semua pemanggilan satu giliran; satu pemanggilan dijalankan langsung,
+    lebih dari satu secara paralel. Pemanggilan identik dieksekusi sekali.
+    Tugas paralel berjalan di pool submit_in_context, bukan pool percobaan
+    upstream yang dipakai tool itu sendiri lewat call_upstream.
+    """
+    unique = {}
+    for name, args in calls:
+        unique.setdefault((name, json.dumps(args, sort_keys=True, default=str)), (name, args))
+
+    if len(unique) == 1:
+        (name, args), = unique.values()
+        results = {key: _run_tool(tools, name, args) for key in unique}
+    else:
+        futures = {key: submit_in_context(_run_detached, tools, name, args) for key, (name, args) in unique.items()}
+        deadline = time.monotonic() + max(0.0, timeout)
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception as e:
+                future.cancel()
+                logger.warning(f"[TOOL] {key[0]} tidak selesai dalam anggaran: {type(e).__name__}")
+                record_tool_call(key[0], 'timeout')
+                results[key] = {"error": "Waktu habis."}
+
+    return [results[(name, json.dumps(args, sort_keys=True, default=str))] for name, args in calls]
+
+
+def run_tool_loop(generate, contents: list, tools: dict, max_rounds: int, budget_seconds: float,
+                  max_chars: int = 300, max_items: int = 3):
+    """
+    generate(contents, allow_tools) -> respons model. `contents` (list dict) diperpanjang
+    di tempat. Mengembalikan (respons_final, jumlah_ronde_tool).
+    """
+    deadline = time.monotonic() + budget_seconds
+    response = generate(contents, True)
+    tool_rounds = 0
+
+    while True:
+        calls = function_calls(response)
+        if not calls:
+            return response, tool_rounds
+        if tool_rounds >= max_rounds or time.monotonic() >= deadline:
+            logger.warning(f"[TOOL] Batas loop tercapai ({tool_rounds} ronde); meminta jawaban tanpa tool")
+            record_tool_call('loop', 'budget_exhausted')
+            return generate(contents, False), tool_rounds
+
+        tool_rounds += 1
+        logger.info(f"[TOOL] Ronde {tool_rounds}: {[name for name, _ in calls]}")
+        contents.append({
+            'role': 'model',
+            'parts': [{'function_call': {'name': name, 'args': args}} for name, args in calls],
+        })
+        with observe_stage('tool_call', calls=len(calls)):
+            results = execute_calls(tools, calls, deadline - time.monotonic())
+        contents.append({
+            'role': 'function',
+            'parts': [
+                {'function_response': {'name': name, 'response': compact_result(result, max_chars, max_items)}}
+                for (name, _), result in zip(calls, results)
+            ],
+        })
+        response = generate(contents, True)
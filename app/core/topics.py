@@ -0,0 +1,125 @@
+# app/core/topics.py
+"""
+Partisi topik knowledge base dan router query ringan.
+
+- Ingestion memberi setiap chunk payload 'category' (plus 'source' yang sudah
+  ada) dan membuat payload index keyword untuk keduanya. Kategori per dokumen
+  ditentukan categorize_document(): nama file dulu, lalu kata kunci di isinya.
+- TopicRouter memilih satu kategori untuk query dari gabungan skor kata kunci
+  dan cosine ke centroid embedding chunk per kategori (artefak
+  '<versi>.topics.npz', dibangun ingestion bersama indeks BM25). Router hanya
+  memutuskan bila unggul jelas (RAG_TOPIC_MARGIN); selain itu None = cari di
+  semua partisi. Kategori 'umum' tidak pernah dijadikan filter.
+- Pencarian yang dipersempit tetapi tidak menghasilkan konteks relevan diulang
+  tanpa filter (lihat search_qdrant), jadi salah rute hanya menambah latensi.
+"""
+
+import os
+import re
+
+import numpy as np
+
+from app.utils.text import canonical_tokens
+
+DEFAULT_TOPIC = 'umum'
+
+# Kata kunci per kategori, dalam bentuk canonical_tokens (stem map sudah diterapkan)
+TOPIC_KEYWORDS = {
+    'sop': frozenset({
+        'sop', 'prosedur', 'alur', 'langkah', 'tahapan', 'syarat', 'persyaratan', 'daftar', 'terima',
+        'ijazah', 'skpi', 'pendamping', 'surat', 'legalisir', 'layanan', 'administrasi', 'cuti',
+        'mandiri', 'jalur', 'berkas', 'formulir', 'verifikasi', 'krs', 'siakad', 'wisuda',
+    }),
+    'organisasi': frozenset({
+        'rektor', 'wakil', 'dekan', 'kepala', 'ketua', 'direktur', 'sekretaris',
+        'struktur', 'organisasi', 'jabatan', 'pimpinan', 'pejabat', 'biro', 'lembaga', 'pusat',
+        'unit', 'bagian', 'kaprodi', 'wadek', 'warek', 'senat',
+    }),
+    'akreditasi': frozenset({
+        'akreditasi', 'terakreditasi', 'unggul', 'ban', 'banpt', 'lam', 'peringkat', 'sertifikat',
+        'predikat', 'asesmen', 'asesor', 'borang',
+    }),
+    'renstra': frozenset({
+        'renstra', 'rencana', 'strategis', 'visi', 'misi', 'tujuan', 'sasaran', 'target', 'indikator',
+        'kinerja', 'lpm', 'mutu', 'penjaminan', 'iku', 'strategi', 'roadmap', 'capaian',
+    }),
+}
+
+# Nama file -> kategori (dicek berurutan; nama file lebih tegas daripada isi)
+SOURCE_PATTERNS = (
+    (re.compile(r'akreditasi', re.I), 'akreditasi'),
+    (re.compile(r'renstra|rencana[\s_-]*strategis', re.I), 'renstra'),
+    (re.compile(r'struktur|organisasi', re.I), 'organisasi'),
+    (re.compile(r'\bsop\b|sop[\s_-]|prosedur', re.I), 'sop'),
+)
+
+TOPIC_MIN_KEYWORD_HITS = 5  # isi dokumen tanpa nama file yang jelas: minimal kecocokan kata kunci
+
+
+def keyword_scores(tokens: list) -> dict:
+    """Jumlah token yang cocok dengan kata kunci tiap kategori."""
+    return {topic: sum(1 for token in tokens if token in words) for topic, words in TOPIC_KEYWORDS.items()}
+
+
+def categorize_document(source: str, text: str = "") -> str:
+    """Kategori satu dokumen sumber (nama file PDF atau 'web')."""
+    name = os.path.splitext(os.path.basename(source or ''))[0].replace('_', ' ')
+    for pattern, topic in SOURCE_PATTERNS:
+        if pattern.search(name):
+            return topic
+    scores = keyword_scores(canonical_tokens(text))
+    topic, hits = max(scores.items(), key=lambda item: item[1])
+    return topic if hits >= TOPIC_MIN_KEYWORD_HITS else DEFAULT_TOPIC
+
+
+class TopicRouter:
+    """Klasifikasi query ke satu kategori: cosine ke centroid + bobot kata kunci."""
+
+    def __init__(self, topics: list, centroids: np.ndarray, counts: np.ndarray):
+        self.topics = list(topics)
+        self.centroids = centroids.astype(np.float32)
+        self.counts = counts
+
+    @classmethod
+    def build(cls, categories: list, embeddings) -> "TopicRouter":
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1.0, norms)
+        topics = sorted(set(categories))
+        labels = np.array([topics.index(c) for c in categories])
+        centroids, counts = [], []
+        for i in range(len(topics)):
+            centroid = embeddings[labels == i].mean(axis=0)
+            centroids.append(centroid / (np.linalg.norm(centroid) or 1.0))
+            counts.append(int((labels == i).sum()))
+        return cls(topics, np.vstack(centroids), np.array(counts))
+
+    def save(self, path: str):
+        np.savez(path, topics=np.array(self.topics), centroids=self.centroids, counts=self.counts)
+
+    @classmethod
+    def load(cls, path: str) -> "TopicRouter":
+        with np.load(path) as data:
+            return cls([str(t) for t in data['topics']], data['centroids'], data['counts'])
+
+    def share(self, topic: str) -> float:
+        """Porsi chunk di partisi `topic` (ruang pencarian setelah difilter)."""
+        return float(self.counts[self.topics.index(topic)] / self.counts.sum())
+
+    def scores(self, query: str, query_vec: np.ndarray, keyword_weight: float) -> dict:
+        sims = self.centroids @ np.asarray(query_vec, dtype=np.float32)
+        keywords = keyword_scores(canonical_tokens(query))
+        return {
+            topic: float(sim) + keyword_weight * min(keywords.get(topic, 0), 2)
+            for topic, sim in zip(self.topics, sims)
+        }
+
+    def route(self, query: str, query_vec: np.ndarray, margin: float, keyword_weight: float):
+        """Kategori tujuan, atau None bila tidak ada yang unggul jelas / hanya 'umum'."""
+        if len(self.topics) < 2:
+            return None
+        ranked = sorted(self.scores(query, query_vec, keyword_weight).items(), key=lambda item: -item[1])
+        (best, best_score), (_, second_score) = ranked[0], ranked[1]
+        if best == DEFAULT_TOPIC or best_score - second_score < margin:
+            return None
+        return best
@@ -0,0 +1,131 @@
+# app/metrics.py
+"""
+Instrumentasi latensi per tahap dan counter operasional, diekspor dalam
+format Prometheus lewat endpoint /metrics.
+
+Gunicorn menjalankan beberapa worker proses; bila PROMETHEUS_MULTIPROC_DIR
+diset (lihat gunicorn_config.py), setiap worker menulis metrik ke direktori
+tersebut dan /metrics menggabungkan semuanya, apa pun worker yang melayani.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from app.tracing import span
+
+# Bucket mencakup operasi cepat (Redis, validasi) hingga LLM + tool (puluhan detik)
+_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 45, 90)
+
+STAGE_SECONDS = Histogram(
+    'chatbot_stage_seconds',
+    'Latensi per tahap pemrosesan permintaan chat',
+    ['stage'],
+    buckets=_LATENCY_BUCKETS,
+)
+CACHE_TOTAL = Counter(
+    'chatbot_cache_total',
+    'Hasil lookup cache',
+    ['cache', 'result'],
+)
+FALLBACK_TOTAL = Counter(
+    'chatbot_fallback_total',
+    'Permintaan yang jatuh ke Google Search, per alasan',
+    ['reason'],
+)
+LLM_ROUNDS = Histogram(
+    'chatbot_llm_rounds',
+    'Jumlah round trip LLM per permintaan',
+    buckets=(1, 2, 3, 4, 5, 8),
+)
+TOOL_CALLS_TOTAL = Counter(
+    'chatbot_tool_calls_total',
+    'Pemanggilan tool oleh LLM',
+    ['tool', 'status'],
+)
+UPSTREAM_EVENTS_TOTAL = Counter(
+    'chatbot_upstream_events_total',
+    'Kejadian ketahanan upstream (hedge, retry, timeout, breaker, jawaban terdegradasi)',
+    ['upstream', 'event'],
+)
+
+ADMISSION_TOTAL = Counter(
+    'chatbot_admission_total',
+    'Keputusan admission control /api/ask (cache hit tidak melewati admission)',
+    ['decision'],
+)
+
+TOPIC_ROUTE_TOTAL = Counter(
+    'chatbot_topic_route_total',
+    'Keputusan router topik retrieval (widened = filter dilepas karena tanpa hasil relevan)',
+    ['topic', 'outcome'],
+)
+
+CONTEXT_CHARS_TOTAL = Counter(
+    'chatbot_context_chars_total',
+    'Karakter konteks internal: hasil retrieval relevan vs yang dikirim ke Gemini setelah kompresi',
+    ['kind'],
+)
+
+
+@contextmanager
+def observe_stage(stage: str, **attrs):
+    """
+    Catat durasi blok ke histogram chatbot_stage_seconds{stage=...} dan,
+    bila ada trace aktif, sebagai span dengan nama yang sama.
+    """
+    start = time.perf_counter()
+    with span(stage, **attrs):
+        try:
+            yield
+        finally:
+            STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - start)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_TOTAL.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+
+def record_fallback(reason: str):
+    FALLBACK_TOTAL.labels(reason=reason).inc()
+
+
+def record_tool_call(tool: str, status: str):
+    TOOL_CALLS_TOTAL.labels(tool=tool, status=status).inc()
+
+
+def record_upstream(upstream: str, event: str):
+    UPSTREAM_EVENTS_TOTAL.labels(upstream=upstream, event=event).inc()
+
+
+def record_topic_route(topic, outcome: str):
+    TOPIC_ROUTE_TOTAL.labels(topic=topic or 'none', outcome=outcome).inc()
+
+
+def record_context_chars(retrieved: int, sent: int):
+    CONTEXT_CHARS_TOTAL.labels(kind='retrieved').inc(retrieved)
+    CONTEXT_CHARS_TOTAL.labels(kind='sent').inc(sent)
+
+
+def record_admission(admitted: bool):
+    ADMISSION_TOTAL.labels(decision='admitted' if admitted else 'shed').inc()
+
+
+def render_metrics():
+    """Hasilkan (body, content_type) untuk endpoint /metrics."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,10 +1,19 @@
 # app/rag_initializer.py
+import os
+import time
+import logging
 from functools import lru_cache
 from qdrant_client import QdrantClient
 from sentence_transformers import SentenceTransformer
 import google.generativeai as genai
 
 from app.config import settings
+from app.core.lexical import BM25Index
+from app.core.topics import TopicRouter
+from app.core.projection import EmbeddingProjection
+from app.core.docstore import fetch_chunks
+
+logger = logging.getLogger(__name__)
 
 @lru_cache(maxsize=1)
 def get_runtime_components():
@@ -21,15 +30,199 @@ def get_runtime_components():
     )
 
     # --- 2. Model Embedding ---
-    embedder = SentenceTransformer(settings.RAG.EMBEDDING_MODEL_NAME)
+    embedder = load_embedder(settings.RAG.EMBEDDING_MODEL_NAME, settings.RAG.EMBEDDING_QUANTIZED)
 
     # --- 3. Klien LLM (Gemini) ---
-    genai.configure(api_key=settings.GEMINI_API_KEY)
+    if settings.GEMINI_API_ENDPOINT:
+        # Endpoint alternatif (mis. server Gemini tiruan untuk load test) hanya lewat REST
+        genai.configure(
+            api_key=settings.GEMINI_API_KEY,
+            transport='rest',
+            client_options={'api_endpoint': settings.GEMINI_API_ENDPOINT},
+        )
+    else:
+        genai.configure(api_key=settings.GEMINI_API_KEY)
     gemini_model = genai.GenerativeModel('gemini-2.5-flash')
 
+    # --- 4. Versi knowledge base aktif (di balik alias) ---
+    collection_version = resolve_collection_alias(qdrant_client, settings.RAG.COLLECTION_NAME)
+    # Dimensi dicek sekali di sini, bukan per permintaan: tanpa proyeksi yang cocok
+    # setiap pencarian gagal diam-diam dan semua pertanyaan jatuh ke Google Search
+    check_query_dimension(qdrant_client, collection_version, embedder)
+    check_docstore(qdrant_client, collection_version)
+    _active_collection['name'] = collection_version
+    _active_collection['checked_at'] = time.monotonic()
+
     return {
         'qdrant_client': qdrant_client,
         'embedder': embedder,
         'gemini_model': gemini_model,
         'collection_name': settings.RAG.COLLECTION_NAME,
-    }
\ No newline at end of file
+        'collection_version': collection_version,
+    }
+
+
+def load_embedder(model_name: str, quantized: bool = False) -> SentenceTransformer:
+    """
+    Muat model embedding. quantized=True menerapkan dynamic quantization int8
+    pada layer Linear (encode query lebih cepat di CPU). Vektor dokumen tetap
+    dari model penuh saat ingestion, jadi ukur dulu dampaknya dengan
+    scripts/eval_retrieval.py sebelum mengaktifkan EMBEDDING_QUANTIZED.
+    """
+    embedder = SentenceTransformer(model_name, device='cpu' if quantized else None)
+    if quantized:
+        import torch
+        torch.quantization.quantize_dynamic(embedder, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return embedder
+
+
+# ===================================================================
+# VERSI KNOWLEDGE BASE (BLUE/GREEN VIA ALIAS)
+# ===================================================================
+_active_collection = {'name': None, 'checked_at': 0.0}
+
+
+def resolve_collection_alias(client: QdrantClient, alias_name: str) -> str:
+    """
+    Kembalikan nama collection fisik yang ditunjuk alias.
+    Jika alias belum ada (deployment lama), nama itu sendiri dianggap collection fisik.
+    Gagal membaca daftar alias diteruskan sebagai exception: menebak nama alias di
+    sini akan mengganti versi aktif (kunci cache, artefak, dimensi vektor).
+    """
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == alias_name:
+            return alias.collection_name
+    return alias_name
+
+
+def get_active_collection() -> str:
+    """
+    Collection fisik yang sedang dilayani alias, di-refresh berkala agar
+    pergantian versi hasil ingestion terbaca tanpa restart worker.
+    Tidak pernah raise: jatuh ke COLLECTION_NAME bila Qdrant tidak terjangkau.
+    """
+    now = time.monotonic()
+    refresh = settings.RAG.COLLECTION_ALIAS_REFRESH_SECONDS
+    if _active_collection['name'] is not None and now - _active_collection['checked_at'] < refresh:
+        return _active_collection['name']
+
+    try:
+        client = get_runtime_components()['qdrant_client']
+        version = resolve_collection_alias(client, settings.RAG.COLLECTION_NAME)
+    except Exception as e:
+        logger.warning(f"[RAG] Versi knowledge base tidak dapat ditentukan: {e}")
+        if _active_collection['name'] is not None:
+            # Tetap di versi terakhir; coba lagi setelah interval refresh berikutnya
+            _active_collection['checked_at'] = now
+            return _active_collection['name']
+        return settings.RAG.COLLECTION_NAME
+
+    if _active_collection['name'] not in (None, version):
+        try:
+            check_query_dimension(client, version, get_runtime_components()['embedder'])
+            check_docstore(client, version)
+        except Exception as e:
+            # Versi baru tidak bisa dicari dengan vektor query kita: tetap di versi lama
+            logger.error(f"[RAG] Knowledge base {version} tidak dipakai: {e}")
+            _active_collection['checked_at'] = now
+            return _active_collection['name']
+        logger.info(f"[RAG] Knowledge base berpindah: {_active_collection['name']} -> {version}")
+    _active_collection['name'] = version
+    _active_collection['checked_at'] = now
+    return version
+
+
+def expire_active_collection():
+    """Paksa alias dibaca ulang pada pemanggilan get_active_collection() berikutnya."""
+    _active_collection['checked_at'] = float('-inf')
+
+
+def get_index_artifact_path(collection_version: str, suffix: str) -> str:
+    """Lokasi artefak turunan ingestion untuk satu versi collection, mis. '<versi>.bm25.npz'."""
+    return os.path.join(settings.RAG.INDEX_DIR, f"{collection_version}.{suffix}")
+
+
+@lru_cache(maxsize=2)
+def get_lexical_index(collection_version: str):
+    """Muat indeks BM25 milik versi collection; None jika belum dibangun untuk versi ini."""
+    path = get_index_artifact_path(collection_version, "bm25.npz")
+    if not os.path.exists(path):
+        logger.warning(f"[RAG] Indeks leksikal tidak ditemukan: {path}. Memakai dense saja.")
+        return None
+    return BM25Index.load(path)
+
+
+@lru_cache(maxsize=2)
+def get_topic_router(collection_version: str):
+    """Muat router topik milik versi collection; None jika belum dibangun (pencarian tanpa filter)."""
+    path = get_index_artifact_path(collection_version, "topics.npz")
+    if not os.path.exists(path):
+        logger.warning(f"[RAG] Router topik tidak ditemukan: {path}. Mencari di semua partisi.")
+        return None
+    return TopicRouter.load(path)
+
+
+@lru_cache(maxsize=2)
+def is_quantized(collection_version: str) -> bool:
+    """Apakah versi collection dibuat dengan kuantisasi (dibaca dari konfigurasi collection, bukan setting)."""
+    info = get_runtime_components()['qdrant_client'].get_collection(collection_name=collection_version)
+    return info.config.quantization_config is not None
+
+
+@lru_cache(maxsize=2)
+def get_projection(collection_version: str):
+    """Proyeksi PCA milik versi collection; None bila collection menyimpan vektor penuh."""
+    path = get_index_artifact_path(collection_version, "projection.npz")
+    if not os.path.exists(path):
+        return None
+    return EmbeddingProjection.load(path)
+
+
+def check_query_dimension(client: QdrantClient, collection_version: str, embedder) -> int:
+    """
+    Pastikan vektor query (setelah proyeksi versi itu, bila ada) berdimensi sama
+    dengan vektor collection. Mengembalikan dimensinya; RuntimeError bila tidak
+    cocok, mis. collection dibangun dengan RAG_EMBEDDING_DIM tetapi
+    '<versi>.projection.npz' hilang dari INDEX_DIR.
+    """
+    size = client.get_collection(collection_name=collection_version).config.params.vectors.size
+    model_dim = embedder.get_sentence_embedding_dimension()
+    projection = get_projection(collection_version)
+    if projection is not None and projection.source_dim != model_dim:
+        raise RuntimeError(
+            f"Proyeksi {collection_version} untuk embedding {projection.source_dim} dimensi, "
+            f"model menghasilkan {model_dim}."
+        )
+    query_dim = model_dim if projection is None else projection.dim
+    if query_dim != size:
+        missing = "" if projection is not None else (
+            f" Proyeksi '{get_index_artifact_path(collection_version, 'projection.npz')}' tidak ditemukan."
+        )
+        raise RuntimeError(
+            f"Collection {collection_version} berdimensi {size}, vektor query {query_dim}.{missing}"
+        )
+    return size
+
+
+def check_docstore(client: QdrantClient, collection_version: str, sample: int = 32):
+    """
+    Mode payload ramping: pastikan docstore ada dan memuat teks point versi ini
+    (diuji pada `sample` point pertama). Tanpa itu setiap hasil retrieval
+    terhidrasi menjadi teks kosong dan dibuang tanpa error. RuntimeError bila tidak.
+    """
+    if not settings.RAG.RAG_SLIM_PAYLOAD:
+        return
+    path = settings.RAG.DOCSTORE_PATH
+    if not os.path.exists(path):
+        raise RuntimeError(f"RAG_SLIM_PAYLOAD aktif tetapi docstore '{path}' tidak ada.")
+    points, _ = client.scroll(collection_name=collection_version, limit=sample,
+                              with_payload=False, with_vectors=False)
+    try:
+        found = fetch_chunks([point.id for point in points], path)
+    except Exception as e:
+        raise RuntimeError(f"Docstore '{path}' tidak terbaca: {e}") from e
+    missing = len(points) - len(found)
+    if missing:
+        raise RuntimeError(
+            f"Docstore '{path}' tidak memuat {missing} dari {len(points)} chunk sampel {collection_version}."
+        )
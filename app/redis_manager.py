@@ -1,63 +1,526 @@
 # app/redis_manager.py
+"""
+Akses Redis yang tahan gangguan (cache jawaban & pencarian, riwayat chat,
+rate limiter).
+
+- RedisConnection memegang satu klien per proses beserta status kesehatannya.
+  Begitu sebuah perintah gagal karena koneksi, status menjadi 'down' dan
+  thread latar mencoba ping ulang dengan backoff; selama down permintaan
+  tidak lagi menunggu timeout Redis satu per satu.
+- Selama down, semua fungsi di modul ini dilayani struktur LRU in-process
+  yang berbatas (per worker). Saat Redis kembali, riwayat dan cache yang
+  ditulis selama down disinkronkan ke Redis lalu struktur lokal dikosongkan;
+  hitungan rate limiter lokal dibuang (jendelanya pendek).
+- Cache jawaban dua tingkat: L1 in-process (LRU kecil ber-TTL, kunci
+  (query, versi) tanpa hashing) di depan Redis (L2). Reset cache admin dan
+  reindex dipublikasikan lewat channel pub/sub CACHE_INVALIDATION_CHANNEL;
+  setiap worker mendengarkan di thread latar dan mengosongkan L1-nya.
+- Riwayat dan jawaban cache disimpan dalam format ringkas (app/core/codec.py);
+  nilai format lama (JSON / teks polos) tetap terbaca.
+"""
+
+import os
 import redis
 import json
 import time
 import hashlib
 import logging
+import threading
+from collections import OrderedDict
+
 from app.config import settings
+from app.rag_initializer import get_active_collection, expire_active_collection
+from app.metrics import record_cache
+from app.utils.text import canonical_key
+from app.core.codec import (
+    CodecError, encode_history_item, decode_history_item, encode_text, decode_text, encode_object, decode_object,
+)
 
 logger = logging.getLogger(__name__)
-# --- Inisialisasi Global ---
-redis_client = None
-REDIS_AVAILABLE = False  # ← DIDEKLARASIKAN DI SINI
-
-try:
-    redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
-    redis_client.ping()
-    logger.info("Redis connected")
-except Exception as e:
-    logger.error(f"Redis unavailable: {e}")
-    redis_client = None
-
-def _safe_redis_call(func):
-    """Decorator untuk aman panggil Redis."""
-    def wrapper(*args, **kwargs):
-        if redis_client is None:
-            return None if func.__name__ != 'save_history' else None
+
+HISTORY_MAX_ITEMS = 10
+HISTORY_TTL_SECONDS = 1800
+
+
+class LocalLRU:
+    """Pengganti sementara key Redis: dict berbatas (LRU) dengan TTL per entri."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()  # key -> (value, expires_at | None)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else None)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def drain(self) -> list:
+        """Ambil & kosongkan semua entri yang belum kedaluwarsa: [(key, value, sisa_ttl | None)]."""
+        now = time.time()
+        with self._lock:
+            items = [
+                (key, value, None if expires_at is None else expires_at - now)
+                for key, (value, expires_at) in self._data.items()
+                if expires_at is None or expires_at > now
+            ]
+            self._data.clear()
+        return items
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisConnection:
+    """Klien Redis + status kesehatan + reconnect di latar."""
+
+    def __init__(self, url: str, socket_timeout: float = 1.0, max_backoff: float = 30.0, on_reconnect=None):
+        # Bytes mentah: nilai format ringkas bukan teks
+        self.client = redis.from_url(
+            url,
+            decode_responses=False,
+            socket_connect_timeout=socket_timeout,
+            socket_timeout=socket_timeout,
+        )
+        self.available = False
+        self.last_error = None
+        self.changed_at = time.time()
+        self.max_backoff = max_backoff
+        self._on_reconnect = on_reconnect
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+
+    def connect(self) -> bool:
+        try:
+            self.client.ping()
+        except redis.RedisError as e:
+            self.mark_down(e)
+            return False
+        self.mark_up()
+        return True
+
+    def mark_up(self):
+        with self._lock:
+            recovered = not self.available
+            self.available = True
+            if recovered:
+                self.changed_at = time.time()
+        if recovered:
+            logger.info("Redis connected")
+            if self._on_reconnect:
+                try:
+                    self._on_reconnect(self.client)
+                except redis.RedisError as e:
+                    logger.warning(f"[REDIS] Sinkronisasi setelah reconnect gagal: {e}")
+
+    def mark_down(self, exc: Exception):
+        with self._lock:
+            if self.available or self.last_error is None:
+                logger.error(f"Redis unavailable: {exc}. Memakai cache lokal sementara.")
+                self.changed_at = time.time()
+            self.available = False
+            self.last_error = f"{type(exc).__name__}: {exc}"
+        self._ensure_reconnector()
+
+    def _ensure_reconnector(self):
+        with self._lock:
+            alive = self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid()
+            if alive:
+                return
+            self._thread = threading.Thread(target=self._reconnect_loop, name='redis-reconnect', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _reconnect_loop(self):
+        delay = 0.5
+        while not self.available:
+            time.sleep(delay)
+            try:
+                self.client.ping()
+            except redis.RedisError:
+                delay = min(delay * 2, self.max_backoff)
+                continue
+            self.mark_up()
+
+    def call(self, func, fallback):
+        """func(client) bila Redis sehat; fallback() bila down atau koneksi gagal."""
+        if not self.available:
+            return fallback()
+        try:
+            return func(self.client)
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            self.mark_down(e)
+        except redis.RedisError as e:
+            logger.warning(f"Redis call failed in {getattr(func, '__name__', 'redis')}: {e}")
+        return fallback()
+
+    def health(self) -> dict:
+        return {
+            'state': 'up' if self.available else 'down',
+            'since': round(self.changed_at, 3),
+            'last_error': None if self.available else self.last_error,
+        }
+
+
+# ===================================================================
+# FALLBACK LOKAL & SINKRONISASI
+# ===================================================================
+_local_kv = LocalLRU(settings.REDIS_FALLBACK_MAX_ENTRIES)        # rag:resp:*, rag:search:*, chat:*:summary
+_local_history = LocalLRU(settings.REDIS_FALLBACK_MAX_ENTRIES)   # chat:<user_id> -> [item terbaru dulu]
+_local_limits = LocalLRU(settings.REDIS_FALLBACK_MAX_ENTRIES)    # rate_limit:<user_id> -> (hitungan, akhir_jendela)
+
+TASK_KEY_PREFIX = "rag:task:"  # kunci & status task latar (acquire_task_lock, set_task_status)
+_response_l1 = LocalLRU(settings.RESPONSE_L1_MAX_ENTRIES)        # L1 jawaban: (kunci query, versi) -> jawaban
+
+
+def _reconcile(client):
+    """Tulis riwayat & cache yang terkumpul selama Redis down, lalu kosongkan struktur lokal."""
+    history = _local_history.drain()
+    cached = _local_kv.drain()
+    _local_limits.clear()
+
+    pipe = client.pipeline()
+    for key, items, _ in history:
+        # items terbaru dulu; LPUSH dari yang terlama agar urutan di Redis tetap benar
+        for item in reversed(items):
+            pipe.lpush(key, encode_history_item(item))
+        pipe.ltrim(key, 0, HISTORY_MAX_ITEMS - 1)
+        pipe.expire(key, HISTORY_TTL_SECONDS, nx=True)
+    # Kunci & status task hanya bermakna di worker ini selama down; dipublikasikan
+    # ulang, kunci yang mungkin sudah selesai dipakai akan menahan worker lain sampai TTL habis
+    cached = [entry for entry in cached if not entry[0].startswith(TASK_KEY_PREFIX)]
+    for key, value, ttl_left in cached:
+        pipe.set(key, value, ex=max(1, int(ttl_left)) if ttl_left else None, nx=True)
+    pipe.execute()
+    if history or cached:
+        logger.info(f"[REDIS] Tersinkron: {len(history)} riwayat, {len(cached)} entri cache dari fallback lokal")
+
+
+_connection = RedisConnection(
+    settings.REDIS_URL,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    on_reconnect=_reconcile,
+)
+_connection.connect()
+
+# Klien mentah untuk endpoint admin; selalu ada, perintahnya bisa gagal bila Redis down
+redis_client = _connection.client
+
+
+def is_redis_available() -> bool:
+    return _connection.available
+
+
+def redis_health() -> dict:
+    return {
+        **_connection.health(),
+        'fallback_entries': len(_local_kv) + len(_local_history) + len(_local_limits),
+        'response_l1_entries': len(_response_l1),
+    }
+
+
+def clear_local_caches():
+    """Kosongkan L1 dan fallback cache jawaban/pencarian di worker ini (mis. setelah reset cache)."""
+    _response_l1.clear()
+    _local_kv.clear()
+
+
+def _kv_get(key: str):
+    return _connection.call(lambda client: client.get(key), lambda: _local_kv.get(key))
+
+
+def _kv_set(key: str, value: str, ttl: int):
+    return _connection.call(lambda client: client.setex(key, ttl, value), lambda: _local_kv.set(key, value, ttl))
+
+
+# ===================================================================
+# RIWAYAT CHAT
+# ===================================================================
+def decode_history(raw: list) -> list:
+    """Item riwayat mentah dari Redis -> dict; item yang tidak terbaca dilewati."""
+    items = []
+    for data in raw:
         try:
-            return func(*args, **kwargs)
-        except Exception as e:
-            logger.warning(f"Redis call failed in {func.__name__}: {e}")
-            return [] if 'get' in func.__name__ else None
-    return wrapper
+            items.append(decode_history_item(data))
+        except ValueError as e:  # JSON lama rusak atau CodecError
+            logger.warning(f"[REDIS] Item riwayat tidak terbaca, dilewati: {e}")
+    return items
+
 
-@_safe_redis_call
 def get_history(user_id, limit=5):
     key = f"chat:{user_id}"
-    raw = redis_client.lrange(key, 0, limit - 1)
-    return [json.loads(item) for item in reversed(raw)]
 
-@_safe_redis_call
+    def from_redis(client):
+        return decode_history(reversed(client.lrange(key, 0, limit - 1)))
+
+    return _connection.call(from_redis, lambda: list(reversed((_local_history.get(key) or [])[:limit])))
+
+
 def save_history(user_id, user_msg, bot_msg):
     key = f"chat:{user_id}"
-    item = json.dumps({'user': user_msg, 'ai': bot_msg, 'ts': time.time()})
-    pipe = redis_client.pipeline()
-    pipe.lpush(key, item)
-    pipe.ltrim(key, 0, 9)
-    pipe.expire(key, 1800, nx=True)
-    pipe.execute()
+    item = {'user': user_msg, 'ai': bot_msg, 'ts': time.time()}
+
+    def to_redis(client):
+        pipe = client.pipeline()
+        pipe.lpush(key, encode_history_item(item))
+        pipe.ltrim(key, 0, HISTORY_MAX_ITEMS - 1)
+        pipe.expire(key, HISTORY_TTL_SECONDS, nx=True)
+        pipe.execute()
+
+    def to_local():
+        items = [item] + (_local_history.get(key) or [])
+        _local_history.set(key, items[:HISTORY_MAX_ITEMS], ttl=HISTORY_TTL_SECONDS)
+
+    _connection.call(to_redis, to_local)
+
+
+def get_summary(user_id):
+    """Ringkasan berjalan percakapan lama: {'text', 'until_ts', 'until_user'} atau None."""
+    raw = _kv_get(f"chat:{user_id}:summary")
+    if not raw:
+        return None
+    try:
+        return decode_object(raw)
+    except ValueError as e:
+        logger.warning(f"[REDIS] Ringkasan percakapan tidak terbaca, diabaikan: {e}")
+        return None
+
+
+def save_summary(user_id, summary: dict):
+    _kv_set(f"chat:{user_id}:summary", encode_object(summary), HISTORY_TTL_SECONDS)
+
+
+# ===================================================================
+# RATE LIMITER
+# ===================================================================
+def check_rate_limit(user_id: str, max_requests: int = 5, window_seconds: int = 60) -> bool:
+    """True bila user sudah melewati max_requests dalam jendela window_seconds."""
+    key = f"rate_limit:{user_id}"
+
+    def in_redis(client):
+        pipe = client.pipeline()
+        pipe.incr(key)
+        pipe.expire(key, window_seconds, nx=True)
+        count, _ = pipe.execute()
+        return count > max_requests
+
+    def in_local():
+        now = time.time()
+        count, window_end = _local_limits.get(key) or (0, now + window_seconds)
+        _local_limits.set(key, (count + 1, window_end), ttl=window_end - now)
+        return count + 1 > max_requests
+
+    return _connection.call(in_redis, in_local)
+
+
+# ===================================================================
+# INVALIDASI CACHE ANTAR-WORKER (PUB/SUB)
+# ===================================================================
+_listener = {'thread': None, 'pid': None}
+_listener_lock = threading.Lock()
+
+
+def _handle_invalidation(reason: str):
+    _response_l1.clear()
+    if reason == 'reset':
+        _local_kv.clear()
+    elif reason == 'reindex':
+        expire_active_collection()
+    logger.info(f"[CACHE] Invalidasi diterima ({reason}); L1 worker {os.getpid()} dikosongkan")
+
+
+def _invalidation_loop():
+    delay = 0.5
+    while True:
+        conn = _connection
+        pubsub = conn.client.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+            # Pesan selama terputus tidak bisa diketahui: anggap L1 sudah basi
+            _response_l1.clear()
+            delay = 0.5
+            while conn is _connection:
+                message = pubsub.get_message(timeout=1.0)
+                if message and message['type'] == 'message':
+                    _handle_invalidation(message['data'].decode())
+        except redis.RedisError as e:
+            logger.debug(f"[CACHE] Listener invalidasi terputus: {e}")
+        finally:
+            pubsub.close()
+        time.sleep(delay)
+        delay = min(delay * 2, conn.max_backoff)
+
 
-def _generate_cache_key(query: str) -> str:
-    version = f"{settings.RAG.EMBEDDING_MODEL_NAME}:{settings.RAG.COLLECTION_NAME}"
-    combined = f"{query}:{version}"
+def _ensure_invalidation_listener():
+    """Satu thread listener per proses (dicek per PID agar aman setelah fork gunicorn)."""
+    if _listener['pid'] == os.getpid() and _listener['thread'].is_alive():
+        return
+    with _listener_lock:
+        if _listener['pid'] == os.getpid() and _listener['thread'].is_alive():
+            return
+        _listener['thread'] = threading.Thread(target=_invalidation_loop, name='cache-invalidation', daemon=True)
+        _listener['pid'] = os.getpid()
+        _listener['thread'].start()
+
+
+def publish_cache_invalidation(reason: str) -> int:
+    """Minta semua worker mengosongkan L1 ('reset' atau 'reindex'). Mengembalikan jumlah penerima."""
+    return _connection.call(
+        lambda client: client.publish(settings.CACHE_INVALIDATION_CHANNEL, reason),
+        lambda: 0,
+    )
+
+
+# ===================================================================
+# TUGAS LATAR (KUNCI & STATUS, MIS. PEMANASAN CACHE)
+# ===================================================================
+def acquire_task_lock(name: str, ttl: int) -> bool:
+    """
+    Kunci lintas worker/proses; saat Redis down hanya berlaku di worker ini
+    dan tidak ikut disinkronkan ke Redis setelah pulih (lihat _reconcile).
+    """
+    key = f"{TASK_KEY_PREFIX}{name}:lock"
+    owner = f"{os.getpid()}:{time.time()}"
+
+    def in_local():
+        if _local_kv.get(key) is not None:
+            return False
+        _local_kv.set(key, owner, ttl)
+        return True
+
+    return bool(_connection.call(lambda client: client.set(key, owner, nx=True, ex=ttl), in_local))
+
+
+def release_task_lock(name: str):
+    key = f"{TASK_KEY_PREFIX}{name}:lock"
+    _local_kv.delete(key)
+    _connection.call(lambda client: client.delete(key), lambda: None)
+
+
+def set_task_status(name: str, status: dict, ttl: int = 86400):
+    _kv_set(f"{TASK_KEY_PREFIX}{name}:status", json.dumps(status), ttl)
+
+
+def get_task_status(name: str):
+    raw = _kv_get(f"{TASK_KEY_PREFIX}{name}:status")
+    return json.loads(raw) if raw else None
+
+
+# ===================================================================
+# CACHE JAWABAN & PENCARIAN
+# ===================================================================
+def _cache_version() -> str:
+    # Versi = collection fisik di balik alias, sehingga reindex otomatis
+    # membuat cache jawaban lama tidak terpakai lagi.
+    return f"{settings.RAG.EMBEDDING_MODEL_NAME}:{get_active_collection()}"
+
+def _query_key(query: str) -> str:
+    # Bentuk kanonik: "Gmn cara daftar?" dan "bagaimana cara pendaftaran" berbagi satu entri
+    return canonical_key(query) if settings.CACHE_CANONICAL_KEYS else query
+
+def _generate_cache_key(query: str, version: str = None) -> str:
+    combined = f"{_query_key(query)}:{version or _cache_version()}"
     return f"rag:resp:{hashlib.sha256(combined.encode()).hexdigest()}"
 
-@_safe_redis_call
+def has_cached_response(query: str) -> bool:
+    """Cek keberadaan jawaban di L2 tanpa mengambilnya (tidak dihitung di metrik hit/miss)."""
+    key = _generate_cache_key(query)
+    return bool(_connection.call(lambda client: client.exists(key), lambda: _local_kv.get(key) is not None))
+
 def get_cached_response(query: str):
-    return redis_client.get(_generate_cache_key(query))
+    version = _cache_version()
+    l1_key = (_query_key(query), version)
+    l1_enabled = settings.RESPONSE_L1_TTL_SECONDS > 0
+    if l1_enabled:
+        _ensure_invalidation_listener()
+        cached = _response_l1.get(l1_key)
+        record_cache('response_l1', cached is not None)
+        if cached is not None:
+            return cached
+
+    cached = _decode_cached(_kv_get(_generate_cache_key(query, version)))
+    record_cache('response_l2', bool(cached))
+    if cached and l1_enabled:
+        _response_l1.set(l1_key, cached, ttl=settings.RESPONSE_L1_TTL_SECONDS)
+    return cached
+
+def get_cached_responses(queries: list) -> list:
+    """get_cached_response untuk banyak query: L1 dulu, sisanya satu MGET ke L2. None = miss."""
+    version = _cache_version()
+    l1_enabled = settings.RESPONSE_L1_TTL_SECONDS > 0
+    if l1_enabled:
+        _ensure_invalidation_listener()
+    results = [None] * len(queries)
+    pending = []
+    for i, query in enumerate(queries):
+        if l1_enabled:
+            results[i] = _response_l1.get((_query_key(query), version))
+            record_cache('response_l1', results[i] is not None)
+        if results[i] is None:
+            pending.append(i)
+
+    if pending:
+        keys = [_generate_cache_key(queries[i], version) for i in pending]
+        raw = _connection.call(lambda client: client.mget(keys), lambda: [_local_kv.get(key) for key in keys])
+        for i, data in zip(pending, raw):
+            cached = _decode_cached(data)
+            record_cache('response_l2', bool(cached))
+            if cached and l1_enabled:
+                _response_l1.set((_query_key(queries[i]), version), cached, ttl=settings.RESPONSE_L1_TTL_SECONDS)
+            results[i] = cached or None
+    return results
+
+def _decode_cached(data):
+    if not data:
+        return None
+    try:
+        return decode_text(data)
+    except CodecError as e:
+        logger.warning(f"[REDIS] Jawaban cache tidak terbaca, dianggap miss: {e}")
+        return None
 
-@_safe_redis_call
 def cache_response(query: str, response: str, ttl: int = 3600):
-    redis_client.setex(_generate_cache_key(query), ttl, response)
+    version = _cache_version()
+    _kv_set(_generate_cache_key(query, version), encode_text(response), ttl)
+    if settings.RESPONSE_L1_TTL_SECONDS > 0:
+        _response_l1.set((_query_key(query), version), response, ttl=min(ttl, settings.RESPONSE_L1_TTL_SECONDS))
+
+def _search_cache_key(query: str) -> str:
+    normalized = canonical_key(query) if settings.CACHE_CANONICAL_KEYS else " ".join(query.lower().split())
+    return f"rag:search:{hashlib.sha256(normalized.encode()).hexdigest()}"
+
+def get_cached_search(query: str):
+    raw = _kv_get(_search_cache_key(query))
+    return json.loads(raw) if raw else None
+
+def cache_search(query: str, result: dict, ttl: int = 3600):
+    _kv_set(_search_cache_key(query), json.dumps(result), ttl)
 
-__all__ = ['redis_client', 'REDIS_AVAILABLE', 'get_history', 'save_history', 'get_cached_response', 'cache_response']
\ No newline at end of file
+__all__ = ['redis_client', 'is_redis_available', 'redis_health', 'clear_local_caches',
+           'publish_cache_invalidation', 'decode_history', 'get_history', 'get_summary', 'save_summary',
+           'save_history', 'check_rate_limit', 'get_cached_response', 'get_cached_responses', 'cache_response',
+           'has_cached_response', 'get_cached_search', 'cache_search', 'acquire_task_lock',
+           'release_task_lock', 'set_task_status', 'get_task_status']
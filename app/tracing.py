@@ -0,0 +1,238 @@
+# app/tracing.py
+"""
+Tracing per permintaan berbasis span, disimpan ke log JSONL lokal.
+
+- Satu trace per permintaan (dibuka di blueprint chat), span bersarang untuk
+  search_qdrant, ask_gemini, search_google dan setiap tahap observe_stage.
+- Tail sampling: keputusan simpan diambil setelah permintaan selesai, sehingga
+  permintaan lambat (>= TRACE_SLOW_MS) atau gagal SELALU tersimpan, sisanya
+  diambil acak sebesar TRACE_SAMPLE_RATE.
+- Penulisan lewat antrean + thread latar: jalur permintaan tidak pernah
+  menunggu disk; bila antrean penuh trace dibuang (dihitung di dropped).
+"""
+
+import os
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+class Trace:
+    def __init__(self, name: str, attrs: dict):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attrs = dict(attrs)
+        self.ts = time.time()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.error = None
+        self.duration_ms = None
+        self._stack = []  # index span yang sedang terbuka (untuk parent)
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'ts': self.ts,
+            'duration_ms': self.duration_ms,
+            'error': self.error,
+            **self.attrs,
+            'spans': self.spans,
+        }
+
+    def stage_totals(self) -> dict:
+        """Total durasi (ms) per nama span, untuk header Server-Timing."""
+        totals = {}
+        for span_ in self.spans:
+            totals[span_['name']] = totals.get(span_['name'], 0.0) + span_['dur_ms']
+        return totals
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def current_trace_attrs(**attrs):
+    """Tambahkan atribut (mis. query, cache_hit) ke trace aktif, jika ada."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.attrs.update(attrs)
+
+
+def begin_trace(name: str, **attrs):
+    """Mulai trace untuk konteks saat ini. Mengembalikan token untuk end_trace."""
+    if not settings.TRACE_ENABLED:
+        return None
+    return _current_trace.set(Trace(name, attrs))
+
+
+def end_trace(token, error: str = None):
+    """Tutup trace, lakukan tail sampling, dan kirim ke sink bila disimpan."""
+    if token is None:
+        return None
+    trace = _current_trace.get()
+    _current_trace.reset(token)
+    if trace is None:
+        return None
+    trace.duration_ms = round((time.perf_counter() - trace.started) * 1000, 3)
+    trace.error = trace.error or error
+    if should_keep(trace.duration_ms, trace.error):
+        get_sink().submit(trace.to_dict())
+    return trace
+
+
+def should_keep(duration_ms: float, error) -> bool:
+    if error or duration_ms >= settings.TRACE_SLOW_MS:
+        return True
+    return random.random() < settings.TRACE_SAMPLE_RATE
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Catat satu span pada trace aktif; tanpa trace aktif, tidak melakukan apa pun."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    record = {
+        'name': name,
+        'parent': trace._stack[-1] if trace._stack else None,
+        'start_ms': round((time.perf_counter() - trace.started) * 1000, 3),
+        'dur_ms': None,
+    }
+    if attrs:
+        record['attrs'] = attrs
+    trace.spans.append(record)
+    trace._stack.append(len(trace.spans) - 1)
+    started = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        trace.error = trace.error or record['error']
+        raise
+    finally:
+        record['dur_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        trace._stack.pop()
+
+
+@contextmanager
+def detached_from_trace():
+    """Jalankan blok tanpa trace aktif, mis. kerja latar yang bisa selesai setelah permintaan berakhir."""
+    token = _current_trace.set(None)
+    try:
+        yield
+    finally:
+        _current_trace.reset(token)
+
+
+def traced(name: str):
+    """Decorator: bungkus seluruh fungsi dalam satu span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing_header(trace) -> str:
+    """Format header Server-Timing dari total durasi per tahap."""
+    return ", ".join(
+        f"{name.replace(' ', '_')};dur={dur:.1f}" for name, dur in trace.stage_totals().items()
+    )
+
+
+# ===================================================================
+# SINK JSONL (BUFFERED, NON-BLOCKING)
+# ===================================================================
+class JsonlSink:
+    def __init__(self, path: str, max_queue: int = 1000, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name='trace-sink', daemon=True)
+        self._thread.start()
+
+    def submit(self, record: dict):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self) -> list:
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _write(self, batch: list):
+        if not batch:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for record in batch:
+                    f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except Exception as e:
+            logger.warning(f"[TRACE] Gagal menulis {len(batch)} trace: {e}")
+
+    def _run(self):
+        while True:
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            self._write([first] + self._drain())
+
+    def flush(self):
+        self._write(self._drain())
+
+
+_sinks = {}
+_sinks_pid = None
+_sink_lock = threading.Lock()
+
+
+def get_sink(path: str = None) -> JsonlSink:
+    """Sink per proses per file, default TRACE_LOG_PATH (dibuat ulang setelah fork worker gunicorn)."""
+    global _sinks_pid
+    path = path or settings.TRACE_LOG_PATH
+    if _sinks_pid != os.getpid() or path not in _sinks:
+        with _sink_lock:
+            if _sinks_pid != os.getpid():
+                _sinks.clear()
+                _sinks_pid = os.getpid()
+            if path not in _sinks:
+                _sinks[path] = JsonlSink(path)
+                atexit.register(_sinks[path].flush)
+    return _sinks[path]
+
+
+def log_query(query: str, **attrs):
+    """
+    Satu baris per pertanyaan valid ke QUERY_LOG_PATH, tanpa sampling.
+    Trace di-tail-sample (yang lambat/gagal selalu disimpan), sehingga
+    frekuensinya condong ke pertanyaan lambat; prewarm menambang log ini.
+    """
+    if settings.QUERY_LOG_ENABLED:
+        get_sink(settings.QUERY_LOG_PATH).submit({'ts': round(time.time(), 3), 'query': query, **attrs})
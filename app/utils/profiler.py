@@ -0,0 +1,193 @@
+# app/utils/profiler.py
+"""
+Profiling on-demand di dalam worker yang sedang berjalan (tanpa redeploy).
+
+- Sampler stack: thread latar membaca sys._current_frames() setiap interval
+  selama N detik, lalu menulis "collapsed stacks" (frame;frame;frame count)
+  yang bisa langsung diberikan ke flamegraph.pl / speedscope. Berjalan di
+  latar karena worker sync hanya punya satu thread permintaan.
+- Snapshot tracemalloc: di-dump ke disk per PID, sehingga selisih dua snapshot
+  dari worker yang sama bisa dihitung oleh worker mana pun. Berguna untuk
+  melacak pertumbuhan memori di antara recycle max_requests gunicorn.
+  tracemalloc hanya aktif selama satu sesi: snapshot pertama menyalakannya,
+  snapshot kedua (pasangan lengkap) mematikannya, dan timer mematikannya bila
+  snapshot kedua tak kunjung datang. Tracing memperlambat setiap alokasi dan
+  menyimpan traceback-nya, jadi tidak boleh dibiarkan menyala di worker.
+"""
+
+import os
+import sys
+import glob
+import time
+import uuid
+import threading
+import tracemalloc
+
+_sampler_lock = threading.Lock()
+_snapshot_lock = threading.Lock()
+_trace_session = None   # (id, Timer) bila tracing dinyalakan oleh take_snapshot
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _collapse(frame) -> str:
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def _atomic_write(path: str, content: str):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def profile_path(directory: str, profile_id: str) -> str:
+    return os.path.join(directory, f"stacks-{profile_id}.txt")
+
+
+def _sample(seconds: float, interval: float, out_path: str):
+    me = threading.get_ident()
+    stacks = {}
+    deadline = time.monotonic() + seconds
+    try:
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                key = f"{names.get(ident, ident)};{_collapse(frame)}"
+                stacks[key] = stacks.get(key, 0) + 1
+            time.sleep(interval)
+        lines = [f"{stack} {count}" for stack, count in sorted(stacks.items(), key=lambda kv: -kv[1])]
+        _atomic_write(out_path, "\n".join(lines) + "\n")
+    finally:
+        _sampler_lock.release()
+
+
+def start_stack_sampler(directory: str, seconds: float, interval: float = 0.005) -> str:
+    """
+    Mulai sampler di thread latar; hasil ditulis ke profile_path(directory, id).
+    Mengembalikan profile_id. ValueError bila sampler lain masih berjalan di proses ini.
+    """
+    if not _sampler_lock.acquire(blocking=False):
+        raise ValueError("Profiling lain sedang berjalan di worker ini.")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        profile_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        thread = threading.Thread(
+            target=_sample,
+            args=(seconds, interval, profile_path(directory, profile_id)),
+            name='stack-sampler',
+            daemon=True,
+        )
+        thread.start()
+    except Exception:
+        _sampler_lock.release()
+        raise
+    return profile_id
+
+
+def _snapshot_files(directory: str, pid: int) -> list:
+    return sorted(glob.glob(os.path.join(directory, f"mem-{pid}-*.snap")))
+
+
+def _end_session_locked(session_id=None):
+    """Matikan tracing milik sesi aktif (atau hanya sesi `session_id`); panggil dengan _snapshot_lock."""
+    global _trace_session
+    if _trace_session is None or (session_id is not None and _trace_session[0] != session_id):
+        return
+    _trace_session[1].cancel()
+    _trace_session = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def _expire_session(session_id: str):
+    with _snapshot_lock:
+        _end_session_locked(session_id)
+
+
+def stop_tracing() -> bool:
+    """Matikan tracing yang dinyalakan take_snapshot. True bila ada sesi yang dihentikan."""
+    with _snapshot_lock:
+        active = _trace_session is not None
+        _end_session_locked()
+        return active
+
+
+def take_snapshot(directory: str, frames: int = 10, max_seconds: float = 900) -> dict:
+    """
+    Ambil snapshot tracemalloc proses ini dan simpan ke disk (dua terakhir per PID).
+
+    Panggilan pertama menyalakan tracemalloc (alokasi sebelumnya tidak terlacak)
+    dan membuang snapshot lama worker ini; panggilan kedua melengkapi pasangan
+    lalu mematikan tracing. Bila snapshot kedua tidak diambil dalam
+    `max_seconds`, tracing dimatikan otomatis. Tracing yang sudah menyala dari
+    luar (PYTHONTRACEMALLOC) dibiarkan.
+    """
+    global _trace_session
+    with _snapshot_lock:
+        os.makedirs(directory, exist_ok=True)
+        pid = os.getpid()
+        starting = not tracemalloc.is_tracing()
+        if starting:
+            # Snapshot sesi sebelumnya tidak sebanding dengan sesi baru
+            for stale in _snapshot_files(directory, pid):
+                os.remove(stale)
+            tracemalloc.start(frames)
+            session_id = uuid.uuid4().hex[:8]
+            timer = threading.Timer(max_seconds, _expire_session, args=(session_id,))
+            timer.daemon = True
+            timer.start()
+            _trace_session = (session_id, timer)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        snapshot.dump(os.path.join(directory, f"mem-{pid}-{time.time():.3f}.snap"))
+        files = _snapshot_files(directory, pid)
+        for stale in files[:-2]:
+            os.remove(stale)
+        current, peak = tracemalloc.get_traced_memory()
+        if not starting:
+            _end_session_locked()
+        return {
+            'pid': pid,
+            'snapshots': min(len(files), 2),
+            'traced_current_mb': round(current / (1024 * 1024), 2),
+            'traced_peak_mb': round(peak / (1024 * 1024), 2),
+            'tracing': tracemalloc.is_tracing(),
+        }
+
+
+def diff_snapshots(directory: str, pid: int, limit: int = 20, key_type: str = 'lineno') -> dict:
+    """Bandingkan dua snapshot terakhir milik `pid`: lokasi dengan pertumbuhan terbesar."""
+    files = _snapshot_files(directory, pid)
+    if len(files) < 2:
+        raise ValueError(f"Butuh 2 snapshot dari worker {pid}; baru ada {len(files)}.")
+    old_path, new_path = files[-2:]
+    old = tracemalloc.Snapshot.load(old_path)
+    new = tracemalloc.Snapshot.load(new_path)
+    interval = float(new_path.rsplit('-', 1)[1][:-5]) - float(old_path.rsplit('-', 1)[1][:-5])
+    stats = new.compare_to(old, key_type)
+    return {
+        'pid': pid,
+        'interval_seconds': round(interval, 1),
+        'total_diff_kb': round(sum(s.size_diff for s in stats) / 1024, 1),
+        'top': [
+            {
+                'location': str(s.traceback[0]) if s.traceback else '?',
+                'size_diff_kb': round(s.size_diff / 1024, 1),
+                'size_kb': round(s.size / 1024, 1),
+                'count_diff': s.count_diff,
+            }
+            for s in stats[:limit]
+        ],
+    }
@@ -0,0 +1,126 @@
+# app/utils/text.py
+"""
+Normalisasi teks Bahasa Indonesia yang dipakai bersama oleh retrieval
+(embedding query) dan indeks leksikal BM25 (query & dokumen).
+
+- preprocess_query / tokenize: normalisasi dokumen & indeks BM25 (jangan
+  diubah tanpa membangun ulang indeks leksikal).
+- canonical_text: bentuk kanonik query pengguna (Unicode NFKC, casefold,
+  tanda baca, singkatan chat "gmn"/"kpn", kata sapaan/basa-basi, stem map).
+  Urutan kata dipertahankan; dipakai sebagai masukan embedding.
+- canonical_key: canonical_text dengan token diurutkan bila aman (tanpa kata
+  yang maknanya bergantung urutan, mis. "dari"/"ke"/"tidak", dan tanpa angka);
+  dipakai sebagai kunci cache jawaban & pencarian.
+"""
+
+import re
+import unicodedata
+
+# Stemming sederhana: "pendaftaran" -> "daftar", "penerimaan" -> "terima"
+INDONESIAN_STEM = {
+    'pendaftaran': 'daftar',
+    'penerimaan': 'terima',
+    'pengumuman': 'umum',
+    'mahasiswa': 'mhs',
+    'kampus': 'kampus',
+    'universitas': 'univ',
+    'fakultas': 'fak',
+    'jurusan': 'jur',
+    'program': 'prodi',
+    'studi': 'prodi'
+}
+
+# Kata fungsi/kata tanya yang tidak membawa makna pencarian
+INDONESIAN_STOPWORDS = frozenset({
+    'apa', 'apakah', 'itu', 'ini', 'yang', 'dan', 'atau', 'di', 'ke', 'dari',
+    'untuk', 'dengan', 'pada', 'adalah', 'bagaimana', 'gimana', 'siapa', 'kapan',
+    'dimana', 'mana', 'berapa', 'mengapa', 'kenapa', 'saya', 'aku', 'kak', 'min',
+    'tolong', 'mohon', 'bisa', 'ada', 'ya', 'dong', 'sih', 'tentang', 'cara',
+})
+
+
+# Singkatan/ejaan chat -> bentuk baku (diterapkan sebelum INDONESIAN_STEM)
+INDONESIAN_SLANG = {
+    'gmn': 'bagaimana', 'gmna': 'bagaimana', 'gimana': 'bagaimana', 'bgmn': 'bagaimana',
+    'kpn': 'kapan', 'kapankah': 'kapan',
+    'brp': 'berapa', 'brapa': 'berapa', 'berapakah': 'berapa',
+    'dmn': 'dimana', 'dmana': 'dimana', 'manakah': 'mana',
+    'knp': 'kenapa', 'napa': 'kenapa', 'mengapa': 'kenapa',
+    'apakah': 'apa', 'apa2': 'apa', 'siapakah': 'siapa',
+    'yg': 'yang', 'dg': 'dengan', 'dgn': 'dengan', 'utk': 'untuk', 'untk': 'untuk',
+    'krn': 'karena', 'karna': 'karena', 'jg': 'juga',
+    'tdk': 'tidak', 'gak': 'tidak', 'ga': 'tidak', 'nggak': 'tidak', 'ngga': 'tidak', 'enggak': 'tidak',
+    'gk': 'tidak', 'blm': 'belum', 'udah': 'sudah', 'udh': 'sudah', 'sdh': 'sudah',
+    'bs': 'bisa', 'bsa': 'bisa', 'aja': 'saja', 'sy': 'saya', 'aq': 'aku',
+    'klo': 'kalau', 'kalo': 'kalau', 'pake': 'pakai', 'trs': 'terus',
+    'mhsw': 'mahasiswa', 'mahasiswi': 'mahasiswa',
+}
+
+# Sapaan/basa-basi yang tidak mengubah maksud pertanyaan. Kata tanya & negasi
+# sengaja TIDAK dibuang: "kapan" vs "berapa" biaya daftar adalah jawaban berbeda.
+# 'min'/'mimin' (sapaan admin) sengaja tidak ada: 'min' juga singkatan 'minimal'
+# ("ipk min 3"), dan membuangnya menyatukan pertanyaan yang berbeda di cache
+INDONESIAN_FILLERS = frozenset({
+    'tolong', 'mohon', 'kak', 'kakak', 'gan', 'ya', 'yah', 'dong',
+    'sih', 'deh', 'nih', 'kah', 'halo', 'hallo', 'hai', 'hi', 'permisi', 'maaf',
+})
+
+# Kata yang maknanya bergantung urutan ("pindah dari A ke B"); bila ada, token tidak diurutkan
+ORDER_SENSITIVE_WORDS = frozenset({
+    'dari', 'ke', 'sebelum', 'setelah', 'sesudah', 'tidak', 'bukan', 'belum', 'tanpa',
+    'kecuali', 'selain', 'lebih', 'kurang', 'daripada', 'antara', 'vs', 'versus',
+    'hingga', 'sampai', 'menjadi', 'jadi',
+})
+
+
+def preprocess_query(query):
+    """
+    Preprocessing query untuk meningkatkan hasil pencarian
+    """
+    # 1. Convert ke lowercase
+    processed = query.lower()
+    
+    # 2. Hapus karakter khusus tapi pertahankan yang penting
+    processed = re.sub(r'[^\w\s\u00C0-\u017F]', ' ', processed)
+    
+    # 3. Normalisasi whitespace
+    processed = re.sub(r'\s+', ' ', processed).strip()
+    
+    # 4. Stemming sederhana Bahasa Indonesia
+    words = processed.split()
+    processed_words = []
+    for word in words:
+        if word in INDONESIAN_STEM:
+            processed_words.append(INDONESIAN_STEM[word])
+        else:
+            processed_words.append(word)
+    
+    return ' '.join(processed_words)
+
+
+def tokenize(text: str) -> list:
+    """Token untuk indeks leksikal: normalisasi yang sama persis dengan preprocess_query."""
+    return preprocess_query(text).split()
+
+
+def canonical_tokens(query: str) -> list:
+    """Token kanonik query pengguna, urutan asli dipertahankan."""
+    text = unicodedata.normalize('NFKC', query).casefold()
+    text = re.sub(r'[^\w\s\u00C0-\u017F]', ' ', text).replace('_', ' ')
+    tokens = [INDONESIAN_SLANG.get(word, word) for word in text.split()]
+    kept = [word for word in tokens if word not in INDONESIAN_FILLERS]
+    # Query yang seluruhnya basa-basi ("halo kak") tetap dipertahankan apa adanya
+    return [INDONESIAN_STEM.get(word, word) for word in (kept or tokens)]
+
+
+def canonical_text(query: str) -> str:
+    """Bentuk kanonik berurutan (masukan embedding)."""
+    return ' '.join(canonical_tokens(query))
+
+
+def canonical_key(query: str) -> str:
+    """Bentuk kanonik untuk kunci cache: token diurutkan bila urutan tidak mengubah makna."""
+    tokens = canonical_tokens(query)
+    if any(word in ORDER_SENSITIVE_WORDS or any(ch.isdigit() for ch in word) for word in tokens):
+        return ' '.join(tokens)
+    return ' '.join(sorted(tokens))
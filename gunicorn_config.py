@@ -1,9 +1,11 @@
 # gunicorn.conf.py
 import os
+import shutil
 
-bind = "127.0.0.1:8000"  # Hanya bind ke localhost (Nginx sebagai reverse proxy)
-workers = 2              # 2 worker untuk 2 vCPU
-worker_class = "sync"
+bind = os.environ.get("GUNICORN_BIND", "127.0.0.1:8000")  # Hanya bind ke localhost (Nginx sebagai reverse proxy)
+workers = int(os.environ.get("GUNICORN_WORKERS", 2))        # 2 worker untuk 2 vCPU
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+threads = int(os.environ.get("GUNICORN_THREADS", 1))        # hanya berlaku untuk gthread
 timeout = 90
 keepalive = 5
 max_requests = 400
@@ -11,13 +13,28 @@ max_requests_jitter = 40
 preload_app = False
 
 # Logging
-log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+log_dir = os.environ.get("GUNICORN_LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs"))
 accesslog = os.path.join(log_dir, "gunicorn_access.log")
 errorlog = os.path.join(log_dir, "gunicorn_error.log")
 loglevel = "info"
 capture_output = True
 
 # Security
-user = "chatbot"
-group = "chatbot"
-worker_tmp_dir = "/dev/shm"
\ No newline at end of file
+user = os.environ.get("GUNICORN_USER", "chatbot")
+group = os.environ.get("GUNICORN_GROUP", "chatbot")
+worker_tmp_dir = "/dev/shm"
+
+# Metrik Prometheus lintas worker: setiap worker menulis ke direktori ini,
+# /metrics menggabungkannya. Harus diset sebelum worker mengimpor aplikasi.
+prometheus_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(worker_tmp_dir, "chatbot-metrics")
+)
+
+def on_starting(server):
+    # Bersihkan sisa metrik dari run sebelumnya
+    shutil.rmtree(prometheus_dir, ignore_errors=True)
+    os.makedirs(prometheus_dir, exist_ok=True)
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
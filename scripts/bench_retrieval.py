@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# scripts/bench_retrieval.py
+"""
+Benchmark jalur retrieval: ramping (skor server, tanpa vektor) vs lama
+(with_vectors + cosine ulang di klien). Mengukur latensi dan ukuran
+respons Qdrant untuk query yang sama.
+
+Contoh:
+    python scripts/bench_retrieval.py --repeat 20
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import requests
+
+from app.config import settings
+from app.rag_initializer import get_runtime_components, get_active_collection
+from app.core.main import embed_query, _search_lean, _search_legacy
+
+DEFAULT_QUERIES = [
+    "Apa visi UIN Salatiga?",
+    "Bagaimana prosedur penerimaan mahasiswa baru jalur mandiri?",
+    "Siapa rektor UIN Salatiga?",
+    "Apa akreditasi UIN Salatiga?",
+    "Bagaimana cara menyusun surat pendamping ijazah?",
+]
+
+
+def response_bytes(collection, vector, body_extra):
+    """Ukuran body respons REST Qdrant untuk satu pencarian."""
+    url = f"{settings.RAG.QDRANT_URL.rstrip('/')}/collections/{collection}/points/search"
+    body = {"vector": vector.tolist(), **body_extra}
+    resp = requests.post(url, json=body, headers={"api-key": settings.RAG.QDRANT_API_KEY}, timeout=30)
+    resp.raise_for_status()
+    return len(resp.content)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top-k", type=int, default=settings.RAG.TOP_K_RETRIEVAL)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--threshold", type=float, default=settings.RAG.RAG_RELEVANCE_THRESHOLD)
+    args = parser.parse_args()
+
+    rag = get_runtime_components()
+    client, embedder = rag["qdrant_client"], rag["embedder"]
+    collection = get_active_collection()
+    vectors = [embed_query(q, embedder) for q in DEFAULT_QUERIES]
+
+    modes = {
+        "lean": (
+            lambda v: _search_lean(client, collection, v, args.top_k, args.threshold),
+            {"limit": args.top_k, "with_payload": ["text"], "with_vector": False,
+             "score_threshold": args.threshold},
+        ),
+        "legacy": (
+            lambda v: _search_legacy(client, collection, v, args.top_k),
+            {"limit": args.top_k * 2, "with_payload": True, "with_vector": True},
+        ),
+    }
+
+    print(f"Collection: {collection} | query: {len(vectors)} x {args.repeat} | top_k={args.top_k}\n")
+    print(f"{'mode':<8} {'p50 ms':>8} {'p95 ms':>8} {'mean ms':>8} {'bytes/query':>12}")
+    for name, (search, body_extra) in modes.items():
+        search(vectors[0])  # pemanasan koneksi
+        latencies = []
+        for _ in range(args.repeat):
+            for vec in vectors:
+                start = time.perf_counter()
+                search(vec)
+                latencies.append((time.perf_counter() - start) * 1000)
+        sizes = [response_bytes(collection, vec, body_extra) for vec in vectors]
+        print(f"{name:<8} {percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} "
+              f"{statistics.mean(latencies):>8.1f} {statistics.mean(sizes):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# scripts/bench_storage.py
+"""
+Benchmark format penyimpanan Redis untuk riwayat chat dan jawaban cache:
+format lama (JSON / teks polos) vs format ringkas app/core/codec.py
+(msgpack + zstd, dengan dan tanpa kamus bersama).
+
+Yang diukur:
+- byte per user (HISTORY_MAX_ITEMS giliran) dan per jawaban cache;
+- bila --redis-url diberikan: MEMORY USAGE sungguhan per key di Redis
+  (key sementara bench:storage:* yang dihapus lagi);
+- biaya encode/decode per item (waktu terbaik dari beberapa ulangan).
+
+Sampel diambil dari Redis produksi (--from-redis, paling representatif)
+atau dibangkitkan dari query bawaan + kalimat PDF di data/. Kamus dilatih
+pada separuh user dan diukur pada separuh lainnya agar angkanya tidak
+terlalu optimistis.
+
+    python scripts/bench_storage.py
+    python scripts/bench_storage.py --from-redis --redis-url redis://localhost:6379/15
+
+    # Latih & simpan kamus bersama (lalu restart worker agar termuat)
+    python scripts/bench_storage.py --from-redis --save-dict data/redis_codec.dict
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import msgpack
+import redis
+import zstandard
+
+from app.config import settings
+from app.core.codec import (
+    CompactCodec, encode_history_item, decode_history_item, encode_text, decode_text,
+)
+from app.redis_manager import HISTORY_MAX_ITEMS, decode_history
+
+
+# ===================================================================
+# SAMPEL
+# ===================================================================
+def samples_from_redis(url: str, max_users: int):
+    client = redis.from_url(url, decode_responses=False)
+    users, answers = [], []
+    for key in client.scan_iter("chat:*", count=500):
+        if len(users) >= max_users:
+            break
+        history = decode_history(client.lrange(key, 0, -1))
+        if history:
+            users.append(history)
+    for key in client.scan_iter("rag:resp:*", count=500):
+        if len(answers) >= max_users:
+            break
+        raw = client.get(key)
+        if raw:
+            answers.append(decode_text(raw))
+    return users, answers
+
+
+def synthetic_samples(n_users: int, seed: int = 42):
+    """Jawaban = potongan kalimat PDF berformat seperti keluaran model; ts float seperti format lama."""
+    from microbench import load_pages
+    from loadtest import DEFAULT_QUERIES
+
+    rng = random.Random(seed)
+    sentences = [s.strip() for page in load_pages('data', 50) for s in page.split('.') if len(s.strip()) > 40]
+
+    def answer():
+        body = ". ".join(rng.sample(sentences, rng.randint(3, 8)))
+        return f"Berdasarkan dokumen UIN Salatiga, {body}.\n\n**Sumber:** dokumen resmi UIN Salatiga."
+
+    now = time.time()
+    users = []
+    for _ in range(n_users):
+        turns = rng.randint(3, HISTORY_MAX_ITEMS)
+        users.append([
+            {'user': rng.choice(DEFAULT_QUERIES), 'ai': answer(), 'ts': now - rng.random() * 1800}
+            for _ in range(turns)
+        ])
+    answers = [answer() for _ in range(n_users)]
+    return users, answers
+
+
+# ===================================================================
+# FORMAT
+# ===================================================================
+def train_dictionary(users: list, answers: list, dict_size: int):
+    samples = [msgpack.packb([i['user'], i['ai'], int(i['ts'])]) for u in users for i in u]
+    samples += [msgpack.packb(a) for a in answers]
+    return zstandard.train_dictionary(dict_size, samples), len(samples)
+
+
+def build_formats(train_users: list, train_answers: list, dict_size: int) -> dict:
+    formats = {
+        'json (lama)': (lambda item: json.dumps(item).encode(), lambda data: json.loads(data),
+                        lambda text: text.encode(), lambda data: data.decode('utf-8')),
+    }
+    codecs = {'msgpack+zstd': CompactCodec()}
+    try:
+        dictionary, _ = train_dictionary(train_users, train_answers, dict_size)
+        codecs['msgpack+zstd+kamus'] = CompactCodec(dictionary)
+    except zstandard.ZstdError as e:
+        print(f"  [WARNING] Kamus tidak bisa dilatih: {e}")
+    for name, codec in codecs.items():
+        formats[name] = (
+            lambda item, c=codec: encode_history_item(item, c),
+            lambda data, c=codec: decode_history_item(data, c),
+            lambda text, c=codec: encode_text(text, c),
+            lambda data, c=codec: decode_text(data, c),
+        )
+    return formats
+
+
+def best_per_call_us(func, items: list, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            func(item)
+        best = min(best, (time.perf_counter() - start) / len(items))
+    return best * 1e6
+
+
+def redis_memory(client, users_encoded: list, answers_encoded: list):
+    """Rata-rata MEMORY USAGE (byte) per key riwayat dan per key jawaban."""
+    pipe = client.pipeline()
+    for i, items in enumerate(users_encoded):
+        pipe.rpush(f"bench:storage:chat:{i}", *items)
+    for i, value in enumerate(answers_encoded):
+        pipe.set(f"bench:storage:resp:{i}", value)
+    pipe.execute()
+    try:
+        history = [client.memory_usage(f"bench:storage:chat:{i}", samples=0) for i in range(len(users_encoded))]
+        answers = [client.memory_usage(f"bench:storage:resp:{i}", samples=0) for i in range(len(answers_encoded))]
+    finally:
+        keys = list(client.scan_iter("bench:storage:*", count=1000))
+        if keys:
+            client.delete(*keys)
+    return statistics.mean(history), statistics.mean(answers)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark format penyimpanan riwayat & cache jawaban di Redis.")
+    parser.add_argument("--from-redis", action="store_true",
+                        help="Ambil sampel dari REDIS_URL (chat:* dan rag:resp:*), bukan data sintetis.")
+    parser.add_argument("--users", type=int, default=400, help="Jumlah user/jawaban sampel.")
+    parser.add_argument("--redis-url", default=None,
+                        help="Ukur MEMORY USAGE di Redis ini (pakai DB kosong, mis. .../15).")
+    parser.add_argument("--dict-size", type=int, default=16384, help="Ukuran kamus zstd (byte).")
+    parser.add_argument("--save-dict", default=None, help="Latih kamus pada SEMUA sampel lalu simpan ke path ini.")
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.from_redis:
+        users, answers = samples_from_redis(settings.REDIS_URL, args.users)
+    else:
+        users, answers = synthetic_samples(args.users)
+    if len(users) < 4 or len(answers) < 4:
+        raise SystemExit(f"Sampel terlalu sedikit: {len(users)} user, {len(answers)} jawaban")
+
+    if args.save_dict:
+        dictionary, n_samples = train_dictionary(users, answers, args.dict_size)
+        with open(args.save_dict, 'wb') as f:
+            f.write(dictionary.as_bytes())
+        print(f"Kamus disimpan: {args.save_dict} (dict_id {dictionary.dict_id()}, {n_samples} sampel)")
+        print("Restart worker agar kamus termuat; nilai lama (kamus lain) dibaca sebagai miss.")
+        return
+
+    half = len(users) // 2
+    formats = build_formats(users[:half], answers[:half], args.dict_size)
+    test_users, test_answers = users[half:], answers[half:]
+    test_items = [item for u in test_users for item in u]
+    client = redis.from_url(args.redis_url, decode_responses=False) if args.redis_url else None
+
+    print(f"Sampel uji: {len(test_users)} user ({len(test_items)} giliran), {len(test_answers)} jawaban "
+          f"({'Redis' if args.from_redis else 'sintetis'})\n")
+    header = f"{'format':<22}{'B/user':>10}{'B/jawaban':>11}{'enc us':>9}{'dec us':>9}"
+    if client:
+        header += f"{'Redis B/user':>14}{'Redis B/jwb':>13}"
+    print(header)
+
+    baseline = None
+    for name, (enc_item, dec_item, enc_text, dec_text) in formats.items():
+        users_encoded = [[enc_item(item) for item in u] for u in test_users]
+        answers_encoded = [enc_text(a) for a in test_answers]
+        per_user = statistics.mean(sum(len(v) for v in u) for u in users_encoded)
+        per_answer = statistics.mean(len(v) for v in answers_encoded)
+
+        flat = [v for u in users_encoded for v in u]
+        assert [dec_item(v)['ai'] for v in flat] == [i['ai'] for i in test_items]
+        enc_us = best_per_call_us(enc_item, test_items, args.repeat)
+        dec_us = best_per_call_us(dec_item, flat, args.repeat)
+
+        line = f"{name:<22}{per_user:>10.0f}{per_answer:>11.0f}{enc_us:>9.1f}{dec_us:>9.1f}"
+        if client:
+            mem_user, mem_answer = redis_memory(client, users_encoded, answers_encoded)
+            line += f"{mem_user:>14.0f}{mem_answer:>13.0f}"
+        baseline = baseline or per_user
+        print(line + f"   ({per_user / baseline:.0%} dari json)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# scripts/cache_key_report.py
+"""
+Ukur dampak kunci cache kanonik pada log query sungguhan: berapa hit rate cache
+jawaban bila dikunci teks apa adanya (format lama), huruf kecil + spasi
+(format lama cache pencarian), canonical_text, dan canonical_key.
+
+Simulasi: setiap query adalah hit bila kuncinya sudah muncul dalam --ttl detik
+terakhir (butuh field 'ts' di log JSONL; tanpa itu TTL diabaikan). Versi
+knowledge base, FAQ dan riwayat percakapan tidak ikut disimulasikan, jadi
+angkanya adalah batas atas per kunci — yang dibandingkan adalah selisihnya.
+
+    python scripts/cache_key_report.py --log logs/queries.jsonl
+    python scripts/cache_key_report.py --log logs/queries.jsonl --merges 30   # periksa penggabungan
+
+Bagian "penggabungan" menampilkan kelompok canonical_key terbesar dengan
+bentuk asli yang berbeda; periksa bahwa semuanya memang pertanyaan yang sama
+sebelum mengubah INDONESIAN_SLANG / INDONESIAN_FILLERS.
+"""
+
+import os
+import sys
+import json
+import argparse
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.config import settings
+from app.utils.text import canonical_text, canonical_key
+from app.utils.validators import validate_query
+
+KEY_FUNCTIONS = {
+    'apa adanya': lambda q: q,
+    'lower+spasi': lambda q: " ".join(q.lower().split()),
+    'canonical_text': canonical_text,
+    'canonical_key': canonical_key,
+}
+
+
+def read_records(path: str):
+    """(ts | None, query) dari log JSONL berfield 'query' atau teks satu query per baris."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith('.jsonl'):
+                try:
+                    record = json.loads(line)
+                    query, ts = record.get('query'), record.get('ts')
+                except (ValueError, AttributeError):
+                    continue
+            else:
+                query, ts = line, None
+            if isinstance(query, str) and validate_query(query.strip()):
+                yield (ts if isinstance(ts, (int, float)) else None), query.strip()
+
+
+def simulate(records: list, key_func, ttl: float) -> dict:
+    written_at = {}  # kunci -> ts jawaban ditulis (TTL tidak diperpanjang oleh hit)
+    hits = 0
+    for ts, query in records:
+        key = key_func(query)
+        if key in written_at and (ts is None or written_at[key] is None or ts - written_at[key] <= ttl):
+            hits += 1
+        else:
+            written_at[key] = ts
+    return {'hits': hits, 'keys': len(written_at), 'hit_rate': hits / len(records)}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Hit rate cache jawaban per skema kunci pada log query.")
+    parser.add_argument("--log", action="append", default=None,
+                        help=f"File log query (boleh diulang). Default: {settings.QUERY_LOG_PATH}")
+    parser.add_argument("--ttl", type=float, default=3600, help="TTL cache jawaban (detik).")
+    parser.add_argument("--merges", type=int, default=15, help="Jumlah kelompok penggabungan yang ditampilkan.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    paths = args.log or [settings.QUERY_LOG_PATH]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise SystemExit(f"Log query tidak ditemukan: {', '.join(missing)}")
+
+    records = [record for path in paths for record in read_records(path)]
+    records.sort(key=lambda r: r[0] if r[0] is not None else float('-inf'))
+    if not records:
+        raise SystemExit("Tidak ada query valid di log.")
+    print(f"{len(records)} query dari {', '.join(paths)} (TTL {args.ttl:.0f} detik)\n")
+
+    print(f"{'kunci':<16}{'entri':>8}{'hit':>8}{'hit rate':>10}")
+    baseline = None
+    for name, key_func in KEY_FUNCTIONS.items():
+        result = simulate(records, key_func, args.ttl)
+        baseline = result['hit_rate'] if baseline is None else baseline
+        gain = f"   ({(result['hit_rate'] - baseline) * 100:+.1f} poin)" if name != 'apa adanya' else ""
+        print(f"{name:<16}{result['keys']:>8}{result['hits']:>8}{result['hit_rate']:>10.1%}{gain}")
+
+    groups = defaultdict(Counter)
+    for _, query in records:
+        groups[canonical_key(query)][query] += 1
+    merged = sorted((g for g in groups.items() if len(g[1]) > 1), key=lambda g: -sum(g[1].values()))
+    if merged and args.merges > 0:
+        print("\nPenggabungan terbesar (canonical_key -> bentuk asli):")
+        for key, forms in merged[:args.merges]:
+            print(f"  {key!r} ({sum(forms.values())}x)")
+            for query, count in forms.most_common(5):
+                print(f"      {count:>5}  {query}")
+
+
+if __name__ == "__main__":
+    main()
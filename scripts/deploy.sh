@@ -4,6 +4,15 @@
 
 set -e  # Hentikan jika ada error
 
+# Knowledge base tidak disentuh skrip ini; jalankan scripts/ingestion.py terpisah.
+# Migrasi satu kali dari deployment lama (COLLECTION_NAME masih collection fisik,
+# belum alias), di luar jam sibuk:
+#   python scripts/ingestion.py --migrate-legacy
+# Isi collection lama disalin ke <COLLECTION_NAME>_v00000000000000 (rollback:
+# --rollback <nama itu>), lalu diganti alias; ada jeda singkat tanpa collection
+# di antara penghapusan dan pembuatan alias. Tanpa flag ini ingestion menolak
+# menghapus collection lama.
+
 PROJECT_DIR="/home/chatbot/chatbot-rag-uin-salatiga"
 LOG_FILE="$PROJECT_DIR/logs/deploy.log"
 
@@ -25,6 +34,8 @@ sudo systemctl restart chatbot.service
 sleep 5
 if curl -f http://localhost:8000/api/health >> "$LOG_FILE" 2>&1; then
     echo "$(date): Deployment berhasil." >> "$LOG_FILE"
+    # Panaskan cache jawaban di latar (dibatasi rate; tidak menahan deploy)
+    nohup python scripts/prewarm_cache.py >> "$PROJECT_DIR/logs/prewarm.log" 2>&1 &
 else
     echo "$(date): ERROR: Health check gagal!" >> "$LOG_FILE"
     exit 1
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+# scripts/eval_retrieval.py
+"""
+Evaluasi retrieval offline: sapu konfigurasi (top-k, threshold relevansi,
+parameter chunker, embedder penuh vs int8, dense vs hibrida, tanpa/dengan
+router topik, dimensi vektor, kuantisasi biner, budget kompresi konteks)
+terhadap set pertanyaan
+berlabel, lalu laporkan recall@k, MRR, porsi fallback ke Google Search,
+latensi dan memori vektor untuk tiap konfigurasi.
+
+Knowledge base dibangun ulang di Qdrant in-memory dari PDF di data/ dengan
+jalur yang sama seperti ingestion (chunker, encode, payload, BM25), dan
+pencarian memakai fungsi runtime yang sama (_search_lean/_search_hybrid,
+filter_relevant). Tidak menyentuh Qdrant produksi.
+
+    python scripts/eval_retrieval.py \\
+        --chunk 512:64 --chunk 384:48 --embedder full --embedder int8 \\
+        --mode dense --mode hybrid --top-k 3 --top-k 5 \\
+        --threshold 0.6 --threshold 0.7 --threshold 0.8 --json logs/eval_retrieval.json
+
+    # Router topik: presisi rute & ruang pencarian vs tanpa router
+    python scripts/eval_retrieval.py --routing off --routing on
+
+    # Dimensi (PCA dari korpus, 0 = penuh) x kuantisasi biner + rescoring
+    python scripts/eval_retrieval.py --dim 0 --dim 256 --dim 128 --quant off --quant binary
+
+    # Kompresi konteks per kalimat (0 = konteks penuh)
+    python scripts/eval_retrieval.py --budget 0 --budget 700 --budget 400
+
+Format label (JSONL): {"question", "expect": [frasa...], "source"?}. Chunk
+dianggap relevan bila memuat salah satu frasa (tanpa beda huruf/spasi) dan,
+jika diisi, berasal dari `source`. expect kosong = pertanyaan di luar
+cakupan dokumen: jawaban benarnya justru fallback ke Google Search.
+Latensi = encode query + pencarian in-memory; gunakan sebagai pembanding
+relatif antar-konfigurasi, bukan angka produksi.
+
+Kolom router: routed = porsi query yang dipersempit ke satu kategori,
+rt_acc = porsi rute yang sama dengan kategori dokumen label, widen = porsi
+rute yang diulang tanpa filter, space = rata-rata porsi chunk yang dicari.
+
+Kolom vektor: ram_kb = memori vektor yang harus tinggal di RAM (float32
+dim x 4 byte per chunk; biner dim / 8 byte, vektor asli di disk untuk
+rescoring). Qdrant lokal tidak menjalankan kuantisasi, jadi tahap biner
+(kandidat top_k x RAG_QUANTIZATION_OVERSAMPLING dari jarak Hamming, lalu
+rescoring cosine penuh) disimulasikan dengan numpy; recall-nya setara,
+latensinya bukan pembanding untuk server.
+
+Dengan --budget > 0, konteks dipadatkan seperti build_rag_context
+(compress_context); ctx_rec lalu mensyaratkan frasa label masih ada di teks
+yang dipadatkan, ctx_chr adalah panjang setelah kompresi, dan cmp_ms adalah
+rata-rata waktu kompresi (encode kalimat + skor; cache kalimat dikosongkan
+per konfigurasi).
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import argparse
+import itertools
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import numpy as np
+from qdrant_client import QdrantClient
+from qdrant_client.models import VectorParams, Distance, PointStruct, PayloadSchemaType, ScoredPoint
+
+from app.config import settings
+from app.rag_initializer import load_embedder
+from app.core.lexical import BM25Index
+from app.core.main import (
+    embed_query, _search_lean, _search_hybrid, _fuse_hybrid, _postprocess_hits, filter_relevant, topic_filter,
+    compress_context, _sentence_cache,
+)
+from app.core.projection import EmbeddingProjection
+from app.core.topics import TopicRouter, categorize_document
+from ingestion import extract_pages_from_pdf_llamaindex, smart_chunk_semantic, get_chunk_id
+from trace_report import percentile
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def normalize(text: str) -> str:
+    return re.sub(r'\s+', ' ', text or '').strip().lower()
+
+
+def load_labels(path: str) -> list:
+    labels = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                label = json.loads(line)
+                label['expect'] = [normalize(p) for p in label.get('expect', [])]
+                labels.append(label)
+    return labels
+
+
+def is_relevant(doc: dict, label: dict) -> bool:
+    if label.get('source') and doc.get('source') != label['source']:
+        return False
+    text = normalize(doc.get('text'))
+    return any(phrase in text for phrase in label['expect'])
+
+
+def load_pages(data_dir: str) -> list:
+    pages = []
+    for pdf_path in sorted(glob.glob(os.path.join(data_dir, '*.pdf'))):
+        source = os.path.basename(pdf_path)
+        pages.extend((source, page, text) for page, text in extract_pages_from_pdf_llamaindex(pdf_path) if text.strip())
+    return pages
+
+
+# ===================================================================
+# KNOWLEDGE BASE PER KONFIGURASI CHUNKER
+# ===================================================================
+class BinaryRescoreIndex:
+    """Simulasi kuantisasi biner Qdrant: kandidat dari jarak Hamming bit tanda, rescoring cosine asli."""
+
+    def __init__(self, ids: list, vectors: np.ndarray, payloads: list):
+        self.ids = ids
+        self.vectors = vectors
+        self.bits = vectors > 0
+        self.payloads = payloads
+        self.categories = np.array([p.get('category') for p in payloads])
+
+    def search(self, query_vec, limit: int, oversampling: float, topic=None) -> list:
+        agreement = (self.bits == (np.asarray(query_vec) > 0)).sum(axis=1).astype(np.float32)
+        if topic is not None:
+            agreement[self.categories != topic] = -1
+        n = min(len(self.ids), max(limit, int(limit * oversampling)))
+        candidates = np.argsort(-agreement, kind='stable')[:n]
+        candidates = candidates[agreement[candidates] >= 0]
+        scores = self.vectors[candidates] @ query_vec
+        order = np.argsort(-scores, kind='stable')[:limit]
+        return [ScoredPoint(id=self.ids[candidates[i]], version=0, score=float(scores[i]),
+                            payload=self.payloads[candidates[i]]) for i in order]
+
+
+def build_collection(client, name: str, pages: list, chunk_size: int, overlap: int, doc_embedder, dim: int = 0):
+    """
+    Chunk, encode (model penuh, seperti ingestion), proyeksikan ke `dim` (0 = penuh) dan
+    simpan. Kembalikan dict: lexical (BM25), router (topik, vektor penuh), projection
+    (None bila penuh), binary (BinaryRescoreIndex) dan dim.
+    """
+    doc_text = {}
+    for source, _, text in pages:
+        doc_text[source] = doc_text.get(source, "") + " " + text
+    categories = {source: categorize_document(source, text) for source, text in doc_text.items()}
+
+    chunks, meta = [], []
+    for source, page, text in pages:
+        for i, chunk in enumerate(smart_chunk_semantic(text, max_chunk_size=chunk_size, overlap=overlap)):
+            chunks.append(chunk)
+            meta.append({'source': source, 'category': categories[source], 'page': page, 'chunk_index': i})
+
+    embeddings = np.asarray(doc_embedder.encode(chunks, convert_to_tensor=False), dtype=np.float32)
+    projection = EmbeddingProjection.fit(embeddings, dim) if dim and dim < embeddings.shape[1] else None
+    stored = projection.transform(embeddings) if projection else embeddings
+    client.create_collection(
+        collection_name=name,
+        vectors_config=VectorParams(size=stored.shape[1], distance=Distance.COSINE),
+    )
+    client.create_payload_index(collection_name=name, field_name='category', field_schema=PayloadSchemaType.KEYWORD)
+    for start in range(0, len(chunks), 256):
+        client.upsert(collection_name=name, points=[
+            PointStruct(id=get_chunk_id(chunk), vector=emb.tolist(), payload={'text': chunk, **m})
+            for chunk, emb, m in zip(chunks[start:start + 256], stored[start:start + 256], meta[start:start + 256])
+        ])
+    variance = f", varians PCA {projection.explained:.1%}" if projection else ""
+    print(f"  [{name}] {len(chunks)} chunk, {stored.shape[1]} dimensi{variance}, kategori: {categories}")
+    normalized = stored / np.linalg.norm(stored, axis=1, keepdims=True).clip(1e-12)
+    return {
+        'lexical': BM25Index.build([get_chunk_id(chunk) for chunk in chunks], chunks),
+        'router': TopicRouter.build([m['category'] for m in meta], embeddings),
+        'projection': projection,
+        'binary': BinaryRescoreIndex([get_chunk_id(chunk) for chunk in chunks], normalized,
+                                     [{'text': chunk, **m} for chunk, m in zip(chunks, meta)]),
+        'dim': stored.shape[1],
+        'chunks': len(chunks),
+    }
+
+
+def run_queries(client, name: str, kb: dict, embedder, labels: list, mode: str, top_k: int,
+                routing: bool = False, widen_threshold: float = None, quant: str = 'off') -> list:
+    """
+    Hasil mentah (tanpa threshold) + latensi per pertanyaan; threshold diterapkan belakangan.
+    Dengan router, keputusan melepas filter bergantung threshold, jadi dijalankan per threshold.
+    """
+    lexical_index, router, projection = kb['lexical'], kb['router'] if routing else None, kb['projection']
+
+    def search(query, search_vec, topic):
+        if quant == 'binary':
+            limit = max(top_k, settings.RAG.RAG_HYBRID_CANDIDATES) if mode == 'hybrid' else top_k
+            hits = kb['binary'].search(search_vec, limit, settings.RAG.RAG_QUANTIZATION_OVERSAMPLING, topic)
+            if mode == 'hybrid':
+                return _fuse_hybrid(client, name, query, hits, top_k, lexical_index)
+            return _postprocess_hits(hits, top_k)
+        if mode == 'hybrid':
+            return _search_hybrid(client, name, query, search_vec, top_k, lexical_index, topic_filter(topic))
+        return _search_lean(client, name, search_vec, top_k, None, topic_filter(topic))
+
+    runs = []
+    for label in labels:
+        start = time.perf_counter()
+        query_vec = embed_query(label['question'], embedder)
+        topic = router.route(label['question'], query_vec, settings.RAG.RAG_TOPIC_MARGIN,
+                             settings.RAG.RAG_TOPIC_KEYWORD_WEIGHT) if router else None
+        # Sama seperti project_vectors: router memakai vektor penuh, Qdrant vektor terproyeksi
+        search_vec = projection.transform(query_vec) if projection else query_vec
+        results = search(label['question'], search_vec, topic)
+        # Sama seperti search_qdrant: partisi tanpa hasil relevan diulang tanpa filter
+        widened = topic is not None and not filter_relevant(results, widen_threshold)
+        if widened:
+            results = search(label['question'], search_vec, None)
+        space = 1.0 if topic is None else router.share(topic) + (1.0 if widened else 0.0)
+        runs.append({'results': results, 'latency_ms': (time.perf_counter() - start) * 1000, 'query_vec': query_vec,
+                     'topic': topic, 'widened': widened, 'space': space})
+    return runs
+
+
+def context_texts(runs: list, threshold: float, embedder, budget: int) -> tuple:
+    """Teks konteks per run seperti build_rag_context (budget 0 = penuh) + rata-rata ms kompresi."""
+    _sentence_cache.clear()
+    texts, timings = [], []
+    for run in runs:
+        context = filter_relevant(run['results'], threshold)
+        full = "\n".join(doc['text'] for doc in context)
+        if budget and len(full) > budget:
+            start = time.perf_counter()
+            full = compress_context(context, run['query_vec'], embedder, budget)
+            timings.append((time.perf_counter() - start) * 1000)
+        texts.append(full)
+    return texts, (statistics.mean(timings) if timings else 0.0)
+
+
+def score(labels: list, runs: list, threshold: float, texts: list) -> dict:
+    answerable = [(label, run, text) for label, run, text in zip(labels, runs, texts) if label['expect']]
+    out_of_scope = [(label, run) for label, run in zip(labels, runs) if not label['expect']]
+
+    hits, reciprocal, context_hits = 0, 0.0, 0
+    for label, run, text in answerable:
+        ranks = [i for i, doc in enumerate(run['results'], 1) if is_relevant(doc, label)]
+        if ranks:
+            hits += 1
+            reciprocal += 1 / ranks[0]
+        context = filter_relevant(run['results'], threshold)
+        # Frasa label harus bertahan setelah kompresi (tanpa kompresi: sama dengan is_relevant)
+        context_hits += (any(is_relevant(doc, label) for doc in context)
+                         and any(phrase in normalize(text) for phrase in label['expect']))
+    fallbacks = 0
+    for run in runs:
+        fallbacks += not filter_relevant(run['results'], threshold)
+    context_chars = [len(text) for text in texts]
+    oos_accepted = sum(1 for _, run in out_of_scope if filter_relevant(run['results'], threshold))
+
+    routed = [(label, run) for label, run in zip(labels, runs) if run['topic'] is not None]
+    judged = [(label, run) for label, run in routed if label.get('source')]
+    route_ok = sum(1 for label, run in judged if categorize_document(label['source']) == run['topic'])
+
+    latencies = [run['latency_ms'] for run in runs]
+    n = len(answerable) or 1
+    return {
+        'routed': round(len(routed) / len(runs), 3),
+        'route_accuracy': round(route_ok / len(judged), 3) if judged else None,
+        'widened': round(sum(run['widened'] for run in runs) / len(runs), 3),
+        'search_space': round(statistics.mean(run['space'] for run in runs), 3),
+        'recall_at_k': round(hits / n, 3),
+        'mrr': round(reciprocal / n, 3),
+        'context_recall': round(context_hits / n, 3),
+        'fallback_rate': round(fallbacks / len(runs), 3),
+        'oos_accepted': round(oos_accepted / len(out_of_scope), 3) if out_of_scope else None,
+        'context_chars': round(statistics.mean(context_chars), 1),
+        'latency_mean_ms': round(statistics.mean(latencies), 2),
+        'latency_p95_ms': round(percentile(latencies, 95), 2),
+    }
+
+
+def recommend(rows: list, tolerance: float):
+    """Konfigurasi termurah (konteks terpendek, lalu latensi) yang context_recall-nya dekat yang terbaik."""
+    best = max(r['context_recall'] for r in rows)
+    eligible = [r for r in rows if r['context_recall'] >= best - tolerance]
+    return min(eligible, key=lambda r: (r['context_chars'], r['latency_p95_ms']))
+
+
+def print_rows(rows: list):
+    print(f"\n{'chunk':>8} {'embedder':>8} {'mode':>7} {'route':>5} {'dim':>4} {'quant':>6} {'k':>3} {'thr':>5} "
+          f"{'budget':>6} | "
+          f"{'recall':>6} {'mrr':>5} "
+          f"{'ctx_rec':>7} {'fallbk':>6} {'oos_ok':>6} {'ctx_chr':>7} {'ms':>7} {'p95':>7} | "
+          f"{'routed':>6} {'rt_acc':>6} {'widen':>5} {'space':>5} | {'ram_kb':>7} {'cmp_ms':>6}")
+    for r in rows:
+        oos = '-' if r['oos_accepted'] is None else f"{r['oos_accepted']:.2f}"
+        route_acc = '-' if r['route_accuracy'] is None else f"{r['route_accuracy']:.2f}"
+        print(f"{r['chunk']:>8} {r['embedder']:>8} {r['mode']:>7} {r['routing']:>5} {r['dim']:>4} {r['quant']:>6} "
+              f"{r['top_k']:>3} "
+              f"{r['threshold']:>5.2f} {r['budget']:>6} | "
+              f"{r['recall_at_k']:>6.2f} {r['mrr']:>5.2f} {r['context_recall']:>7.2f} {r['fallback_rate']:>6.2f} "
+              f"{oos:>6} {r['context_chars']:>7.0f} {r['latency_mean_ms']:>7.1f} {r['latency_p95_ms']:>7.1f} | "
+              f"{r['routed']:>6.2f} {route_acc:>6} {r['widened']:>5.2f} {r['search_space']:>5.2f} | "
+              f"{r['vector_ram_kb']:>7.0f} {r['compress_ms']:>6.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--labels', default=os.path.join(ROOT_DIR, 'data', 'eval', 'retrieval_labels.jsonl'))
+    parser.add_argument('--data-dir', default=os.path.join(ROOT_DIR, 'data'))
+    parser.add_argument('--chunk', action='append', default=[], metavar='UKURAN:OVERLAP')
+    parser.add_argument('--embedder', action='append', default=[], choices=['full', 'int8'])
+    parser.add_argument('--mode', action='append', default=[], choices=['dense', 'hybrid'])
+    parser.add_argument('--routing', action='append', default=[], choices=['off', 'on'])
+    parser.add_argument('--dim', action='append', type=int, default=[], help='Dimensi vektor (PCA); 0 = penuh')
+    parser.add_argument('--quant', action='append', default=[], choices=['off', 'binary'])
+    parser.add_argument('--budget', action='append', type=int, default=[],
+                        help='Budget karakter kompresi konteks; 0 = konteks penuh')
+    parser.add_argument('--top-k', action='append', type=int, default=[])
+    parser.add_argument('--threshold', action='append', type=float, default=[])
+    parser.add_argument('--tolerance', type=float, default=0.05, help='Penurunan context_recall yang masih diterima')
+    parser.add_argument('--json', default='', help='Simpan semua baris hasil ke file JSON')
+    args = parser.parse_args()
+
+    chunk_configs = [tuple(int(x) for x in spec.split(':')) for spec in (args.chunk or [
+        f"{settings.RAG.CHUNK_MAX_SIZE}:{settings.RAG.CHUNK_OVERLAP}"])]
+    embedders = args.embedder or ['full']
+    modes = args.mode or ['dense']
+    routings = args.routing or ['off']
+    dims = args.dim or [settings.RAG.RAG_EMBEDDING_DIM]
+    quants = args.quant or ['binary' if settings.RAG.RAG_BINARY_QUANTIZATION else 'off']
+    budgets = args.budget or [settings.RAG.RAG_CONTEXT_BUDGET_CHARS if settings.RAG.RAG_CONTEXT_COMPRESSION else 0]
+    top_ks = args.top_k or [settings.RAG.TOP_K_RETRIEVAL]
+    thresholds = args.threshold or [settings.RAG.RAG_RELEVANCE_THRESHOLD]
+
+    # Teks ada di payload (bukan docstore) untuk collection evaluasi
+    settings.RAG.RAG_SLIM_PAYLOAD = False
+
+    labels = load_labels(args.labels)
+    pages = load_pages(args.data_dir)
+    print(f"[EVAL] {len(labels)} pertanyaan berlabel, {len(pages)} halaman PDF")
+
+    models = {variant: load_embedder(settings.RAG.EMBEDDING_MODEL_NAME, quantized=(variant == 'int8'))
+              for variant in set(embedders) | {'full'}}
+    client = QdrantClient(location=':memory:')
+
+    rows = []
+    for (chunk_size, overlap), dim in itertools.product(chunk_configs, dims):
+        name = f"eval_{chunk_size}_{overlap}_d{dim}"
+        try:
+            kb = build_collection(client, name, pages, chunk_size, overlap, models['full'], dim)
+        except ValueError as e:
+            print(f"  [{name}] dilewati: {e}")
+            continue
+        for variant, mode, routing, quant, top_k in itertools.product(embedders, modes, routings, quants, top_ks):
+            runs = run_queries(client, name, kb, models[variant], labels, mode, top_k, quant=quant)
+            bytes_per_vector = kb['dim'] / 8 if quant == 'binary' else kb['dim'] * 4
+            for threshold in thresholds:
+                if routing == 'on':
+                    runs = run_queries(client, name, kb, models[variant], labels, mode, top_k,
+                                       True, threshold, quant)
+                for budget in budgets:
+                    texts, compress_ms = context_texts(runs, threshold, models[variant], budget)
+                    rows.append({
+                        'chunk': f"{chunk_size}:{overlap}",
+                        'embedder': variant,
+                        'mode': mode,
+                        'routing': routing,
+                        'dim': kb['dim'],
+                        'quant': quant,
+                        'top_k': top_k,
+                        'threshold': threshold,
+                        'budget': budget,
+                        'vector_ram_kb': round(kb['chunks'] * bytes_per_vector / 1024, 1),
+                        'compress_ms': round(compress_ms, 2),
+                        **score(labels, runs, threshold, texts),
+                    })
+
+    print_rows(rows)
+    choice = recommend(rows, args.tolerance)
+    print(f"\nTermurah dengan context_recall >= terbaik - {args.tolerance:.2f}: "
+          f"chunk {choice['chunk']}, embedder {choice['embedder']}, {choice['mode']}, router {choice['routing']}, "
+          f"dim {choice['dim']}, kuantisasi {choice['quant']}, "
+          f"top_k {choice['top_k']}, threshold {choice['threshold']:.2f}, budget {choice['budget']}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'labels': len(labels), 'rows': rows, 'recommended': choice}, f, indent=2)
+        print(f"Hasil disimpan ke {args.json}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,8 +4,12 @@ import re
 import hashlib
 import os
 import sys
+import time
+import argparse
 from pathlib import Path
 
+import numpy as np
+
 # === 1. SET PATH ROOT ===
 current_file_path = os.path.abspath(__file__)
 scripts_dir = os.path.dirname(current_file_path)
@@ -19,12 +23,17 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from app.config import settings
+from app.core.topics import categorize_document
 
 # === 3. EXTERNAL DEPENDENCIES ===
 from llama_index.readers.file import PDFReader
 from sentence_transformers import SentenceTransformer
 from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance, PointStruct
+import redis
+from qdrant_client.models import (
+    VectorParams, Distance, PointStruct, PayloadSchemaType, BinaryQuantization, BinaryQuantizationConfig,
+    CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation,
+)
 
 # NLP untuk smart chunking
 import nltk
@@ -44,6 +53,17 @@ def extract_text_from_pdf_llamaindex(pdf_path):
     print(f"  Ekstraksi selesai, total {page_count} dokumen.")
     return full_text
 
+def extract_pages_from_pdf_llamaindex(pdf_path):
+    """Seperti extract_text_from_pdf_llamaindex, tetapi per halaman: List[(nomor_halaman, teks)]."""
+    print(f"\n[1] Ekstraksi PDF per halaman: {pdf_path}")
+    if not os.path.exists(pdf_path):
+        print(f"  File tidak ditemukan: {pdf_path}")
+        return []
+    loader = PDFReader()
+    documents = loader.load_data(file=Path(pdf_path))
+    print(f"  Ekstraksi selesai, total {len(documents)} halaman.")
+    return [(i + 1, doc.text) for i, doc in enumerate(documents)]
+
 def extract_text_from_web_async(urls):
     from llama_index.readers.web import TrafilaturaWebReader
     cleaned_urls = [url.strip() for url in urls if url.strip().startswith("http")]
@@ -111,14 +131,69 @@ def get_embedder(model_name=settings.RAG.EMBEDDING_MODEL_NAME):
     print(f"\n[4] Loading embedding model: {model_name}")
     return SentenceTransformer(model_name)
 
-def store_to_qdrant(chunks, embeddings, collection_name, batch_size=50):
-    print(f"\n[5] Menyimpan embedding ke Qdrant (mode: append)...")
-    client = QdrantClient(
+def drop_invalid_embeddings(chunks, embeddings, metadata):
+    """
+    Buang chunk dengan embedding NaN/inf sebelum disimpan, sehingga jalur
+    pencarian tidak perlu lagi memeriksa vektor di setiap query.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    valid = np.isfinite(embeddings).all(axis=1)
+    dropped = int((~valid).sum())
+    if dropped:
+        print(f"  Melewati {dropped} chunk dengan embedding NaN/inf.")
+    keep = lambda items: [item for item, ok in zip(items, valid) if ok]
+    return keep(chunks), embeddings[valid], keep(metadata)
+
+def get_qdrant_client():
+    return QdrantClient(
         url=settings.RAG.QDRANT_URL,
         api_key=settings.RAG.QDRANT_API_KEY,
         timeout=30
     )
 
+# Field payload yang dipakai sebagai filter (router topik, penelusuran per dokumen)
+PAYLOAD_INDEX_FIELDS = ("category", "source")
+
+def create_payload_indexes(client, collection_name):
+    for field in PAYLOAD_INDEX_FIELDS:
+        client.create_payload_index(collection_name=collection_name, field_name=field,
+                                    field_schema=PayloadSchemaType.KEYWORD)
+
+def reduce_embeddings(embeddings, collection_name, dim=settings.RAG.RAG_EMBEDDING_DIM):
+    """
+    Proyeksi PCA ke `dim` dimensi (RAG_EMBEDDING_DIM), dipelajari dari embedding
+    korpus ini dan disimpan sebagai artefak versi collection agar query diproyeksikan
+    sama persis. Kembalikan (vektor untuk Qdrant, proyeksi | None); None bila
+    dim 0 / >= dimensi model / korpus terlalu kecil (vektor penuh).
+    """
+    from app.core.projection import EmbeddingProjection
+    from app.rag_initializer import get_index_artifact_path
+
+    if not dim or dim >= embeddings.shape[1]:
+        return embeddings, None
+    try:
+        projection = EmbeddingProjection.fit(embeddings, dim)
+    except ValueError as e:
+        print(f"  [WARNING] Proyeksi dilewati, memakai vektor penuh: {e}")
+        return embeddings, None
+    path = get_index_artifact_path(collection_name, "projection.npz")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    projection.save(path)
+    print(f"  Proyeksi '{path}': {projection.source_dim} -> {projection.dim} dimensi, "
+          f"varians dipertahankan {projection.explained:.1%}")
+    return projection.transform(embeddings), projection
+
+def store_to_qdrant(chunks, embeddings, collection_name, batch_size=50, metadata=None, slim=False, quantized=False):
+    """
+    Simpan embedding + payload. metadata: list dict sejajar dengan chunks
+    (source, category, page, chunk_index). Dengan slim=True teks tidak dimasukkan ke
+    payload; teks harus ditulis ke docstore lokal (lihat write_docstore).
+    quantized=True: salinan biner 1 bit/dimensi di RAM, vektor asli di disk untuk rescoring.
+    """
+    print(f"\n[5] Menyimpan embedding ke Qdrant (mode: append, payload: {'ramping' if slim else 'lengkap'})...")
+    metadata = metadata or [{} for _ in chunks]
+    client = get_qdrant_client()
+
     embedding_size = len(embeddings[0]) if len(embeddings) > 0 else 768
     collections = client.get_collections().collections
     collection_names = [col.name for col in collections]
@@ -126,8 +201,12 @@ def store_to_qdrant(chunks, embeddings, collection_name, batch_size=50):
     if collection_name not in collection_names:
         client.create_collection(
             collection_name=collection_name,
-            vectors_config=VectorParams(size=embedding_size, distance=Distance.COSINE)
+            vectors_config=VectorParams(size=embedding_size, distance=Distance.COSINE, on_disk=quantized or None),
+            quantization_config=BinaryQuantization(
+                binary=BinaryQuantizationConfig(always_ram=True)
+            ) if quantized else None
         )
+        create_payload_indexes(client, collection_name)
         print(f"  Collection '{collection_name}' dibuat.")
     else:
         print(f"  Collection '{collection_name}' sudah ada. Menambahkan data...")
@@ -140,13 +219,14 @@ def store_to_qdrant(chunks, embeddings, collection_name, batch_size=50):
     for i in range(0, total, batch_size):
         batch_chunks = chunks[i:i + batch_size]
         batch_embeddings = embeddings[i:i + batch_size]
+        batch_meta = metadata[i:i + batch_size]
         points = [
             PointStruct(
                 id=get_chunk_id(chunk),
                 vector=emb.tolist(),
-                payload={"text": chunk},
+                payload=dict(meta) if slim else {"text": chunk, **meta},
             )
-            for chunk, emb in zip(batch_chunks, batch_embeddings)
+            for chunk, emb, meta in zip(batch_chunks, batch_embeddings, batch_meta)
         ]
         client.upsert(collection_name=collection_name, points=points)
         print(f"  Batch {i//batch_size + 1}: simpan {len(points)} chunks")
@@ -154,8 +234,239 @@ def store_to_qdrant(chunks, embeddings, collection_name, batch_size=50):
     print(f"\n=== INGESTION BERHASIL: {total} chunks ===")
     return client
 
+def write_docstore(chunks, metadata, collection_name, path=settings.RAG.DOCSTORE_PATH):
+    """Tulis teks chunk ke docstore lokal untuk mode payload ramping (dicatat milik collection_name)."""
+    from app.core.docstore import write_chunks
+
+    records = [
+        {"id": get_chunk_id(chunk), "text": chunk, **meta}
+        for chunk, meta in zip(chunks, metadata)
+    ]
+    written = write_chunks(path, records, collection_name)
+    print(f"  Docstore '{path}': {written} chunk ditulis.")
+
+def build_lexical_index(chunks, collection_name):
+    """Bangun indeks BM25 untuk versi collection ini (dipakai retrieval hibrida)."""
+    from app.core.lexical import BM25Index
+    from app.rag_initializer import get_index_artifact_path
+
+    path = get_index_artifact_path(collection_name, "bm25.npz")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    index = BM25Index.build([get_chunk_id(chunk) for chunk in chunks], chunks)
+    index.save(path)
+    print(f"  Indeks BM25 '{path}': {len(index.doc_ids)} dokumen, {len(index.terms)} term.")
+
+def build_topic_router(metadata, embeddings, collection_name):
+    """Centroid embedding per kategori untuk router topik (RAG_TOPIC_ROUTING)."""
+    from collections import Counter
+    from app.core.topics import TopicRouter
+    from app.rag_initializer import get_index_artifact_path
+
+    categories = [meta["category"] for meta in metadata]
+    path = get_index_artifact_path(collection_name, "topics.npz")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    TopicRouter.build(categories, embeddings).save(path)
+    print(f"  Router topik '{path}': {dict(Counter(categories))}")
+
+def remove_index_artifacts(collection_name):
+    from app.rag_initializer import get_index_artifact_path
+
+    prefix = get_index_artifact_path(collection_name, "")
+    directory = os.path.dirname(prefix)
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if os.path.join(directory, name).startswith(prefix):
+            os.remove(os.path.join(directory, name))
+
+# ================= VERSIONING (BLUE/GREEN) =================
+
+# Pertanyaan uji yang wajib mendapat hasil sebelum alias dipindahkan
+SMOKE_QUERIES = [
+    "Apa visi UIN Salatiga?",
+    "Bagaimana prosedur penerimaan mahasiswa baru jalur mandiri?",
+    "Siapa rektor UIN Salatiga?",
+    "Apa akreditasi UIN Salatiga?",
+]
+SMOKE_MIN_SCORE = 0.3
+
+
+def new_collection_version(alias: str) -> str:
+    return f"{alias}_v{time.strftime('%Y%m%d%H%M%S')}"
+
+def list_collection_versions(client, alias: str) -> list:
+    """Semua collection versi milik alias, terurut dari yang terlama."""
+    prefix = f"{alias}_v"
+    names = [col.name for col in client.get_collections().collections]
+    return sorted(name for name in names if name.startswith(prefix))
+
+def get_alias_target(client, alias: str):
+    for a in client.get_aliases().aliases:
+        if a.alias_name == alias:
+            return a.collection_name
+    return None
+
+def validate_collection(client, collection_name, embedder, expected_points, queries=SMOKE_QUERIES, min_score=SMOKE_MIN_SCORE) -> bool:
+    """Smoke test: jumlah point sesuai dan setiap query uji mendapat hasil yang layak."""
+    from app.core.main import embed_queries, project_vectors
+    from app.rag_initializer import check_query_dimension
+
+    print(f"\n[6] Validasi collection '{collection_name}'...")
+    try:
+        check_query_dimension(client, collection_name, embedder)
+    except RuntimeError as e:
+        print(f"  GAGAL: {e}")
+        return False
+    count = client.count(collection_name=collection_name, exact=True).count
+    if count < expected_points:
+        print(f"  GAGAL: hanya {count} dari {expected_points} point tersimpan.")
+        return False
+
+    # Normalisasi dan proyeksi yang sama dengan jalur query
+    vectors = project_vectors(embed_queries(queries, embedder), collection_name)
+    ok = True
+    for query, vec in zip(queries, vectors):
+        hits = client.search(collection_name=collection_name, query_vector=vec.tolist(), limit=1)
+        top = hits[0].score if hits else 0.0
+        status = "OK" if top >= min_score else "GAGAL"
+        print(f"  [{status}] {query!r} -> skor teratas {top:.3f}")
+        ok = ok and top >= min_score
+    return ok
+
+# Versi untuk salinan collection fisik lama; 14 digit nol agar selalu terurut paling lama
+LEGACY_VERSION = "00000000000000"
+
+def copy_legacy_collection(client, alias: str, batch_size: int = 256) -> str:
+    """
+    Salin collection fisik lama bernama `alias` (sebelum blue/green) ke versi
+    '<alias>_v00000000000000', lengkap dengan vektor dan payload, agar tetap
+    bisa di-rollback setelah nama itu dipakai sebagai alias.
+    """
+    target = f"{alias}_v{LEGACY_VERSION}"
+    if target in [col.name for col in client.get_collections().collections]:
+        client.delete_collection(collection_name=target)  # sisa migrasi yang gagal
+    client.create_collection(
+        collection_name=target,
+        vectors_config=client.get_collection(collection_name=alias).config.params.vectors,
+    )
+    offset = None
+    while True:
+        points, offset = client.scroll(collection_name=alias, limit=batch_size, offset=offset,
+                                       with_payload=True, with_vectors=True)
+        if points:
+            client.upsert(collection_name=target, points=[
+                PointStruct(id=point.id, vector=point.vector, payload=point.payload) for point in points
+            ])
+        if offset is None:
+            break
+    create_payload_indexes(client, target)
+
+    expected = client.count(collection_name=alias, exact=True).count
+    copied = client.count(collection_name=target, exact=True).count
+    if copied != expected:
+        raise RuntimeError(f"Salinan '{target}' hanya berisi {copied} dari {expected} point.")
+    return target
+
+def switch_alias(client, alias: str, collection_name: str, migrate_legacy: bool = False):
+    """
+    Pindahkan alias ke collection baru dalam satu operasi atomik.
+
+    Deployment lama menyimpan data di collection fisik bernama `alias`; nama itu
+    baru bisa menjadi alias setelah collection-nya dihapus. Itu hanya dilakukan
+    dengan migrate_legacy=True (--migrate-legacy), setelah isinya disalin ke
+    versi yang bisa di-rollback. Di antara penghapusan dan pembuatan alias ada
+    jeda singkat tanpa collection: jalankan migrasi di luar jam sibuk.
+    """
+    names = [col.name for col in client.get_collections().collections]
+    if alias in names:
+        if not migrate_legacy:
+            raise RuntimeError(
+                f"'{alias}' masih berupa collection fisik (deployment lama). Jalankan ulang dengan "
+                f"--migrate-legacy untuk menyalinnya ke versi rollback lalu menggantinya dengan alias."
+            )
+        backup = copy_legacy_collection(client, alias)
+        print(f"  Collection lama '{alias}' disalin ke '{backup}' (rollback: --rollback {backup}).")
+        client.delete_collection(collection_name=alias)
+
+    operations = []
+    if get_alias_target(client, alias) is not None:
+        operations.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+    operations.append(CreateAliasOperation(
+        create_alias=CreateAlias(collection_name=collection_name, alias_name=alias)
+    ))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    print(f"  Alias '{alias}' -> '{collection_name}'")
+    notify_reindex()
+
+def notify_reindex():
+    """Minta worker aplikasi mengosongkan cache L1 dan membaca ulang alias sekarang juga."""
+    try:
+        receivers = redis.from_url(settings.REDIS_URL, socket_connect_timeout=2).publish(
+            settings.CACHE_INVALIDATION_CHANNEL, 'reindex'
+        )
+        print(f"  Invalidasi cache dikirim ke {receivers} worker.")
+    except redis.RedisError as e:
+        # Tidak fatal: worker tetap membaca alias baru dalam COLLECTION_ALIAS_REFRESH_SECONDS
+        print(f"  [WARNING] Invalidasi cache tidak terkirim: {e}")
+
+def prune_collection_versions(client, alias: str, keep: int, docstore_path=settings.RAG.DOCSTORE_PATH):
+    """
+    Hapus versi lama, sisakan `keep` versi terbaru (versi aktif tidak pernah dihapus),
+    beserta artefak indeks dan teks docstore yang tidak dipakai versi tersisa.
+    """
+    from app.core.docstore import delete_versions
+
+    active = get_alias_target(client, alias)
+    versions = list_collection_versions(client, alias)
+    stale = [v for v in versions[:-keep] if v != active] if keep > 0 else []
+    for name in stale:
+        client.delete_collection(collection_name=name)
+        remove_index_artifacts(name)
+        print(f"  Versi lama '{name}' dihapus.")
+    deleted = delete_versions(docstore_path, stale, [v for v in versions if v not in stale])
+    if deleted:
+        print(f"  Docstore: {deleted} chunk yang tidak lagi dipakai dihapus.")
+
 # ================= MAIN =================
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ingestion knowledge base UIN Salatiga (blue/green).")
+    parser.add_argument("--alias", default=settings.RAG.COLLECTION_NAME,
+                        help="Alias yang dibaca aplikasi (default: COLLECTION_NAME).")
+    parser.add_argument("--keep", type=int, default=settings.RAG.COLLECTION_KEEP_VERSIONS,
+                        help="Jumlah versi yang disimpan untuk rollback.")
+    parser.add_argument("--list-versions", action="store_true",
+                        help="Tampilkan versi yang tersedia lalu keluar.")
+    parser.add_argument("--rollback", metavar="VERSION",
+                        help="Pindahkan alias ke versi lama tanpa ingestion ulang.")
+    parser.add_argument("--migrate-legacy", action="store_true",
+                        help="Sekali saja: salin collection fisik lama bernama alias ke versi rollback, "
+                             "lalu ganti dengan alias.")
+    parser.add_argument("--skip-smoke", action="store_true",
+                        help="Lewati smoke test sebelum alias dipindahkan (tidak disarankan).")
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
+    ALIAS = args.alias
+
+    if args.list_versions or args.rollback:
+        client = get_qdrant_client()
+        if args.rollback:
+            if args.rollback not in list_collection_versions(client, ALIAS):
+                print(f"Versi '{args.rollback}' tidak ditemukan.")
+                exit(1)
+            try:
+                switch_alias(client, ALIAS, args.rollback, migrate_legacy=args.migrate_legacy)
+            except RuntimeError as e:
+                print(e)
+                exit(1)
+            print("\n=== ROLLBACK SELESAI ===")
+        else:
+            active = get_alias_target(client, ALIAS)
+            for name in list_collection_versions(client, ALIAS):
+                print(f"  {'*' if name == active else ' '} {name}")
+        exit(0)
+
     PDF_FILES = [
         "data/uin_salatiga_struktur_organisasi1.pdf",
     ]
@@ -169,21 +480,28 @@ if __name__ == "__main__":
     ""
     ]
 
-    COLLECTION_NAME = "uin_knowledge_base"
+    COLLECTION_NAME = new_collection_version(ALIAS)
+    CHUNK_SIZE = settings.RAG.CHUNK_MAX_SIZE
+    CHUNK_OVERLAP = settings.RAG.CHUNK_OVERLAP
 
-    print(f"\n================ STARTING RAG INGESTION ({COLLECTION_NAME}) ================")
+    print(f"\n================ STARTING RAG INGESTION ({ALIAS} -> {COLLECTION_NAME}) ================")
 
     all_chunks = []
+    all_meta = []  # sejajar dengan all_chunks: source, category, page, chunk_index
 
-    # === Proses PDF ===
+    # === Proses PDF (per halaman, agar metadata halaman tersedia) ===
     for f in PDF_FILES:
         try:
-            text = extract_text_from_pdf_llamaindex(f)
-            if not text.strip():
-                continue
-            else:
-                chunks = smart_chunk_semantic(text, max_chunk_size=512, overlap=64)
-            all_chunks.extend(chunks)
+            source = os.path.basename(f)
+            pages = [(page, text) for page, text in extract_pages_from_pdf_llamaindex(f) if text.strip()]
+            category = categorize_document(source, " ".join(text for _, text in pages))
+            print(f"  {source}: kategori '{category}'")
+            chunk_index = 0
+            for page, text in pages:
+                for chunk in smart_chunk_semantic(text, max_chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+                    all_chunks.append(chunk)
+                    all_meta.append({"source": source, "category": category, "page": page, "chunk_index": chunk_index})
+                    chunk_index += 1
         except Exception as e:
             print(f"  Gagal baca {f}: {e}")
 
@@ -191,8 +509,11 @@ if __name__ == "__main__":
     try:
         web_text = extract_text_from_web_async(WEB_URLS)
         if web_text.strip():
-            web_chunks = smart_chunk_semantic(web_text, max_chunk_size=512, overlap=64)
+            web_chunks = smart_chunk_semantic(web_text, max_chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
             all_chunks.extend(web_chunks)
+            category = categorize_document("web", web_text)
+            all_meta.extend({"source": "web", "category": category, "page": None, "chunk_index": i}
+                            for i in range(len(web_chunks)))
     except Exception as e:
         print(f"  Gagal ekstrak web: {e}")
 
@@ -205,11 +526,39 @@ if __name__ == "__main__":
     try:
         embedder = get_embedder()
         embeddings = embedder.encode(all_chunks, convert_to_tensor=False)
+        all_chunks, embeddings, all_meta = drop_invalid_embeddings(all_chunks, embeddings, all_meta)
+        slim = settings.RAG.RAG_SLIM_PAYLOAD
+        if slim:
+            # Teks harus sudah ada di docstore sebelum alias dipindahkan
+            write_docstore(all_chunks, all_meta, COLLECTION_NAME)
+        vectors, projection = reduce_embeddings(embeddings, COLLECTION_NAME)
+        # Bit tanda vektor penuh yang tidak dipusatkan hampir tidak membedakan chunk
+        # (lihat eval_retrieval.py --quant): kuantisasi biner hanya di atas proyeksi PCA
+        quantized = settings.RAG.RAG_BINARY_QUANTIZATION and projection is not None
+        if settings.RAG.RAG_BINARY_QUANTIZATION and not quantized:
+            print("  [WARNING] Kuantisasi biner dinonaktifkan: vektor tidak diproyeksikan (RAG_EMBEDDING_DIM).")
         client = store_to_qdrant(
             chunks=all_chunks,
-            embeddings=embeddings,
-            collection_name=COLLECTION_NAME
+            embeddings=vectors,
+            collection_name=COLLECTION_NAME,
+            metadata=all_meta,
+            slim=slim,
+            quantized=quantized
         )
+        build_lexical_index(all_chunks, COLLECTION_NAME)
+        build_topic_router(all_meta, embeddings, COLLECTION_NAME)
+
+        # Alias hanya dipindahkan jika versi baru lolos validasi; aplikasi
+        # tetap melayani versi lama selama proses ini berlangsung.
+        expected = len({get_chunk_id(chunk) for chunk in all_chunks})
+        if not args.skip_smoke and not validate_collection(client, COLLECTION_NAME, embedder, expected):
+            print(f"\n=== VALIDASI GAGAL: alias '{ALIAS}' tidak dipindahkan ===")
+            print(f"Collection '{COLLECTION_NAME}' dibiarkan untuk diperiksa.")
+            exit(1)
+
+        print(f"\n[7] Mengaktifkan versi baru...")
+        switch_alias(client, ALIAS, COLLECTION_NAME, migrate_legacy=args.migrate_legacy)
+        prune_collection_versions(client, ALIAS, args.keep)
         print("\n=== INGESTION SELESAI DENGAN AMAN ===")
     except Exception as e:
         print(f"\n=== ERROR SAAT INGESTION ===")
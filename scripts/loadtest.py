@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+# scripts/loadtest.py
+"""
+Load test end-to-end /api/ask: aplikasi Flask asli di bawah gunicorn, dengan
+Gemini dan Custom Search tiruan (scripts/loadtest_stubs.py), Qdrant lokal dan
+Redis lokal. Tidak memakai kuota Gemini/Google.
+
+Prasyarat:
+    - Qdrant lokal berisi knowledge base, mis. docker run -p 6333:6333 qdrant/qdrant
+      lalu QDRANT_URL=http://localhost:6333 python scripts/ingestion.py
+    - Redis lokal (DB terpisah, cache jawaban dibersihkan sebelum tiap run)
+
+Contoh — bandingkan kelas & jumlah worker pada 3 RPS selama 60 detik:
+    python scripts/loadtest.py --rps 3 --duration 60 \\
+        --config sync:2 --config sync:4 --config gthread:2x4 --json logs/loadtest.json
+
+Query diambil dari --queries: log trace JSONL (field 'query', mis.
+logs/traces.jsonl) atau file teks satu query per baris; default daftar bawaan.
+Latensi diukur dari jadwal kirim (open-loop), jadi antrean di sisi server
+tetap terlihat di p99 alih-alih tersembunyi oleh klien yang ikut melambat.
+
+Admission control: setiap permintaan membawa X-Request-Start (seperti nginx)
+sehingga aplikasi melihat waktu antre. Untuk membuktikan p99 permintaan yang
+diterima tetap terbatas saat beban lebih, jalankan di atas kapasitas dan
+bandingkan dengan admission dimatikan:
+    python scripts/loadtest.py --rps 6 --duration 60 --config sync:2 --admission both
+Kolom 'tolak' = 503 cepat dengan Retry-After; p50/p95/p99 hanya dari 200.
+"""
+
+import os
+import sys
+import grp
+import json
+import time
+import getpass
+import argparse
+import tempfile
+import statistics
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+import requests
+
+from loadtest_stubs import FakeGeminiHandler, FakeSearchHandler, start_stub, add_profile_args, profile_from_args
+from trace_report import percentile, parse_server_timing
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+DEFAULT_QUERIES = [
+    "Apa visi UIN Salatiga?",
+    "Apa misi UIN Salatiga?",
+    "Bagaimana prosedur penerimaan mahasiswa baru jalur mandiri?",
+    "Apa akreditasi UIN Salatiga?",
+    "Bagaimana cara menyusun surat pendamping ijazah?",
+    "Siapa rektor UIN Salatiga?",
+    "Bagaimana struktur organisasi UIN Salatiga?",
+    "Apa saja SOP layanan administrasi akademik?",
+    "Kapan pendaftaran jalur mandiri dibuka?",
+    "Berapa biaya UKT program studi di UIN Salatiga?",
+    "Apa tugas Lembaga Penjaminan Mutu?",
+    "Bagaimana cara legalisir ijazah?",
+    "Apa rencana strategis LPM UIN Salatiga?",
+    "Syarat cuti akademik apa saja?",
+    "Dimana alamat kampus UIN Salatiga?",
+    "Bagaimana jadwal wisuda tahun ini?",
+]
+
+
+def load_queries(path: str) -> list:
+    if not path:
+        return list(DEFAULT_QUERIES)
+    queries = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith('.jsonl'):
+                query = json.loads(line).get('query')
+                if query:
+                    queries.append(query)
+            else:
+                queries.append(line)
+    if not queries:
+        raise SystemExit(f"Tidak ada query di {path}")
+    return queries
+
+
+def parse_config(spec: str) -> dict:
+    """'sync:2' atau 'gthread:2x8' -> {'worker_class', 'workers', 'threads'}."""
+    worker_class, _, count = spec.partition(':')
+    workers, _, threads = (count or '2').partition('x')
+    return {
+        'name': spec,
+        'worker_class': worker_class or 'sync',
+        'workers': int(workers),
+        'threads': int(threads or 1),
+    }
+
+
+# ===================================================================
+# LINGKUNGAN: STUB, PEMERIKSAAN, GUNICORN
+# ===================================================================
+def check_backends(args):
+    """Pastikan Qdrant lokal berisi collection dan Redis lokal terjangkau."""
+    collection = os.environ.get('COLLECTION_NAME', 'uin_knowledge_base')
+    headers = {'api-key': args.qdrant_api_key} if args.qdrant_api_key else {}
+    try:
+        aliases = requests.get(f"{args.qdrant_url}/aliases", headers=headers, timeout=5).json()
+        names = {a['alias_name'] for a in aliases.get('result', {}).get('aliases', [])}
+        if collection not in names:
+            requests.get(f"{args.qdrant_url}/collections/{collection}", headers=headers, timeout=5).raise_for_status()
+    except requests.RequestException as e:
+        raise SystemExit(
+            f"Qdrant lokal di {args.qdrant_url} belum siap atau collection '{collection}' tidak ada ({e}).\n"
+            f"Jalankan ingestion dulu: QDRANT_URL={args.qdrant_url} python scripts/ingestion.py"
+        )
+    try:
+        redis.from_url(args.redis_url).ping()
+    except redis.RedisError as e:
+        raise SystemExit(f"Redis lokal di {args.redis_url} tidak terjangkau: {e}")
+
+
+def reset_response_cache(redis_url: str) -> int:
+    client = redis.from_url(redis_url)
+    keys = list(client.scan_iter("rag:resp:*", count=500)) + list(client.scan_iter("rag:search:*", count=500))
+    if keys:
+        client.delete(*keys)
+    return len(keys)
+
+
+def start_gunicorn(config: dict, args, stubs: dict, workdir: str) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        'GUNICORN_BIND': f"127.0.0.1:{args.port}",
+        'GUNICORN_WORKERS': str(config['workers']),
+        'GUNICORN_WORKER_CLASS': config['worker_class'],
+        'GUNICORN_THREADS': str(config['threads']),
+        'GUNICORN_USER': getpass.getuser(),
+        'GUNICORN_GROUP': grp.getgrgid(os.getgid()).gr_name,
+        'GUNICORN_LOG_DIR': workdir,
+        'PROMETHEUS_MULTIPROC_DIR': os.path.join(workdir, 'metrics'),
+        'GEMINI_API_ENDPOINT': stubs['gemini'],
+        'GEMINI_API_KEY': 'loadtest',
+        'GOOGLE_SEARCH_URL': f"{stubs['search']}/customsearch/v1",
+        'GOOGLE_SEARCH_API_KEY': 'loadtest',
+        'SEARCH_ENGINE_ID': 'loadtest',
+        'QDRANT_URL': args.qdrant_url,
+        'QDRANT_API_KEY': args.qdrant_api_key,
+        'REDIS_URL': args.redis_url,
+        'TRACE_SERVER_TIMING': 'true',
+        'TRACE_LOG_PATH': os.path.join(workdir, 'traces.jsonl'),
+        'ADMISSION_ENABLED': 'true' if config.get('admission', True) else 'false',
+        'ADMISSION_CONCURRENCY': str(config['threads']),
+    })
+    env.setdefault('FLASK_SECRET_KEY', 'loadtest-secret-key-0000')
+    env.setdefault('ADMIN_SECRET_KEY', 'loadtest-admin-key-0000')
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py', 'wsgi:application'],
+        cwd=ROOT_DIR,
+        env=env,
+    )
+
+
+def wait_ready(base_url: str, proc: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"gunicorn berhenti dengan kode {proc.returncode}; lihat log di direktori kerja.")
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"Aplikasi tidak siap dalam {timeout:.0f} detik.")
+
+
+def stop_gunicorn(proc: subprocess.Popen):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+# ===================================================================
+# GENERATOR BEBAN (OPEN-LOOP)
+# ===================================================================
+def run_load(base_url: str, queries: list, rps: float, duration: float, max_inflight: int, timeout: float) -> tuple:
+    url = f"{base_url}/api/ask"
+    total = max(1, int(rps * duration))
+    results = [None] * total
+    local = threading.local()
+
+    def send(i, scheduled):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        # Cookie sesi tidak dibawa: setiap permintaan = pengguna baru (tanpa riwayat)
+        session.cookies.clear()
+        query = queries[i % len(queries)]
+        # Seperti nginx: waktu permintaan masuk (jadwal), agar antrean terlihat oleh aplikasi
+        request_start = time.time() - (time.monotonic() - scheduled)
+        shed = False
+        try:
+            resp = session.post(url, json={'query': query}, timeout=timeout,
+                                headers={'X-Request-Start': f"t={request_start:.3f}"})
+            status = resp.status_code
+            shed = status == 503 and 'Retry-After' in resp.headers
+            timing = parse_server_timing(resp.headers.get('Server-Timing', ''))
+        except requests.RequestException as e:
+            status, timing = type(e).__name__, {}
+        results[i] = {
+            'status': status,
+            'shed': shed,
+            'latency_ms': (time.monotonic() - scheduled) * 1000,
+            'stages': timing,
+        }
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_inflight) as pool:
+        for i in range(total):
+            scheduled = started + i / rps
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, i, scheduled)
+    elapsed = time.monotonic() - started
+    return [r for r in results if r is not None], elapsed
+
+
+def summarize(config: dict, results: list, elapsed: float, target_rps: float) -> dict:
+    ok = [r for r in results if r['status'] == 200]
+    shed = [r for r in results if r.get('shed')]
+    latencies = [r['latency_ms'] for r in ok]
+    errors = {}
+    for r in results:
+        if r['status'] != 200 and not r.get('shed'):
+            errors[str(r['status'])] = errors.get(str(r['status']), 0) + 1
+
+    stages = {}
+    for r in ok:
+        for stage, ms in r['stages'].items():
+            stages.setdefault(stage, []).append(ms)
+    cache_hits = sum(1 for r in ok if r['stages'] and 'search_qdrant' not in r['stages'])
+
+    return {
+        'config': config,
+        'target_rps': target_rps,
+        'achieved_rps': round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        'requests': len(results),
+        'errors': errors,
+        'error_rate': round(sum(errors.values()) / len(results), 4) if results else 0.0,
+        'shed_rate': round(len(shed) / len(results), 4) if results else 0.0,
+        'shed_p99_ms': round(percentile([r['latency_ms'] for r in shed], 99), 1),
+        'cache_hit_rate': round(cache_hits / len(ok), 3) if ok else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 1),
+        'p95_ms': round(percentile(latencies, 95), 1),
+        'p99_ms': round(percentile(latencies, 99), 1),
+        'stages': {
+            stage: {
+                'mean_ms': round(statistics.mean(values), 1),
+                'p95_ms': round(percentile(values, 95), 1),
+                'count': len(values),
+            }
+            for stage, values in stages.items()
+        },
+    }
+
+
+def print_report(reports: list):
+    print(f"\n{'konfigurasi':<16} {'rps':>6} {'capai':>6} {'n':>6} {'error':>7} {'tolak':>7} {'cache':>6} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for r in reports:
+        print(f"{r['config']['name']:<16} {r['target_rps']:>6.1f} {r['achieved_rps']:>6.1f} {r['requests']:>6} "
+              f"{r['error_rate'] * 100:>6.1f}% {r['shed_rate'] * 100:>6.1f}% {r['cache_hit_rate'] * 100:>5.0f}% "
+              f"{r['p50_ms']:>8.0f} {r['p95_ms']:>8.0f} {r['p99_ms']:>8.0f}")
+        if r['errors']:
+            print(f"{'':<16} status gagal: {r['errors']}")
+        if r['shed_rate']:
+            print(f"{'':<16} p99 penolakan 503: {r['shed_p99_ms']:.0f} ms")
+
+    stage_names = sorted({s for r in reports for s in r['stages']},
+                         key=lambda s: -max(r['stages'].get(s, {}).get('mean_ms', 0) for r in reports))
+    print(f"\nRata-rata / p95 per tahap (ms, dari Server-Timing; span bersarang ikut dihitung di induknya)")
+    print(f"{'tahap':<16} " + " ".join(f"{r['config']['name']:>20}" for r in reports))
+    for stage in stage_names:
+        cells = []
+        for r in reports:
+            s = r['stages'].get(stage)
+            cells.append(f"{s['mean_ms']:>9.1f} / {s['p95_ms']:>8.1f}" if s else f"{'-':>20}")
+        print(f"{stage:<16} " + " ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--config', action='append', default=[], metavar='KELAS:WORKER[xTHREAD]',
+                        help='Konfigurasi gunicorn yang diuji, bisa diulang (default sync:2)')
+    parser.add_argument('--rps', type=float, default=2.0, help='Laju kedatangan target')
+    parser.add_argument('--duration', type=float, default=60, help='Durasi beban per konfigurasi (detik)')
+    parser.add_argument('--warmup', type=int, default=5, help='Permintaan pemanasan (tidak dihitung)')
+    parser.add_argument('--max-inflight', type=int, default=64)
+    parser.add_argument('--timeout', type=float, default=90)
+    parser.add_argument('--queries', default='', help='JSONL (field query) atau teks satu query per baris')
+    parser.add_argument('--keep-cache', action='store_true', help='Jangan hapus cache jawaban sebelum tiap run')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--qdrant-url', default=os.environ.get('QDRANT_URL', 'http://localhost:6333'))
+    parser.add_argument('--qdrant-api-key', default=os.environ.get('QDRANT_API_KEY', ''))
+    parser.add_argument('--redis-url', default='redis://localhost:6379/14')
+    parser.add_argument('--ready-timeout', type=float, default=180)
+    parser.add_argument('--admission', choices=['on', 'off', 'both'], default='on',
+                        help='Admission control aplikasi; both = jalankan tiap konfigurasi dengan & tanpa')
+    parser.add_argument('--json', default='', help='Simpan laporan ke file JSON')
+    add_profile_args(parser)
+    args = parser.parse_args()
+
+    configs = []
+    for spec in args.config or ['sync:2']:
+        for admission in {'on': [True], 'off': [False], 'both': [True, False]}[args.admission]:
+            config = parse_config(spec)
+            config['admission'] = admission
+            if args.admission == 'both':
+                config['name'] = f"{spec} {'+adm' if admission else '-adm'}"
+            configs.append(config)
+    queries = load_queries(args.queries)
+    check_backends(args)
+
+    profile = profile_from_args(args)
+    _, gemini_url = start_stub(FakeGeminiHandler, profile)
+    _, search_url = start_stub(FakeSearchHandler, profile)
+    stubs = {'gemini': gemini_url, 'search': search_url}
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    reports = []
+    for config in configs:
+        workdir = tempfile.mkdtemp(prefix=f"loadtest-{config['worker_class']}-")
+        if not args.keep_cache:
+            reset_response_cache(args.redis_url)
+        print(f"[LOADTEST] {config['name']}: menyalakan gunicorn (log: {workdir})")
+        proc = start_gunicorn(config, args, stubs, workdir)
+        try:
+            wait_ready(base_url, proc, args.ready_timeout)
+            for i in range(args.warmup):
+                requests.post(f"{base_url}/api/ask", json={'query': f"pemanasan {i} {queries[i % len(queries)]}"},
+                              timeout=args.timeout)
+            print(f"[LOADTEST] {config['name']}: {args.rps} RPS selama {args.duration:.0f} detik")
+            results, elapsed = run_load(base_url, queries, args.rps, args.duration, args.max_inflight, args.timeout)
+            reports.append(summarize(config, results, elapsed, args.rps))
+        finally:
+            stop_gunicorn(proc)
+
+    print_report(reports)
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'stub_profile': vars(profile), 'queries': len(queries), 'reports': reports}, f, indent=2)
+        print(f"\nLaporan disimpan ke {args.json}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
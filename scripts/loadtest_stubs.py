@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# scripts/loadtest_stubs.py
+"""
+Layanan tiruan untuk load test: Gemini (REST generateContent /
+streamGenerateContent) dan Google Custom Search. Tidak memakai kuota apa pun.
+
+Latensi Gemini tiruan dimodelkan seperti LLM sungguhan: waktu ke token
+pertama (ttft) + jeda per token. Bila permintaan mendeklarasikan tool dan
+prompt tidak membawa konteks internal, model meminta search_google dulu
+sehingga jalur tool (dua round trip + Custom Search) ikut teruji.
+
+    python scripts/loadtest_stubs.py --gemini-port 9100 --search-port 9101 --ttft-ms 400
+    # lalu jalankan app dengan:
+    #   GEMINI_API_ENDPOINT=http://127.0.0.1:9100
+    #   GOOGLE_SEARCH_URL=http://127.0.0.1:9101/customsearch/v1
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NO_CONTEXT_MARKER = "KONTEKS INTERNAL: Tidak tersedia."
+
+ANSWER_TEXT = (
+    "Terima kasih atas pertanyaannya. Berdasarkan informasi yang tersedia, layanan tersebut "
+    "dapat diakses melalui bagian akademik UIN Salatiga pada jam kerja, dan informasi lengkap "
+    "tersedia di laman resmi kampus."
+)
+
+
+class LatencyProfile:
+    def __init__(self, ttft_ms=400.0, token_ms=15.0, tokens=40, jitter=0.2, error_rate=0.0, search_ms=150.0):
+        self.ttft_ms = ttft_ms
+        self.token_ms = token_ms
+        self.tokens = tokens
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.search_ms = search_ms
+
+    def sleep(self, ms: float):
+        if ms > 0:
+            time.sleep(ms * random.uniform(1 - self.jitter, 1 + self.jitter) / 1000)
+
+
+def _request_text(body: dict) -> str:
+    texts = []
+    for content in body.get('contents', []):
+        for part in content.get('parts', []):
+            if 'text' in part:
+                texts.append(part['text'])
+    return "\n".join(texts)
+
+
+def _has_function_response(body: dict) -> bool:
+    return any(
+        'functionResponse' in part or 'function_response' in part
+        for content in body.get('contents', [])
+        for part in content.get('parts', [])
+    )
+
+
+def _wants_tool(body: dict) -> bool:
+    declared = any(tool.get('functionDeclarations') or tool.get('function_declarations')
+                   for tool in body.get('tools', []))
+    return declared and not _has_function_response(body) and NO_CONTEXT_MARKER in _request_text(body)
+
+
+def _candidate(parts: list) -> dict:
+    return {
+        'candidates': [{
+            'content': {'role': 'model', 'parts': parts},
+            'finishReason': 'STOP',
+            'index': 0,
+        }],
+        'usageMetadata': {'promptTokenCount': 0, 'candidatesTokenCount': 0, 'totalTokenCount': 0},
+    }
+
+
+def _answer_tokens(n: int) -> list:
+    words = ANSWER_TEXT.split()
+    return [words[i % len(words)] + " " for i in range(n)]
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    profile = LatencyProfile()
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        path = urlparse(self.path).path
+        profile = self.profile
+
+        if random.random() < profile.error_rate:
+            profile.sleep(profile.ttft_ms)
+            return self._send_json(503, {'error': {'code': 503, 'message': 'stub overload', 'status': 'UNAVAILABLE'}})
+
+        if _wants_tool(body):
+            profile.sleep(profile.ttft_ms)
+            query = _request_text(body).rsplit("PERTANYAAN USER:", 1)[-1].strip()[:200]
+            return self._send_json(200, _candidate([
+                {'functionCall': {'name': 'search_google', 'args': {'query': query}}}
+            ]))
+
+        tokens = _answer_tokens(profile.tokens)
+        if path.endswith(':streamGenerateContent'):
+            # Transport REST SDK membaca stream sebagai array JSON yang dikirim bertahap
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            profile.sleep(profile.ttft_ms)
+            for i, token in enumerate(tokens):
+                prefix = '[' if i == 0 else ','
+                self.wfile.write(f"{prefix}{json.dumps(_candidate([{'text': token}]))}\n".encode())
+                self.wfile.flush()
+                profile.sleep(profile.token_ms)
+            self.wfile.write(b"]")
+            self.close_connection = True
+            return
+
+        if path.endswith(':generateContent'):
+            # Non-streaming: klien baru menerima setelah token terakhir dihasilkan
+            profile.sleep(profile.ttft_ms + profile.token_ms * len(tokens))
+            return self._send_json(200, _candidate([{'text': "".join(tokens).strip()}]))
+
+        self._send_json(404, {'error': {'code': 404, 'message': f'unknown path {path}'}})
+
+
+class FakeSearchHandler(BaseHTTPRequestHandler):
+    profile = LatencyProfile()
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query).get('q', [''])[0]
+        self.profile.sleep(self.profile.search_ms)
+        payload = {'items': [
+            {
+                'title': f"Hasil {i + 1} untuk {query}"[:80],
+                'snippet': f"Informasi terkini tentang {query} dari laman resmi UIN Salatiga.",
+                'link': f"https://www.uinsalatiga.ac.id/hasil-{i + 1}",
+            }
+            for i in range(3)
+        ]}
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_stub(handler_cls, profile: LatencyProfile, port: int = 0, host: str = '127.0.0.1'):
+    """Jalankan server tiruan di thread latar. Mengembalikan (server, base_url)."""
+    handler = type(handler_cls.__name__, (handler_cls,), {'profile': profile})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name=handler_cls.__name__, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def add_profile_args(parser: argparse.ArgumentParser):
+    parser.add_argument('--ttft-ms', type=float, default=400.0, help='Waktu ke token pertama Gemini tiruan')
+    parser.add_argument('--token-ms', type=float, default=15.0, help='Jeda per token')
+    parser.add_argument('--tokens', type=int, default=40, help='Panjang jawaban (token)')
+    parser.add_argument('--jitter', type=float, default=0.2, help='Variasi acak latensi (±porsi)')
+    parser.add_argument('--llm-error-rate', type=float, default=0.0, help='Porsi panggilan Gemini yang gagal 503')
+    parser.add_argument('--search-ms', type=float, default=150.0, help='Latensi Custom Search tiruan')
+
+
+def profile_from_args(args) -> LatencyProfile:
+    return LatencyProfile(
+        ttft_ms=args.ttft_ms,
+        token_ms=args.token_ms,
+        tokens=args.tokens,
+        jitter=args.jitter,
+        error_rate=args.llm_error_rate,
+        search_ms=args.search_ms,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--gemini-port', type=int, default=9100)
+    parser.add_argument('--search-port', type=int, default=9101)
+    add_profile_args(parser)
+    args = parser.parse_args()
+
+    profile = profile_from_args(args)
+    _, gemini_url = start_stub(FakeGeminiHandler, profile, args.gemini_port, args.host)
+    _, search_url = start_stub(FakeSearchHandler, profile, args.search_port, args.host)
+    print(f"GEMINI_API_ENDPOINT={gemini_url}")
+    print(f"GOOGLE_SEARCH_URL={search_url}/customsearch/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
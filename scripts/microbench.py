@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# scripts/microbench.py
+"""
+Micro-benchmark fungsi di jalur panas per permintaan / ingestion, dengan
+baseline tersimpan dan mode pembanding yang gagal (exit 1) bila ada fungsi
+yang melambat melebihi toleransi.
+
+Input realistis: halaman PDF di data/ (untuk chunking, konteks prompt dan
+hit Qdrant sintetis) dan query dari log trace (logs/traces.jsonl) atau
+daftar bawaan.
+
+    # Rekam baseline di mesin deploy / CI (sekali, atau setelah perubahan yang disengaja)
+    python scripts/microbench.py --save scripts/microbench_baseline.json
+
+    # Sebelum deploy: bandingkan, gagal bila ada yang > 15% lebih lambat
+    python scripts/microbench.py --compare scripts/microbench_baseline.json --tolerance 0.15
+
+Angka yang dipakai adalah waktu per panggilan terbaik dari beberapa ulangan
+(paling tahan noise); baseline hanya bermakna di mesin yang sama.
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import random
+import platform
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from qdrant_client.models import ScoredPoint
+
+from app.config import settings
+from app import rag_initializer
+from app.utils.text import preprocess_query, canonical_key
+from app.utils.validators import validate_query
+from app.core.main import _postprocess_hits, construct_prompt
+from app.redis_manager import _generate_cache_key
+from ingestion import extract_pages_from_pdf_llamaindex, smart_chunk_semantic
+from loadtest import DEFAULT_QUERIES, load_queries
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+# ===================================================================
+# INPUT REALISTIS
+# ===================================================================
+def load_pages(data_dir: str, max_pages: int) -> list:
+    pages = []
+    for pdf_path in sorted(glob.glob(os.path.join(data_dir, '*.pdf'))):
+        for _, text in extract_pages_from_pdf_llamaindex(pdf_path)[:max_pages]:
+            if text.strip():
+                pages.append(text)
+    if not pages:
+        raise SystemExit(f"Tidak ada teks PDF di {data_dir}")
+    return pages
+
+
+def load_bench_queries(path: str) -> list:
+    if path:
+        return load_queries(path)
+    default_log = os.path.join(ROOT_DIR, settings.TRACE_LOG_PATH)
+    if os.path.exists(default_log):
+        queries = load_queries(default_log)
+        if len(queries) >= len(DEFAULT_QUERIES):
+            return queries
+    return list(DEFAULT_QUERIES)
+
+
+def build_hit_lists(chunks: list, n_lists: int, hits_per_list: int) -> list:
+    """ScoredPoint sintetis berbentuk sama dengan respons Qdrant (payload teks + metadata)."""
+    rng = random.Random(42)
+    hit_lists = []
+    for _ in range(n_lists):
+        sample = rng.sample(chunks, min(hits_per_list, len(chunks)))
+        scores = sorted((rng.uniform(0.3, 0.95) for _ in sample), reverse=True)
+        hit_lists.append([
+            ScoredPoint(
+                id=rng.getrandbits(128).to_bytes(16, 'big').hex(),
+                version=0,
+                score=score,
+                payload={'text': text, 'source': 'data/dokumen.pdf', 'page': rng.randint(1, 60), 'chunk_index': 0},
+            )
+            for text, score in zip(sample, scores)
+        ])
+    return hit_lists
+
+
+def build_benchmarks(pages: list, queries: list) -> dict:
+    chunks = [c for page in pages for c in smart_chunk_semantic(page, max_chunk_size=512, overlap=64)]
+    hit_lists = build_hit_lists(chunks, n_lists=50, hits_per_list=settings.RAG.RAG_HYBRID_CANDIDATES)
+    rng = random.Random(7)
+    history = "\n".join(f"User: {q}\nAI: {rng.choice(chunks)[:200]}" for q in queries[:5])
+    prompt_inputs = [(q, "\n".join(rng.sample(chunks, 3)), history) for q in queries]
+
+    # Pin versi knowledge base agar _generate_cache_key tidak menyentuh Qdrant
+    rag_initializer._active_collection.update(name=f"{settings.RAG.COLLECTION_NAME}_bench", checked_at=float('inf'))
+
+    return {
+        'preprocess_query': (lambda: [preprocess_query(q) for q in queries], len(queries)),
+        'canonical_key': (lambda: [canonical_key(q) for q in queries], len(queries)),
+        'validate_query': (lambda: [validate_query(q) for q in queries], len(queries)),
+        'postprocess_hits': (lambda: [_postprocess_hits(h, 3) for h in hit_lists], len(hit_lists)),
+        'construct_prompt': (lambda: [construct_prompt(*args) for args in prompt_inputs], len(prompt_inputs)),
+        'smart_chunk_semantic': (lambda: [smart_chunk_semantic(p, 512, 64) for p in pages], len(pages)),
+        'generate_cache_key': (lambda: [_generate_cache_key(q) for q in queries], len(queries)),
+    }
+
+
+# ===================================================================
+# PENGUKURAN
+# ===================================================================
+def measure(func, calls_per_run: int, repeat: int, min_time: float) -> dict:
+    """Seperti timeit.autorange: ulangi sampai >= min_time, lalu ambil `repeat` sampel."""
+    func()  # pemanasan (cache regex, import malas, dst.)
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        if time.perf_counter() - start >= min_time:
+            break
+        loops *= 2
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - start) / (loops * calls_per_run) * 1e6)
+    return {
+        'best_us': round(min(samples), 3),
+        'median_us': round(statistics.median(samples), 3),
+        'calls': loops * calls_per_run,
+    }
+
+
+def machine_info() -> dict:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Cetak perbandingan; kembalikan nama benchmark yang regresi."""
+    if baseline.get('machine') != machine_info():
+        print("[PERINGATAN] Baseline direkam di mesin/Python berbeda; perbandingan bisa menyesatkan.")
+    regressions = []
+    print(f"\n{'benchmark':<22} {'baseline us':>12} {'sekarang us':>12} {'rasio':>7}")
+    for name, current in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f"{name:<22} {'-':>12} {current['best_us']:>12.2f} {'baru':>7}")
+            continue
+        ratio = current['best_us'] / base['best_us'] if base['best_us'] else float('inf')
+        flag = ''
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = '  REGRESI'
+        print(f"{name:<22} {base['best_us']:>12.2f} {current['best_us']:>12.2f} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data-dir', default=os.path.join(ROOT_DIR, 'data'))
+    parser.add_argument('--max-pages', type=int, default=15, help='Halaman per PDF yang dipakai sebagai input')
+    parser.add_argument('--queries', default='', help='JSONL (field query) atau teks; default log trace/daftar bawaan')
+    parser.add_argument('--only', action='append', default=[], help='Jalankan benchmark tertentu saja')
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--min-time', type=float, default=0.2, help='Durasi minimum per sampel (detik)')
+    parser.add_argument('--save', default='', help='Simpan hasil sebagai baseline')
+    parser.add_argument('--compare', default='', help='Bandingkan dengan baseline; exit 1 bila regresi')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='Perlambatan yang masih diterima (0.15 = 15%%)')
+    args = parser.parse_args()
+
+    pages = load_pages(args.data_dir, args.max_pages)
+    queries = load_bench_queries(args.queries)
+    benchmarks = build_benchmarks(pages, queries)
+    if args.only:
+        benchmarks = {name: bench for name, bench in benchmarks.items() if name in args.only}
+
+    print(f"\nInput: {len(pages)} halaman PDF, {len(queries)} query\n")
+    print(f"{'benchmark':<22} {'terbaik us':>12} {'median us':>12} {'panggilan':>10}")
+    results = {}
+    for name, (func, calls_per_run) in benchmarks.items():
+        results[name] = measure(func, calls_per_run, args.repeat, args.min_time)
+        r = results[name]
+        print(f"{name:<22} {r['best_us']:>12.2f} {r['median_us']:>12.2f} {r['calls']:>10}")
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nGAGAL: {', '.join(regressions)} melambat lebih dari {args.tolerance:.0%}.")
+        else:
+            print(f"\nOK: tidak ada regresi di atas {args.tolerance:.0%}.")
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'machine': machine_info(),
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'inputs': {'pages': len(pages), 'queries': len(queries)},
+                'results': results,
+            }, f, indent=2)
+        print(f"\nBaseline disimpan ke {args.save}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# scripts/prewarm_cache.py
+"""
+Panaskan cache jawaban dengan pertanyaan terpopuler dari log query, agar
+gelombang pertama mahasiswa setelah deploy / reset cache tidak membayar
+latensi RAG + Gemini penuh. Jawaban disimpan untuk versi knowledge base
+yang sedang aktif.
+
+    # Lihat dulu apa yang akan dipanaskan
+    python scripts/prewarm_cache.py --dry-run
+
+    # Setelah deploy (lihat scripts/deploy.sh): 50 teratas, maks 10 panggilan Gemini per menit
+    python scripts/prewarm_cache.py --log logs/queries.jsonl --top 50 --rate 10
+
+Log: JSONL berfield 'query' (default QUERY_LOG_PATH, satu baris per /api/ask)
+atau teks satu query per baris; --log boleh diulang. Jangan memakai log trace:
+trace di-tail-sample sehingga pertanyaan lambat terlalu terwakili dan
+pertanyaan populer yang cepat (sudah di-cache) nyaris tak terhitung.
+Versi latar dari endpoint admin: POST /api/admin/cache/prewarm (status: GET /api/admin/cache/prewarm).
+"""
+
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.config import settings
+from app.core.prewarm import mine_top_queries, run_prewarm
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Panaskan cache jawaban dari log query.")
+    parser.add_argument("--log", action="append", default=None,
+                        help=f"File log query (boleh diulang). Default: {settings.QUERY_LOG_PATH}")
+    parser.add_argument("--top", type=int, default=settings.PREWARM_TOP_N, help="Jumlah pertanyaan teratas.")
+    parser.add_argument("--rate", type=float, default=settings.PREWARM_RATE_PER_MINUTE,
+                        help="Maksimum panggilan Gemini per menit.")
+    parser.add_argument("--ttl", type=int, default=3600, help="TTL jawaban di cache (detik).")
+    parser.add_argument("--force", action="store_true", help="Hitung ulang walau jawaban sudah ada di cache.")
+    parser.add_argument("--dry-run", action="store_true", help="Tampilkan pertanyaan teratas saja.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    paths = args.log or [settings.QUERY_LOG_PATH]
+    missing = [path for path in paths if not os.path.exists(path)]
+    if missing:
+        raise SystemExit(f"Log query tidak ditemukan: {', '.join(missing)}")
+
+    if args.dry_run:
+        for group in mine_top_queries(paths, args.top):
+            print(f"{group['count']:>6}  {group['query']}  (+{len(group['variants']) - 1} variasi)")
+        return
+
+    try:
+        stats = run_prewarm(paths, args.top, args.rate, ttl=args.ttl, force=args.force)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(json.dumps(stats, indent=2))
+    if stats['state'] != 'finished':
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
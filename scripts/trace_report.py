@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# scripts/trace_report.py
+"""
+Analisis trace JSONL (logs/traces.jsonl) dan replay ke instance staging.
+
+    # Ringkasan: persentil total + breakdown critical path per tahap
+    python scripts/trace_report.py summary --path logs/traces.jsonl --slowest 5
+
+    # Replay query yang terekam ke staging dengan jadwal kedatangan yang sama,
+    # lalu bandingkan durasi per tahap (staging harus TRACE_SERVER_TIMING=true)
+    python scripts/trace_report.py replay --target http://staging:8000 --speed 2
+"""
+
+import sys
+import json
+import time
+import argparse
+import statistics
+import threading
+
+import requests
+
+
+def load_traces(path: str) -> list:
+    traces = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                traces.append(json.loads(line))
+    traces.sort(key=lambda t: t['ts'])
+    return traces
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def critical_path(trace: dict) -> dict:
+    """
+    Durasi (ms) per tahap pada jalur kritis. Permintaan diproses berurutan,
+    jadi jalur kritis = span tingkat atas; span bersarang dipecah ke anaknya
+    (mis. search_qdrant -> embed + vector_search) dengan sisa waktunya sebagai '<span>:self'.
+    """
+    spans = trace.get('spans', [])
+    children = {}
+    for idx, s in enumerate(spans):
+        children.setdefault(s.get('parent'), []).append(idx)
+
+    path = {}
+
+    def walk(idx):
+        s = spans[idx]
+        kids = children.get(idx, [])
+        if not kids:
+            path[s['name']] = path.get(s['name'], 0.0) + (s['dur_ms'] or 0.0)
+            return
+        child_total = 0.0
+        for kid in kids:
+            walk(kid)
+            child_total += spans[kid]['dur_ms'] or 0.0
+        self_ms = max(0.0, (s['dur_ms'] or 0.0) - child_total)
+        if self_ms:
+            path[f"{s['name']}:self"] = path.get(f"{s['name']}:self", 0.0) + self_ms
+
+    for root in children.get(None, []):
+        walk(root)
+    covered = sum(path.values())
+    path['(tak terinstrumentasi)'] = max(0.0, (trace.get('duration_ms') or 0.0) - covered)
+    return path
+
+
+def summary(args):
+    traces = load_traces(args.path)
+    if not traces:
+        print("Tidak ada trace.")
+        return
+    durations = [t['duration_ms'] for t in traces]
+    errors = sum(1 for t in traces if t.get('error'))
+    print(f"Trace: {len(traces)} | error: {errors} | "
+          f"p50 {percentile(durations, 50):.0f} ms | p95 {percentile(durations, 95):.0f} ms | "
+          f"p99 {percentile(durations, 99):.0f} ms\n")
+
+    per_stage = {}
+    for t in traces:
+        for stage, ms in critical_path(t).items():
+            per_stage.setdefault(stage, []).append(ms)
+
+    total_ms = sum(durations)
+    print(f"{'tahap':<28} {'porsi':>7} {'rata2 ms':>9} {'p95 ms':>9} {'muncul':>7}")
+    rows = sorted(per_stage.items(), key=lambda kv: -sum(kv[1]))
+    for stage, stage_ms in rows:
+        share = sum(stage_ms) / total_ms * 100 if total_ms else 0.0
+        print(f"{stage:<28} {share:>6.1f}% {statistics.mean(stage_ms):>9.1f} "
+              f"{percentile(stage_ms, 95):>9.1f} {len(stage_ms):>7}")
+
+    if args.slowest:
+        print(f"\n{args.slowest} trace paling lambat:")
+        for t in sorted(traces, key=lambda t: -t['duration_ms'])[:args.slowest]:
+            path = critical_path(t)
+            top = sorted(path.items(), key=lambda kv: -kv[1])[:3]
+            parts = ", ".join(f"{name} {ms:.0f}ms" for name, ms in top)
+            print(f"  {t['trace_id'][:12]} {t['duration_ms']:>8.0f} ms  {t.get('query', '')[:40]!r}  [{parts}]")
+
+
+def parse_server_timing(header: str) -> dict:
+    timings = {}
+    for item in filter(None, (part.strip() for part in header.split(','))):
+        name, _, rest = item.partition(';')
+        for param in rest.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip() == 'dur':
+                timings[name.strip()] = float(value)
+    return timings
+
+
+def replay(args):
+    traces = [t for t in load_traces(args.path) if t.get('query')]
+    if args.only_slow:
+        traces = [t for t in traces if t['duration_ms'] >= args.only_slow]
+    if args.limit:
+        traces = traces[:args.limit]
+    if not traces:
+        print("Tidak ada trace dengan query untuk di-replay.")
+        return
+
+    url = f"{args.target.rstrip('/')}/api/ask"
+    results = [None] * len(traces)
+
+    def send(i, trace):
+        start = time.perf_counter()
+        try:
+            resp = requests.post(url, json={'query': trace['query']}, timeout=args.timeout)
+            elapsed = (time.perf_counter() - start) * 1000
+            timing = parse_server_timing(resp.headers.get('Server-Timing', ''))
+            results[i] = (resp.status_code, elapsed, timing)
+        except requests.RequestException as e:
+            results[i] = (str(e), (time.perf_counter() - start) * 1000, {})
+
+    # Pertahankan jarak antar-kedatangan aslinya (dipercepat dengan --speed)
+    threads = []
+    origin, started = traces[0]['ts'], time.monotonic()
+    for i, trace in enumerate(traces):
+        delay = (trace['ts'] - origin) / args.speed - (time.monotonic() - started)
+        if delay > 0:
+            time.sleep(delay)
+        thread = threading.Thread(target=send, args=(i, trace), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+    print(f"{'trace':<12} {'status':>6} {'asli ms':>9} {'staging':>9}  tahap (asli -> staging)")
+    for trace, (status, elapsed, timing) in zip(traces, results):
+        recorded = trace_stage_totals(trace)
+        stages = sorted(set(recorded) | set(timing), key=lambda s: -recorded.get(s, 0.0))[:4]
+        detail = ", ".join(f"{s} {recorded.get(s, 0):.0f}->{timing.get(s, 0):.0f}" for s in stages)
+        print(f"{trace['trace_id'][:12]} {status!s:>6} {trace['duration_ms']:>9.0f} {elapsed:>9.0f}  {detail}")
+
+
+def trace_stage_totals(trace: dict) -> dict:
+    totals = {}
+    for s in trace.get('spans', []):
+        totals[s['name']] = totals.get(s['name'], 0.0) + (s['dur_ms'] or 0.0)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--path', default='logs/traces.jsonl')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_summary = sub.add_parser('summary', parents=[common], help='Ringkasan persentil dan critical path')
+    p_summary.add_argument('--slowest', type=int, default=0)
+    p_summary.set_defaults(func=summary)
+
+    p_replay = sub.add_parser('replay', parents=[common], help='Kirim ulang query terekam ke instance staging')
+    p_replay.add_argument('--target', required=True)
+    p_replay.add_argument('--speed', type=float, default=1.0, help='Pengali kecepatan jadwal kedatangan')
+    p_replay.add_argument('--only-slow', type=float, default=0, metavar='MS')
+    p_replay.add_argument('--limit', type=int, default=0)
+    p_replay.add_argument('--timeout', type=float, default=90)
+    p_replay.set_defaults(func=replay)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
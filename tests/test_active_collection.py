@@ -0,0 +1,59 @@
+# tests/test_active_collection.py
+from types import SimpleNamespace
+
+import pytest
+
+from app import rag_initializer as ri
+
+
+class AliasClient:
+    def __init__(self):
+        self.aliases = [SimpleNamespace(alias_name='kb', collection_name='kb_v1')]
+        self.fail = False
+
+    def get_aliases(self):
+        if self.fail:
+            raise ConnectionError("qdrant tidak terjangkau")
+        return SimpleNamespace(aliases=self.aliases)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = AliasClient()
+    monkeypatch.setattr(ri, 'get_runtime_components', lambda: {'qdrant_client': client, 'embedder': None})
+    monkeypatch.setattr(ri, 'check_query_dimension', lambda client, version, embedder: 768)
+    monkeypatch.setattr(ri.settings.RAG, 'COLLECTION_NAME', 'kb')
+    monkeypatch.setattr(ri, '_active_collection', {'name': None, 'checked_at': 0.0})
+    return client
+
+
+def test_read_error_keeps_last_known_version(client):
+    assert ri.get_active_collection() == 'kb_v1'
+    client.fail = True
+    ri.expire_active_collection()
+    assert ri.get_active_collection() == 'kb_v1'
+
+    client.fail = False
+    client.aliases = [SimpleNamespace(alias_name='kb', collection_name='kb_v2')]
+    ri.expire_active_collection()
+    assert ri.get_active_collection() == 'kb_v2'
+
+
+def test_missing_alias_means_physical_collection(client):
+    client.aliases = []
+    assert ri.get_active_collection() == 'kb'
+    with pytest.raises(ConnectionError):
+        client.fail = True
+        ri.resolve_collection_alias(client, 'kb')
+
+
+def test_version_with_wrong_dimension_is_not_activated(client, monkeypatch):
+    assert ri.get_active_collection() == 'kb_v1'
+
+    def check(client, version, embedder):
+        raise RuntimeError(f"{version}: proyeksi tidak ditemukan")
+
+    monkeypatch.setattr(ri, 'check_query_dimension', check)
+    client.aliases = [SimpleNamespace(alias_name='kb', collection_name='kb_v2')]
+    ri.expire_active_collection()
+    assert ri.get_active_collection() == 'kb_v1'
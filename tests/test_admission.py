@@ -0,0 +1,57 @@
+# tests/test_admission.py
+from app.core.admission import AdmissionController, parse_request_start
+
+
+def test_parse_request_start_formats():
+    now = 1_700_000_010.0
+    assert parse_request_start("t=1700000008.500", now) == 1.5
+    assert parse_request_start("1700000009000", now) == 1.0          # milidetik
+    assert parse_request_start("t=1700000009500000", now) == 0.5     # mikrodetik
+    assert parse_request_start("", now) == 0.0
+    assert parse_request_start("t=abc", now) == 0.0
+    assert parse_request_start("t=1700000020", now) == 0.0           # jam proxy di depan
+
+
+def test_sheds_when_queue_delay_exceeds_budget():
+    controller = AdmissionController(concurrency=1, max_wait_seconds=2.0, initial_service_seconds=1.0)
+    admitted, _ = controller.try_admit(queue_delay=0.5)
+    assert admitted
+    controller.release(1.0)
+
+    admitted, retry_after = controller.try_admit(queue_delay=3.0)
+    assert not admitted
+    assert retry_after >= 1
+    assert controller.in_flight == 0
+
+
+def test_in_flight_requests_count_toward_wait():
+    controller = AdmissionController(concurrency=2, max_wait_seconds=2.0, initial_service_seconds=1.0)
+    for _ in range(5):
+        assert controller.try_admit()[0]
+    # 5 in-flight x 1 detik / 2 thread = 2,5 detik tunggu: ditolak
+    assert not controller.try_admit()[0]
+    controller.release(1.0)
+    assert controller.try_admit()[0]
+
+
+def test_service_time_ewma_adapts():
+    controller = AdmissionController(initial_service_seconds=1.0, alpha=0.5)
+    controller.try_admit()
+    controller.release(3.0)
+    assert controller.service_ewma == 2.0
+    assert controller.in_flight == 0
+
+
+def test_reserved_batch_counts_toward_wait_until_unreserved():
+    controller = AdmissionController(concurrency=1, max_wait_seconds=5.0, initial_service_seconds=1.0)
+    token, _ = controller.reserve(30.0)
+    assert token is not None
+    # /api/ask ditolak selama sisa perkiraan batch melebihi anggaran tunggu
+    admitted, retry_after = controller.try_admit()
+    assert not admitted and retry_after >= 25
+    assert controller.reserve(30.0)[0] is None
+
+    controller.unreserve(token)
+    assert controller.try_admit()[0]
+    controller.release()
+    assert controller.service_ewma == 1.0  # batch tidak mengubah EWMA /api/ask
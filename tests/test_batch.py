@@ -0,0 +1,95 @@
+# tests/test_batch.py
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.core import batch
+from app.core.resilience import UpstreamUnavailable
+
+
+class FakeFAQ:
+    def match(self, query, query_vec, threshold):
+        return ({'answer': 'jawaban faq', 'sources': []}, 1.0, 'v') if query_vec[0] == 9 else None
+
+
+@pytest.fixture
+def env(monkeypatch):
+    calls = {'embed': [], 'search': [], 'gemini': [], 'cached': {}}
+    running = {'now': 0, 'max': 0}
+    lock = threading.Lock()
+
+    def embed_queries(queries, embedder):
+        calls['embed'].append(list(queries))
+        return np.array([[9.0] if 'faq' in q else [0.0] for q in queries])
+
+    def search_qdrant_batch(queries, vecs, top_k):
+        calls['search'].append(list(queries))
+        return [[{'text': f'konteks {q}', 'score': 0.9, 'source': 'a.pdf', 'page': 1}] if 'kb' in q else []
+                for q in queries]
+
+    def ask_gemini(system_prompt, user_prompt, rag_context, enable_google_search):
+        with lock:
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+        try:
+            time.sleep(0.02)
+            calls['gemini'].append(user_prompt)
+            if 'mati' in user_prompt:
+                raise UpstreamUnavailable('sirkuit terbuka', retry_after=7)
+            return 'jawaban llm'
+        finally:
+            with lock:
+                running['now'] -= 1
+
+    monkeypatch.setattr(batch, 'get_cached_responses',
+                        lambda queries: [calls['cached'].get(q) for q in queries])
+    monkeypatch.setattr(batch, 'cache_response',
+                        lambda query, answer, ttl: calls['cached'].__setitem__(query, answer))
+    monkeypatch.setattr(batch, 'get_runtime_components', lambda: {'embedder': None})
+    monkeypatch.setattr(batch, 'embed_queries', embed_queries)
+    monkeypatch.setattr(batch, 'search_qdrant_batch', search_qdrant_batch)
+    monkeypatch.setattr(batch, 'ask_gemini', ask_gemini)
+    monkeypatch.setattr(batch, 'construct_prompt', lambda user_query, rag_context: ('sys', user_query))
+    monkeypatch.setattr(batch, 'get_faq_index', lambda: FakeFAQ())
+    monkeypatch.setattr(batch.settings.RAG, 'FAQ_ENABLED', True)
+    return calls, running
+
+
+def test_batch_encodes_and_searches_once_and_only_misses_reach_gemini(env):
+    calls, running = env
+    calls['cached']['sudah di cache'] = 'jawaban lama'
+    queries = ['sudah di cache', 'ini faq', 'ok', 'kb satu', 'kb dua', 'di luar kb? tidak', 'lain lagi']
+    results = {r['index']: r for r in batch.answer_batch(queries, max_concurrency=2)}
+
+    assert sorted(results) == list(range(len(queries)))
+    assert results[0]['origin'] == 'cache' and results[0]['answer'] == 'jawaban lama'
+    assert results[1]['origin'] == 'faq'
+    assert 'error' in results[2]
+    assert results[3]['origin'] == 'rag' and results[3]['sources'] == [{'source': 'a.pdf', 'page': 1}]
+
+    assert calls['embed'] == [['ini faq', 'kb satu', 'kb dua', 'di luar kb? tidak', 'lain lagi']]
+    assert calls['search'] == [['kb satu', 'kb dua', 'di luar kb? tidak', 'lain lagi']]
+    assert len(calls['gemini']) == 4 and running['max'] <= 2
+    assert calls['cached']['kb satu'] == 'jawaban llm'
+
+
+def test_batch_degrades_per_question_when_gemini_unavailable(env):
+    calls, _ = env
+    results = {r['query']: r for r in batch.answer_batch(['kb mati', 'mati total'])}
+    assert results['kb mati']['degraded'] is True and 'konteks kb mati' in results['kb mati']['answer']
+    assert results['mati total']['retry_after'] == 7 and 'answer' not in results['mati total']
+    assert 'kb mati' not in calls['cached']
+
+
+def test_one_batch_slot_per_worker(monkeypatch):
+    monkeypatch.setattr(batch, '_batch_slots', threading.BoundedSemaphore(1))
+    assert batch.acquire_batch_slot()
+    assert not batch.acquire_batch_slot()
+    batch.release_batch_slot()
+    assert batch.acquire_batch_slot()
+    batch.release_batch_slot()
+    monkeypatch.setattr(batch.settings, 'BATCH_MAX_CONCURRENCY', 4)
+    assert batch.expected_batch_seconds(10, 2.0) == 6.0
+    assert batch.expected_batch_seconds(500, 2.0) == batch.settings.BATCH_DEADLINE_SECONDS
@@ -0,0 +1,50 @@
+# tests/test_codec.py
+import json
+
+import msgpack
+import pytest
+import zstandard
+
+from app.core.codec import (
+    CompactCodec, CodecError, is_compact,
+    encode_history_item, decode_history_item, encode_text, decode_text,
+)
+
+ANSWER = "Berdasarkan dokumen UIN Salatiga, pendaftaran jalur mandiri dibuka setelah SPAN-PTKIN. " * 5
+
+
+def _dictionary():
+    samples = [msgpack.packb([f"pertanyaan {i}", ANSWER + str(i), 1700000000 + i]) for i in range(300)]
+    return zstandard.train_dictionary(4096, samples)
+
+
+def test_history_item_roundtrip_and_smaller_than_json():
+    codec = CompactCodec()
+    item = {'user': 'Kapan pendaftaran mandiri?', 'ai': ANSWER, 'ts': 1700000123.456}
+    data = encode_history_item(item, codec)
+    assert is_compact(data)
+    assert len(data) < len(json.dumps(item))
+    assert decode_history_item(data, codec) == {'user': item['user'], 'ai': ANSWER, 'ts': 1700000123}
+
+
+def test_legacy_values_still_readable():
+    codec = CompactCodec()
+    legacy_item = json.dumps({'user': 'halo', 'ai': 'Halo juga', 'ts': 1700000000.5})
+    assert decode_history_item(legacy_item.encode(), codec)['ai'] == 'Halo juga'
+    assert decode_text("Jawaban lama ✓".encode(), codec) == "Jawaban lama ✓"
+    assert decode_text("Jawaban lama", codec) == "Jawaban lama"
+
+
+def test_small_values_are_not_compressed():
+    data = encode_text("ok", CompactCodec())
+    assert data[:2] == b'\xc1m'
+    assert decode_text(data, CompactCodec()) == "ok"
+
+
+def test_dictionary_mismatch_is_detected():
+    with_dict = CompactCodec(_dictionary())
+    data = encode_text(ANSWER, with_dict)
+    assert len(data) < len(encode_text(ANSWER, CompactCodec()))
+    assert decode_text(data, with_dict) == ANSWER
+    with pytest.raises(CodecError):
+        decode_text(data, CompactCodec())
@@ -0,0 +1,62 @@
+# tests/test_compression.py
+import numpy as np
+
+from app.core import main
+
+VOCAB = ["rektor", "dekan", "biaya", "ukt", "wisuda", "alamat", "kampus", "jadwal"]
+
+
+class WordEmbedder:
+    """Embedder tiruan: satu dimensi per kata VOCAB; menghitung teks yang di-encode."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, normalize_embeddings=True, convert_to_numpy=True):
+        self.encoded.extend(texts)
+        vecs = np.array([[t.lower().count(w) for w in VOCAB] for t in texts], dtype=np.float32) + 1e-3
+        return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+
+DOCS = [
+    {"id": "a" * 32, "text": "Kampus berada di Salatiga sejak lama. Biaya UKT ditetapkan per program studi. "
+                             "Jadwal wisuda diumumkan oleh biro akademik."},
+    {"id": "b" * 32, "text": "Rektor memimpin universitas selama empat tahun. Dekan memimpin fakultas. "
+                             "Biaya UKT dibayar sebelum registrasi ulang."},
+]
+
+
+def test_compress_keeps_best_sentences_in_document_order():
+    embedder = WordEmbedder()
+    query_vec = embedder.encode(["biaya ukt"])[0]
+    context = main.compress_context(DOCS, query_vec, embedder, budget_chars=100)
+    assert context == ("Biaya UKT ditetapkan per program studi.\n"
+                       "Biaya UKT dibayar sebelum registrasi ulang.")
+
+    # Kalimat chunk yang sama tidak di-encode ulang
+    encoded = len(embedder.encoded)
+    main.compress_context(DOCS, query_vec, embedder, budget_chars=100)
+    assert len(embedder.encoded) == encoded
+
+
+def test_best_sentence_kept_even_over_budget():
+    embedder = WordEmbedder()
+    query_vec = embedder.encode(["rektor"])[0]
+    assert main.compress_context(DOCS, query_vec, embedder, budget_chars=10) == \
+        "Rektor memimpin universitas selama empat tahun."
+
+
+def test_build_rag_context_only_compresses_long_context(monkeypatch):
+    embedder = WordEmbedder()
+    monkeypatch.setattr(main, 'get_runtime_components', lambda: {'embedder': embedder})
+    monkeypatch.setattr(main.settings.RAG, 'RAG_CONTEXT_COMPRESSION', True)
+    full = "\n".join(doc["text"] for doc in DOCS)
+
+    monkeypatch.setattr(main.settings.RAG, 'RAG_CONTEXT_BUDGET_CHARS', len(full))
+    assert main.build_rag_context("biaya ukt", DOCS) == full
+
+    monkeypatch.setattr(main.settings.RAG, 'RAG_CONTEXT_BUDGET_CHARS', 50)
+    assert main.build_rag_context("jadwal wisuda", DOCS) == "Jadwal wisuda diumumkan oleh biro akademik."
+
+    monkeypatch.setattr(main.settings.RAG, 'RAG_CONTEXT_COMPRESSION', False)
+    assert main.build_rag_context("jadwal wisuda", DOCS) == full
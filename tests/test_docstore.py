@@ -0,0 +1,59 @@
+# tests/test_docstore.py
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from app import rag_initializer as ri
+from app.core.docstore import write_chunks, delete_versions, fetch_chunks, LEGACY_VERSION
+
+
+def _records(*names):
+    return [{"id": f"{i:032x}", "text": name} for i, name in names]
+
+
+def _ids(path):
+    with sqlite3.connect(path) as conn:
+        return sorted(row[0] for row in conn.execute("SELECT id FROM chunks"))
+
+
+def test_prune_removes_only_chunks_unused_by_retained_versions(tmp_path):
+    path = str(tmp_path / "docstore.sqlite3")
+    write_chunks(path, _records((1, "visi"), (2, "rektor lama")), "kb_v1")
+    write_chunks(path, _records((1, "visi"), (3, "rektor baru")), "kb_v2")
+
+    assert delete_versions(path, ["kb_v1"], ["kb_v2"]) == 1
+    assert _ids(path) == [f"{1:032x}", f"{3:032x}"]
+    assert delete_versions(path, ["kb_v1"], ["kb_v2"]) == 0
+
+
+def test_legacy_chunks_dropped_once_every_retained_version_is_tracked(tmp_path):
+    path = str(tmp_path / "docstore.sqlite3")
+    with sqlite3.connect(path) as conn:  # file dari sebelum chunk_versions ada
+        conn.execute("CREATE TABLE chunks (id TEXT PRIMARY KEY, text TEXT NOT NULL, source TEXT, "
+                     "page INTEGER, chunk_index INTEGER) WITHOUT ROWID")
+        conn.execute("INSERT INTO chunks VALUES (?, 'lama', NULL, NULL, NULL)", (f"{9:032x}",))
+    write_chunks(path, _records((1, "visi")), "kb_v2")
+
+    # kb_v1 (slim, sebelum pelacakan) masih disimpan: teks lamanya tidak boleh hilang
+    assert delete_versions(path, [], ["kb_v1", "kb_v2"]) == 0
+    assert delete_versions(path, ["kb_v1"], ["kb_v2"]) == 1
+    assert _ids(path) == [f"{1:032x}"]
+    with sqlite3.connect(path) as conn:
+        assert not conn.execute("SELECT 1 FROM chunk_versions WHERE version = ?", (LEGACY_VERSION,)).fetchall()
+
+
+def test_slim_startup_check_needs_docstore_covering_version(tmp_path, monkeypatch):
+    path = str(tmp_path / "docstore.sqlite3")
+    monkeypatch.setattr(ri.settings.RAG, 'RAG_SLIM_PAYLOAD', True)
+    monkeypatch.setattr(ri.settings.RAG, 'DOCSTORE_PATH', path)
+    client = SimpleNamespace(scroll=lambda **kwargs: ([SimpleNamespace(id=f"{i:032x}") for i in (1, 2)], None))
+
+    with pytest.raises(RuntimeError, match="tidak ada"):
+        ri.check_docstore(client, 'kb_v1')
+    write_chunks(path, _records((1, "visi")), "kb_v1")
+    with pytest.raises(RuntimeError, match="1 dari 2"):
+        ri.check_docstore(client, 'kb_v1')
+    write_chunks(path, _records((2, "misi")), "kb_v1")
+    ri.check_docstore(client, 'kb_v1')
+    assert set(fetch_chunks([f"{1:032x}"], path)) == {f"{1:032x}"}
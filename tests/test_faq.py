@@ -0,0 +1,77 @@
+# tests/test_faq.py
+import json
+
+import numpy as np
+import pytest
+
+from app.core.faq import FAQIndex, load_entries
+from app.utils.text import canonical_text
+
+
+class BagOfWordsEmbedder:
+    """Embedder kecil yang deterministik: kalimat dengan kata yang sama -> cosine 1."""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def encode(self, texts, normalize_embeddings=True, convert_to_numpy=True):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.split():
+                out[i, hash(word) % self.dim] += 1.0
+            out[i] /= np.linalg.norm(out[i]) or 1.0
+        return out
+
+
+ENTRIES = [
+    {"id": "rektor", "questions": ["Siapa rektor UIN Salatiga?"], "answer": "Prof. Dr. Zakiyyudin, M.Ag.", "sources": []},
+    {"id": "ukt", "questions": ["Kapan batas pembayaran UKT?", "Batas bayar UKT kapan?"], "answer": "Lihat kalender akademik.", "sources": []},
+]
+
+
+def test_match_returns_entry_above_threshold():
+    embedder = BagOfWordsEmbedder()
+    index = FAQIndex.build(ENTRIES, embedder)
+    query_vec = embedder.encode(["siapa rektor uin salatiga"])[0]
+    entry, score, variant = index.match("siapa rektor uin salatiga", query_vec, threshold=0.92)
+    assert entry["id"] == "rektor"
+    assert score == pytest.approx(1.0)
+    assert variant == "Siapa rektor UIN Salatiga?"
+
+
+def test_no_match_below_threshold():
+    embedder = BagOfWordsEmbedder()
+    index = FAQIndex.build(ENTRIES, embedder)
+    query_vec = embedder.encode(["siapa dekan fakultas syariah"])[0]
+    assert index.match("siapa dekan fakultas syariah", query_vec, threshold=0.92) is None
+    assert FAQIndex.empty().match("siapa dekan fakultas syariah", query_vec, threshold=0.0) is None
+
+
+def test_different_number_or_foreign_term_is_rejected():
+    embedder = BagOfWordsEmbedder()
+    entries = [
+        {"id": "warek-1", "questions": ["Warek 1 UIN Salatiga siapa?"], "answer": "A", "sources": []},
+        {"id": "warek-2", "questions": ["Warek 2 UIN Salatiga siapa?"], "answer": "B", "sources": []},
+        {"id": "ukt", "questions": ["Kapan batas pembayaran UKT?"], "answer": "C", "sources": []},
+    ]
+    index = FAQIndex.build(entries, embedder)
+    # Anggap embedding menganggap keduanya identik: penjaga kata kunci yang memutuskan
+    warek_2 = embedder.encode([canonical_text("Warek 2 UIN Salatiga siapa?")])[0]
+    assert index.match("Warek 3 UIN Salatiga siapa?", warek_2, threshold=0.92) is None
+    assert index.conflict("Warek 3 UIN Salatiga siapa?", 1) == 'angka berbeda'
+    assert index.match("warek 2 uin salatiga siapa", warek_2, threshold=0.92)[0]["id"] == "warek-2"
+
+    ukt = embedder.encode([canonical_text("Kapan batas pembayaran UKT?")])[0]
+    assert index.match("Kapan batas pembayaran UKT warek?", ukt, threshold=0.5) is None
+
+
+def test_load_entries_validates(tmp_path):
+    path = tmp_path / "faq.jsonl"
+    path.write_text(json.dumps({"questions": ["Apa visi UIN?"], "answer": "Unggul."}) + "\n\n", encoding="utf-8")
+    entries = load_entries(str(path))
+    assert entries[0]["id"] == "faq-1"
+    assert entries[0]["sources"] == []
+
+    path.write_text(json.dumps({"questions": ["Tanpa jawaban"]}) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        load_entries(str(path))
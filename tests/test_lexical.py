@@ -0,0 +1,48 @@
+# tests/test_lexical.py
+from app.core import main
+from app.core.lexical import BM25Index, reciprocal_rank_fusion
+
+DOCS = {
+    "d1": "Nomor dokumen SOP kalender akademik: B-01/In.21/IR.1/HO.00.7/05/2015.",
+    "d2": "SIAKAD dipakai mahasiswa untuk pengisian KRS setiap semester.",
+    "d3": "UKT dibayar setiap semester melalui bank mitra.",
+    "d4": "Visi UIN Salatiga adalah menjadi universitas unggul.",
+}
+
+def _index():
+    return BM25Index.build(list(DOCS), list(DOCS.values()))
+
+def test_bm25_finds_acronym():
+    results = _index().search("Apa itu SIAKAD?", top_k=2)
+    assert results[0][0] == "d2"
+    assert results[0][2] > 0.7
+
+def test_bm25_document_number_and_stem_map():
+    index = _index()
+    assert index.search("SOP B-01/In.21", top_k=1)[0][0] == "d1"
+    # "mahasiswa" dinormalisasi menjadi "mhs" di query maupun dokumen
+    assert index.search("mahasiswa", top_k=1)[0][0] == "d2"
+
+def test_bm25_unknown_terms_lower_match_ratio():
+    ratio = _index().search("UKT beasiswa kipk", top_k=1)[0][2]
+    assert ratio < 0.7
+
+def test_single_term_match_needs_dense_support():
+    doc_id, _, ratio, matched = _index().search("Apa itu SIAKAD?", top_k=1)[0]
+    assert (doc_id, ratio, matched) == ("d2", 1.0, 1)
+    # Satu term cocok dengan rasio 1.0 belum cukup tanpa dukungan skor dense
+    assert not main._is_lexical_match((ratio, matched), dense_score=0.0)
+    assert main._is_lexical_match((ratio, matched), dense_score=0.6)
+    assert main._is_lexical_match(_index().search("SIAKAD KRS", top_k=1)[0][2:], dense_score=0.0)
+    assert not main._is_lexical_match(None, dense_score=0.9)
+
+def test_bm25_save_load_roundtrip(tmp_path):
+    path = str(tmp_path / "kb.bm25.npz")
+    _index().save(path)
+    loaded = BM25Index.load(path)
+    assert loaded.search("UKT", top_k=1) == _index().search("UKT", top_k=1)
+
+def test_reciprocal_rank_fusion_prefers_docs_in_both_lists():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "d"]], k=60)
+    assert fused[0][0] == "c"
+    assert {doc_id for doc_id, _ in fused} == {"a", "b", "c", "d"}
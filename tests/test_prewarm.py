@@ -0,0 +1,102 @@
+# tests/test_prewarm.py
+import json
+import time
+
+import numpy as np
+import pytest
+
+from app.core import prewarm
+from app.core.resilience import UpstreamUnavailable
+
+
+def test_mine_top_queries_groups_surface_variants(tmp_path):
+    log = tmp_path / "traces.jsonl"
+    records = (
+        [{"query": "Siapa rektor UIN Salatiga?"}] * 3
+        + [{"query": "siapa rektor uin salatiga"}] * 2
+        + [{"query": "Kapan wisuda?"}, {"query": "tolong kak, wisuda kpn ya"}]
+        + [{"query": "ok"}, {"name": "chat.health"}]
+    )
+    log.write_text("\n".join(json.dumps(r) for r in records) + "\nbukan json\n", encoding="utf-8")
+    text_log = tmp_path / "queries.txt"
+    text_log.write_text("Kapan wisuda\nKapan wisuda?\n", encoding="utf-8")
+
+    top = prewarm.mine_top_queries([str(log), str(text_log)], top_n=5)
+    assert [(g['query'], g['count']) for g in top] == [("Siapa rektor UIN Salatiga?", 5), ("Kapan wisuda?", 4)]
+    assert top[0]['variants'] == ["Siapa rektor UIN Salatiga?", "siapa rektor uin salatiga"]
+
+
+def test_query_log_counts_every_request(tmp_path, monkeypatch):
+    from app import tracing
+
+    path = str(tmp_path / "queries.jsonl")
+    monkeypatch.setattr(tracing.settings, 'QUERY_LOG_PATH', path)
+    monkeypatch.setattr(tracing.settings, 'TRACE_SAMPLE_RATE', 0.0)
+    for query in ["Kapan wisuda?"] * 4 + ["Siapa rektor UIN Salatiga?"]:
+        tracing.log_query(query, status=200)
+    tracing.get_sink(path).flush()
+    deadline = time.monotonic() + 2
+    while len(list(prewarm.read_query_log(path))) < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    top = prewarm.mine_top_queries([path], top_n=5)
+    assert [(g['query'], g['count']) for g in top] == [("Kapan wisuda?", 4), ("Siapa rektor UIN Salatiga?", 1)]
+
+
+class FakeFAQ:
+    def match(self, query, query_vec, threshold):
+        return ("faq", 1.0, "v") if query_vec[0] == 9 else None
+
+
+@pytest.fixture
+def env(monkeypatch):
+    cache = {}
+    asked = []
+
+    def answer(query, query_vec=None):
+        asked.append(query)
+        if query == "gemini mati":
+            raise UpstreamUnavailable("sirkuit terbuka")
+        return f"jawaban {query}"
+
+    monkeypatch.setattr(prewarm, 'get_active_collection', lambda: 'kb_v1')
+    monkeypatch.setattr(prewarm, 'get_runtime_components', lambda: {'embedder': None})
+    monkeypatch.setattr(prewarm, 'embed_queries',
+                        lambda queries, embedder: np.array([[9.0] if q == "faq" else [0.0] for q in queries]))
+    monkeypatch.setattr(prewarm, 'get_faq_index', lambda: FakeFAQ())
+    monkeypatch.setattr(prewarm, 'has_cached_response', lambda query: query in cache)
+    monkeypatch.setattr(prewarm, 'cache_response', lambda query, answer, ttl: cache.__setitem__(query, answer))
+    monkeypatch.setattr(prewarm, 'answer_query', answer)
+    monkeypatch.setattr(prewarm.settings.RAG, 'FAQ_ENABLED', True)
+    return cache, asked
+
+
+def _group(query, *variants):
+    return {'query': query, 'variants': [query, *variants], 'count': 1}
+
+
+def test_warm_cache_skips_cached_and_faq_and_fills_variants(env, monkeypatch):
+    cache, asked = env
+    monkeypatch.setattr(prewarm.settings, 'CACHE_CANONICAL_KEYS', False)
+    cache["sudah"] = "lama"
+    groups = [_group("rektor", "Rektor?"), _group("sudah"), _group("faq")]
+    stats = prewarm.warm_cache(groups, rate_per_minute=0)
+
+    assert asked == ["rektor"]
+    assert cache == {"sudah": "lama", "rektor": "jawaban rektor", "Rektor?": "jawaban rektor"}
+    assert (stats['warmed'], stats['skipped_cached'], stats['skipped_faq'], stats['state']) == (1, 1, 1, 'finished')
+
+
+def test_warm_cache_writes_one_entry_with_canonical_keys(env, monkeypatch):
+    cache, asked = env
+    monkeypatch.setattr(prewarm.settings, 'CACHE_CANONICAL_KEYS', True)
+    prewarm.warm_cache([_group("rektor", "Rektor?")], rate_per_minute=0)
+    assert cache == {"rektor": "jawaban rektor"}
+
+
+def test_warm_cache_stops_when_gemini_unavailable(env):
+    cache, asked = env
+    stats = prewarm.warm_cache([_group("gemini mati"), _group("berikutnya")], rate_per_minute=0)
+    assert stats['state'] == 'aborted'
+    assert asked == ["gemini mati"]
+    assert cache == {}
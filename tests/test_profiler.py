@@ -0,0 +1,32 @@
+# tests/test_profiler.py
+import time
+import tracemalloc
+
+from app.utils import profiler
+
+
+def test_snapshot_pair_stops_tracing(tmp_path):
+    first = profiler.take_snapshot(str(tmp_path), frames=1)
+    assert first['tracing'] and tracemalloc.is_tracing()
+
+    second = profiler.take_snapshot(str(tmp_path), frames=1)
+    assert second['snapshots'] == 2
+    assert not second['tracing'] and not tracemalloc.is_tracing()
+    assert profiler.diff_snapshots(str(tmp_path), second['pid'])['pid'] == second['pid']
+
+
+def test_unfinished_session_expires(tmp_path):
+    profiler.take_snapshot(str(tmp_path), frames=1, max_seconds=0.05)
+    deadline = time.monotonic() + 2
+    while tracemalloc.is_tracing() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not tracemalloc.is_tracing()
+    assert not profiler.stop_tracing()
+
+
+def test_new_session_discards_old_pair(tmp_path):
+    profiler.take_snapshot(str(tmp_path), frames=1)
+    profiler.take_snapshot(str(tmp_path), frames=1)
+    restarted = profiler.take_snapshot(str(tmp_path), frames=1)
+    assert restarted['snapshots'] == 1
+    assert profiler.stop_tracing()
@@ -0,0 +1,81 @@
+# tests/test_projection.py
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app import rag_initializer as ri
+from app.core import main
+from app.core.projection import EmbeddingProjection
+
+
+def _corpus(n=200, dim=64, rank=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return (rng.normal(size=(n, rank)) @ rng.normal(size=(rank, dim)) + rng.normal(size=dim) * 3).astype(np.float32)
+
+
+def test_projection_preserves_neighbours_and_round_trips(tmp_path):
+    corpus = _corpus()
+    projection = EmbeddingProjection.fit(corpus, 8)
+    assert projection.dim == 8 and projection.source_dim == 64 and projection.explained > 0.95
+
+    path = str(tmp_path / "kb_v1.projection.npz")
+    projection.save(path)
+    projection = EmbeddingProjection.load(path)
+
+    docs = projection.transform(corpus)
+    query = projection.transform(corpus[7] / np.linalg.norm(corpus[7]))  # query ternormalisasi, dokumen tidak
+    assert docs.shape == (200, 8) and query.shape == (8,)
+    assert np.allclose(np.linalg.norm(docs, axis=1), 1.0, atol=1e-5)
+    assert int(np.argmax(docs @ query)) == 7
+
+
+def test_projection_needs_more_chunks_than_dimensions():
+    with pytest.raises(ValueError):
+        EmbeddingProjection.fit(_corpus(n=100), 128)
+    with pytest.raises(ValueError):
+        EmbeddingProjection.fit(_corpus(), 64)
+
+
+def test_search_uses_projected_vector_and_rescoring(monkeypatch):
+    calls = []
+
+    def search(**kwargs):
+        calls.append(kwargs)
+        return [SimpleNamespace(id="a" * 32, score=0.9, payload={"text": "Rektor UIN", "source": "x.pdf"})]
+
+    projection = EmbeddingProjection.fit(_corpus(), 8)
+    monkeypatch.setattr(main, 'get_runtime_components',
+                        lambda: {'qdrant_client': SimpleNamespace(search=search), 'embedder': None})
+    monkeypatch.setattr(main, 'get_active_collection', lambda: 'kb_v1')
+    monkeypatch.setattr(main, 'get_projection', lambda version: projection)
+    monkeypatch.setattr(main.settings.RAG, 'RAG_TOPIC_ROUTING', False)
+    monkeypatch.setattr(main.settings.RAG, 'RAG_HYBRID_RETRIEVAL', False)
+    monkeypatch.setattr(main.settings.RAG, 'RAG_LEAN_RETRIEVAL', True)
+    monkeypatch.setattr(main, 'is_quantized', lambda version: True)  # konfigurasi collection, bukan setting
+
+    query_vec = _corpus()[0]
+    assert main.search_qdrant("siapa rektor", top_k=3, query_vec=query_vec)
+    assert np.allclose(calls[0]['query_vector'], projection.transform(query_vec), atol=1e-6)
+    assert calls[0]['search_params'].quantization.rescore is True
+
+    # Versi lama tanpa kuantisasi: tanpa parameter rescoring walau setting ingestion menyala
+    monkeypatch.setattr(main, 'is_quantized', lambda version: False)
+    monkeypatch.setattr(main.settings.RAG, 'RAG_BINARY_QUANTIZATION', True)
+    main.search_qdrant("siapa rektor", top_k=3, query_vec=query_vec)
+    assert calls[1]['search_params'] is None
+
+
+def test_query_dimension_must_match_collection(monkeypatch):
+    client = SimpleNamespace(get_collection=lambda collection_name: SimpleNamespace(
+        config=SimpleNamespace(params=SimpleNamespace(vectors=SimpleNamespace(size=8)))))
+    embedder = SimpleNamespace(get_sentence_embedding_dimension=lambda: 64)
+    projection = EmbeddingProjection.fit(_corpus(), 8)
+
+    monkeypatch.setattr(ri, 'get_projection', lambda version: projection)
+    assert ri.check_query_dimension(client, 'kb_v1', embedder) == 8
+
+    # Collection 8 dimensi tanpa artefak proyeksi: gagal keras, bukan pencarian kosong
+    monkeypatch.setattr(ri, 'get_projection', lambda version: None)
+    with pytest.raises(RuntimeError, match="projection.npz"):
+        ri.check_query_dimension(client, 'kb_v1', embedder)
@@ -0,0 +1,142 @@
+# tests/test_redis_chaos.py
+"""
+Chaos test: redis-server lokal dimatikan dan dinyalakan ulang di tengah
+pemakaian. Butuh binary redis-server di PATH (dilewati bila tidak ada).
+"""
+import time
+import shutil
+import socket
+import subprocess
+
+import pytest
+import redis
+
+from app import redis_manager as rm
+
+pytestmark = pytest.mark.skipif(shutil.which('redis-server') is None, reason='redis-server tidak tersedia')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class RedisProcess:
+    def __init__(self, port):
+        self.port = port
+        self.proc = None
+
+    def start(self):
+        self.proc = subprocess.Popen(
+            ['redis-server', '--port', str(self.port), '--save', '', '--appendonly', 'no'],
+            stdout=subprocess.DEVNULL,
+        )
+        client = redis.Redis(port=self.port)
+        for _ in range(50):
+            try:
+                client.ping()
+                return
+            except redis.ConnectionError:
+                time.sleep(0.1)
+        raise RuntimeError('redis-server tidak siap')
+
+    def kill(self):
+        self.proc.kill()
+        self.proc.wait()
+
+
+def _wait_until(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.1)
+    return False
+
+
+@pytest.fixture
+def chaos(monkeypatch):
+    server = RedisProcess(_free_port())
+    server.start()
+    conn = rm.RedisConnection(f"redis://127.0.0.1:{server.port}/0", socket_timeout=0.2,
+                              max_backoff=0.5, on_reconnect=rm._reconcile)
+    monkeypatch.setattr(rm, '_connection', conn)
+    for local in (rm._local_kv, rm._local_history, rm._local_limits):
+        local.clear()
+    conn.connect()
+    yield server, conn
+    if server.proc.poll() is None:
+        server.kill()
+
+
+def test_fallback_while_down_and_reconcile_after_restart(chaos):
+    server, conn = chaos
+    rm.save_history('chaos-user', 'sebelum', 'ok')
+    assert conn.available
+
+    server.kill()
+    rm.save_history('chaos-user', 'selama down', 'jawaban lokal')
+    assert not conn.available
+    assert rm.get_history('chaos-user', limit=5)[-1]['user'] == 'selama down'
+
+    rm.cache_search('jadwal wisuda', {'status': 'success', 'results': []}, ttl=60)
+    assert rm.get_cached_search('jadwal wisuda') == {'status': 'success', 'results': []}
+
+    assert not rm.check_rate_limit('chaos-user', max_requests=2)
+    assert not rm.check_rate_limit('chaos-user', max_requests=2)
+    assert rm.check_rate_limit('chaos-user', max_requests=2)
+
+    # Kunci task yang diambil saat down hanya berlaku lokal
+    assert rm.acquire_task_lock('prewarm', ttl=600)
+    rm.set_task_status('prewarm', {'state': 'running'})
+
+    # Perintah saat down tidak menunggu timeout socket
+    start = time.monotonic()
+    for _ in range(100):
+        rm.get_history('chaos-user')
+    assert time.monotonic() - start < 0.5
+
+    server.start()  # data hilang (tanpa persistence): yang tersisa hanya hasil sinkronisasi
+    assert _wait_until(lambda: conn.available)
+    client = redis.Redis(port=server.port, decode_responses=True)
+    assert _wait_until(lambda: client.exists('chat:chaos-user'))
+    assert rm.get_history('chaos-user', limit=5)[-1]['user'] == 'selama down'
+    assert rm.get_cached_search('jadwal wisuda') == {'status': 'success', 'results': []}
+    assert len(rm._local_history) == 0 and len(rm._local_kv) == 0
+    # ...dan tidak dipublikasikan ulang: worker lain tidak tertahan sampai TTL kunci habis
+    assert not client.exists('rag:task:prewarm:lock', 'rag:task:prewarm:status')
+    assert rm.acquire_task_lock('prewarm', ttl=600)
+
+
+def test_reconnects_when_redis_was_down_at_boot(monkeypatch):
+    server = RedisProcess(_free_port())
+    conn = rm.RedisConnection(f"redis://127.0.0.1:{server.port}/0", socket_timeout=0.2, max_backoff=0.5)
+    assert not conn.connect()
+    try:
+        server.start()
+        assert _wait_until(lambda: conn.available)
+    finally:
+        server.kill()
+
+
+def test_response_l1_served_locally_and_invalidated_over_pubsub(chaos, monkeypatch):
+    server, conn = chaos
+    monkeypatch.setattr(rm, 'get_active_collection', lambda: 'kb_v1')
+    client = redis.Redis(port=server.port, decode_responses=True)
+    rm._ensure_invalidation_listener()
+    assert _wait_until(lambda: client.pubsub_numsub(rm.settings.CACHE_INVALIDATION_CHANNEL)[0][1] >= 1)
+    rm.cache_response('siapa rektor', 'Prof. Zakiyyudin', ttl=60)
+
+    # Key Redis dihapus langsung: jawaban tetap dilayani L1 sampai ada invalidasi
+    client.flushdb()
+    assert rm.get_cached_response('siapa rektor') == 'Prof. Zakiyyudin'
+
+    client.publish(rm.settings.CACHE_INVALIDATION_CHANNEL, 'reset')
+    assert _wait_until(lambda: len(rm._response_l1) == 0, timeout=5)
+    assert rm.get_cached_response('siapa rektor') is None
+
+    # Reindex: versi baru tidak melihat entri versi lama
+    rm.cache_response('siapa rektor', 'jawaban v1', ttl=60)
+    monkeypatch.setattr(rm, 'get_active_collection', lambda: 'kb_v2')
+    assert rm.get_cached_response('siapa rektor') is None
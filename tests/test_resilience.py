@@ -0,0 +1,97 @@
+# tests/test_resilience.py
+import time
+
+import pytest
+
+from app.core.resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceeded, UpstreamUnavailable,
+    call_upstream, start_deadline, end_deadline, submit_in_context,
+)
+
+
+def test_breaker_opens_and_half_open_probe():
+    breaker = CircuitBreaker('uji', failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()       # satu probe half-open
+    assert not breaker.allow()   # probe kedua ditolak
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_breaker_fails_fast():
+    breaker = CircuitBreaker('uji', failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    start = time.monotonic()
+    with pytest.raises(CircuitOpenError):
+        call_upstream(breaker, lambda timeout: time.sleep(5), hedge_after=1, default_timeout=10)
+    assert time.monotonic() - start < 0.1
+
+
+def test_hedge_returns_fastest_attempt():
+    calls = []
+
+    def func(timeout):
+        calls.append(timeout)
+        if len(calls) == 1:
+            time.sleep(1.0)
+            return 'lambat'
+        return 'cepat'
+
+    breaker = CircuitBreaker('uji')
+    start = time.monotonic()
+    assert call_upstream(breaker, func, hedge_after=0.05, default_timeout=5) == 'cepat'
+    assert time.monotonic() - start < 0.5
+    assert len(calls) == 2
+
+
+def test_retry_after_failure_then_give_up():
+    breaker = CircuitBreaker('uji', failure_threshold=5)
+
+    def func(timeout):
+        raise RuntimeError('503')
+
+    with pytest.raises(UpstreamUnavailable):
+        call_upstream(breaker, func, hedge_after=1, default_timeout=5, max_attempts=2)
+    assert breaker.failures == 1
+
+
+def test_request_deadline_bounds_call():
+    breaker = CircuitBreaker('uji')
+    token = start_deadline(0.1)
+    try:
+        start = time.monotonic()
+        with pytest.raises(DeadlineExceeded):
+            call_upstream(breaker, lambda timeout: time.sleep(2), hedge_after=1, default_timeout=20)
+        assert time.monotonic() - start < 0.5
+    finally:
+        end_deadline(token)
+
+
+def test_non_failure_error_is_reraised_without_tripping():
+    breaker = CircuitBreaker('uji', failure_threshold=1)
+
+    def func(timeout):
+        raise ValueError('input tidak valid')
+
+    with pytest.raises(ValueError):
+        call_upstream(breaker, func, hedge_after=1, default_timeout=5,
+                      is_failure=lambda e: not isinstance(e, ValueError))
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_nested_calls_do_not_starve_upstream_pool():
+    # Tugas latar yang masing-masing memanggil call_upstream tidak boleh memakan thread percobaannya
+    breaker = CircuitBreaker('uji', failure_threshold=100)
+
+    def outer():
+        time.sleep(0.05)  # semua tugas sudah antre sebelum percobaan pertama dikirim
+        return call_upstream(breaker, lambda timeout: 'ok', hedge_after=1, default_timeout=1)
+
+    futures = [submit_in_context(outer) for _ in range(32)]
+    assert [future.result(timeout=5) for future in futures] == ['ok'] * 32
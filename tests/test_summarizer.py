@@ -0,0 +1,65 @@
+# tests/test_summarizer.py
+import pytest
+
+from app.core import summarizer
+from app.core.summarizer import build_history_context, refresh_summary, unsummarized_turns
+
+
+class FakeStore:
+    """Riwayat & ringkasan dalam memori, terlama dulu seperti get_history."""
+
+    def __init__(self):
+        self.turns = []
+        self.summary = None
+
+    def add_turn(self, i):
+        self.turns.append({'user': f"pertanyaan {i}", 'ai': f"jawaban panjang {i} " * 40, 'ts': 1700000000 + i})
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = FakeStore()
+    monkeypatch.setattr(summarizer, 'get_history', lambda user_id, limit=5: store.turns[-limit:])
+    monkeypatch.setattr(summarizer, 'get_summary', lambda user_id: store.summary)
+    monkeypatch.setattr(summarizer, 'save_summary', lambda user_id, summary: setattr(store, 'summary', summary))
+    monkeypatch.setattr(summarizer.settings, 'SUMMARY_KEEP_TURNS', 2)
+    monkeypatch.setattr(summarizer.settings, 'SUMMARY_TRIGGER_TURNS', 4)
+    return store
+
+
+def _fake_summarize(previous, turns):
+    covered = previous.split(",") if previous else []
+    return ",".join(covered + [t['user'].split()[-1] for t in turns])
+
+
+def test_unsummarized_turns_follow_marker():
+    history = [{'user': f"q{i}", 'ai': "a", 'ts': 100.0 + i} for i in range(5)]
+    summary = {'text': "ringkas", 'until_ts': 102, 'until_user': "q2"}
+    assert [t['user'] for t in unsummarized_turns(history, summary)] == ["q3", "q4"]
+    # Penanda sudah terpangkas dari riwayat: semua giliran dikirim mentah
+    assert len(unsummarized_turns(history, {'text': "x", 'until_ts': 1, 'until_user': "lama"})) == 5
+    assert build_history_context(summary, []) == ""
+
+
+def test_refresh_only_after_trigger_and_keeps_latest_turns(store):
+    for i in range(3):
+        store.add_turn(i)
+    assert refresh_summary("u1", _fake_summarize) is None
+
+    store.add_turn(3)
+    summary = refresh_summary("u1", _fake_summarize)
+    assert summary['text'] == "0,1"
+    assert summary['until_user'] == "pertanyaan 1"
+    assert [t['user'] for t in unsummarized_turns(store.turns, summary)] == ["pertanyaan 2", "pertanyaan 3"]
+
+
+def test_prompt_history_stays_flat_over_long_session(store):
+    sizes = []
+    for i in range(30):
+        store.add_turn(i)
+        history = summarizer.get_history("u1", limit=5)
+        sizes.append(len(build_history_context(store.summary, history)))
+        refresh_summary("u1", _fake_summarize)   # di produksi: di latar setelah respons
+    assert store.summary['text'].split(",") == [str(i) for i in range(28)]
+    # Setelah ringkasan terbentuk, paling banyak 3 giliran mentah ikut terkirim
+    assert max(sizes[5:]) < len(build_history_context(None, store.turns[-5:]))
@@ -0,0 +1,54 @@
+# tests/test_text.py
+import numpy as np
+
+from app.utils.text import canonical_text, canonical_key
+from app import redis_manager
+from app.core import main
+
+
+def test_canonical_forms_merge_slang_fillers_and_stems():
+    assert canonical_text("Gmn cara PENDAFTARAN mahasiswa baru?") == "bagaimana cara daftar mhs baru"
+    assert canonical_text("Tolong kak, kpn pendaftaran dibuka ya?") == "kapan daftar dibuka"
+    assert canonical_key("kapan pendaftaran dibuka") == canonical_key("pendaftaran dibuka kapan??")
+    # Kata tanya tetap membedakan pertanyaan
+    assert canonical_key("kapan pendaftaran dibuka") != canonical_key("berapa biaya pendaftaran")
+    # Query yang seluruhnya basa-basi tidak menjadi string kosong
+    assert canonical_text("Halo kak") == "halo kak"
+    # 'min' bisa berarti 'minimal', bukan sekadar sapaan admin
+    assert canonical_key("syarat ipk min 3") != canonical_key("syarat ipk 3")
+
+
+def test_canonical_key_keeps_order_when_it_matters():
+    assert canonical_key("pindah dari S1 ke S2") != canonical_key("pindah dari S2 ke S1")
+    assert canonical_key("UKT semester 1 tahun 2") != canonical_key("UKT semester 2 tahun 1")
+    assert canonical_key("syarat tidak lulus") == "syarat tidak lulus"
+
+
+def test_cache_keys_share_canonical_entry(monkeypatch):
+    monkeypatch.setattr(redis_manager, '_cache_version', lambda: 'model:kb_v1')
+    monkeypatch.setattr(redis_manager.settings, 'CACHE_CANONICAL_KEYS', True)
+    assert redis_manager._generate_cache_key("Brp biaya UKT?") == redis_manager._generate_cache_key("berapa biaya ukt")
+    assert redis_manager._search_cache_key("Gmn daftar") == redis_manager._search_cache_key("bagaimana pendaftaran")
+
+    monkeypatch.setattr(redis_manager.settings, 'CACHE_CANONICAL_KEYS', False)
+    assert redis_manager._generate_cache_key("Brp biaya UKT?") != redis_manager._generate_cache_key("berapa biaya ukt")
+
+
+class CountingEmbedder:
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, texts, normalize_embeddings=True, convert_to_numpy=True):
+        self.encoded.extend(texts)
+        return np.array([[float(len(text)), 1.0] for text in texts], dtype=np.float32)
+
+
+def test_embedding_cache_keyed_on_canonical_text():
+    embedder = CountingEmbedder()
+    first = main.embed_query("Kpn wisuda?", embedder)
+    vectors = main.embed_queries(["kapan wisuda", "tolong kak kapan wisuda ya", "siapa rektor"], embedder)
+
+    assert embedder.encoded == ["kapan wisuda", "siapa rektor"]
+    assert np.array_equal(vectors[0], first) and np.array_equal(vectors[1], first)
+    vectors[0][0] = -1.0  # hasil boleh diubah pemanggil tanpa merusak cache
+    assert main.embed_query("kapan wisuda", embedder)[0] == first[0]
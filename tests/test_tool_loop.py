@@ -0,0 +1,109 @@
+# tests/test_tool_loop.py
+import time
+from types import SimpleNamespace
+
+from app.core.resilience import CircuitBreaker, call_upstream
+from app.core.tool_loop import run_tool_loop, compact_result, function_calls, execute_calls
+
+
+def _response(parts):
+    return SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=parts))])
+
+
+def _call(name, **args):
+    return SimpleNamespace(function_call=SimpleNamespace(name=name, args=args))
+
+
+def _text(text):
+    return SimpleNamespace(function_call=None, text=text)
+
+
+class FakeModel:
+    """Meminta beberapa pencarian dalam SATU giliran, lalu menjawab setelah ada function_response."""
+
+    def __init__(self, queries, always_call=False):
+        self.queries = queries
+        self.always_call = always_call
+        self.calls = []
+
+    def generate(self, contents, allow_tools):
+        self.calls.append((len(contents), allow_tools))
+        answered = any(c['role'] == 'function' for c in contents)
+        if allow_tools and (self.always_call or not answered):
+            return _response([_call('search_google', query=q) for q in self.queries])
+        return _response([_text("jawaban")])
+
+
+def _slow_search(query):
+    time.sleep(0.2)
+    return {"status": "success", "results": [{"snippet": query * 200, "source_title": "t", "url": "u"}] * 5}
+
+
+def test_multi_call_turn_uses_one_round_trip_and_runs_in_parallel():
+    model = FakeModel(["ukt", "jadwal wisuda", "beasiswa"])
+    contents = [{'role': 'user', 'parts': [{'text': 'pertanyaan'}]}]
+    start = time.monotonic()
+    response, tool_rounds = run_tool_loop(model.generate, contents, {'search_google': _slow_search},
+                                          max_rounds=3, budget_seconds=5)
+    elapsed = time.monotonic() - start
+
+    assert function_calls(response) == []
+    assert tool_rounds == 1
+    assert len(model.calls) == 2          # berurutan satu-per-round akan butuh 4
+    assert elapsed < 0.5                  # tiga pencarian 0,2 detik berjalan bersamaan
+    function_turn = contents[-1]
+    assert function_turn['role'] == 'function'
+    assert len(function_turn['parts']) == 3
+    # Hasil diringkas sebelum masuk riwayat
+    results = function_turn['parts'][0]['function_response']['response']['results']
+    assert len(results) == 3
+    assert len(results[0]['snippet']) <= 301
+
+
+def test_round_cap_forces_text_answer():
+    model = FakeModel(["ukt"], always_call=True)
+    contents = [{'role': 'user', 'parts': [{'text': 'pertanyaan'}]}]
+    response, tool_rounds = run_tool_loop(model.generate, contents, {'search_google': lambda query: {"ok": query}},
+                                          max_rounds=2, budget_seconds=5)
+    assert tool_rounds == 2
+    assert model.calls[-1][1] is False    # ronde terakhir tanpa tool
+    assert len(model.calls) == 4
+    assert function_calls(response) == []
+
+
+def test_unknown_tool_and_duplicate_calls():
+    executed = []
+
+    def search(query):
+        executed.append(query)
+        return {"ok": query}
+
+    model = FakeModel([])
+    model.generate = lambda contents, allow_tools: (
+        _response([_call('search_google', query='a'), _call('search_google', query='a'), _call('hapus_data')])
+        if not any(c['role'] == 'function' for c in contents) else _response([_text("ok")])
+    )
+    contents = [{'role': 'user', 'parts': [{'text': 'x'}]}]
+    run_tool_loop(model.generate, contents, {'search_google': search}, max_rounds=2, budget_seconds=5)
+    assert executed == ['a']
+    responses = [p['function_response']['response'] for p in contents[-1]['parts']]
+    assert responses[0] == responses[1] == {"ok": "a"}
+    assert 'error' in responses[2]
+
+
+def test_parallel_tools_calling_upstream_do_not_deadlock():
+    # Tool memanggil call_upstream; tugas tool tidak boleh berbagi pool dengan percobaan upstream
+    breaker = CircuitBreaker('uji', failure_threshold=100)
+
+    def search_google(query):
+        time.sleep(0.05)
+        return {"status": "success", "query": call_upstream(breaker, lambda timeout: query, hedge_after=1, default_timeout=1)}
+
+    calls = [('search_google', {'query': f"q{i}"}) for i in range(20)]
+    results = execute_calls({'search_google': search_google}, calls, timeout=5)
+    assert [r.get('query') for r in results] == [f"q{i}" for i in range(20)]
+
+
+def test_compact_result():
+    compacted = compact_result({"a": "x" * 1000, "b": list(range(10)), "c": 1}, max_chars=10, max_items=2)
+    assert compacted == {"a": "x" * 10 + "…", "b": [0, 1], "c": 1}
@@ -0,0 +1,64 @@
+# tests/test_topics.py
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.core import main
+from app.core.topics import TopicRouter, categorize_document
+
+
+def test_categorize_document_by_name_then_content():
+    assert categorize_document("SOP PENYUSUNAN SURAT PENDAMPING IJAZAH.pdf") == "sop"
+    assert categorize_document("RENSTRA-LPM-UIN-SALATIGA.pdf") == "renstra"
+    assert categorize_document("Struktur Organisasi Kampus UIN SALATIGA.pdf") == "organisasi"
+    assert categorize_document("SSK-82406.pdf", "Akreditasi Unggul. Peringkat akreditasi oleh BAN-PT, "
+                                                "sertifikat akreditasi, predikat unggul.") == "akreditasi"
+    assert categorize_document("web", "Selamat datang di kampus") == "umum"
+
+
+def _router():
+    categories = ["sop", "sop", "organisasi", "organisasi", "umum"]
+    embeddings = np.array([[1, 0, 0], [0.9, 0.1, 0], [0, 1, 0], [0.1, 0.9, 0], [0, 0, 1]], dtype=np.float32)
+    return TopicRouter.build(categories, embeddings)
+
+
+def test_router_routes_only_when_clear(tmp_path):
+    router = _router()
+    path = str(tmp_path / "kb_v1.topics.npz")
+    router.save(path)
+    router = TopicRouter.load(path)
+
+    assert router.route("apa saja prosedur legalisir", np.array([1.0, 0.0, 0.0]), 0.05, 0.05) == "sop"
+    # Vektor di tengah: kata kunci memutuskan
+    middle = np.array([0.7, 0.7, 0.0])
+    assert router.route("siapa dekan fakultas syariah", middle, 0.05, 0.05) == "organisasi"
+    assert router.route("informasi kampus", middle, 0.05, 0.05) is None
+    # 'umum' tidak pernah dijadikan filter
+    assert router.route("halo", np.array([0.0, 0.0, 1.0]), 0.05, 0.05) is None
+    assert abs(router.share("sop") - 0.4) < 1e-6
+
+
+def test_search_widens_when_partition_has_nothing_relevant(monkeypatch):
+    filters = []
+
+    def search(collection_name, query_vector, limit, with_payload, with_vectors, score_threshold, query_filter,
+               search_params=None):
+        filters.append(query_filter)
+        if query_filter is not None:
+            return []
+        return [SimpleNamespace(id="a" * 32, score=0.9, payload={"text": "Rektor UIN", "source": "x.pdf"})]
+
+    router = _router()
+    monkeypatch.setattr(main, 'get_runtime_components',
+                        lambda: {'qdrant_client': SimpleNamespace(search=search), 'embedder': None})
+    monkeypatch.setattr(main, 'get_active_collection', lambda: 'kb_v1')
+    monkeypatch.setattr(main, 'get_topic_router', lambda version: router)
+    monkeypatch.setattr(main, 'get_projection', lambda version: None)
+    monkeypatch.setattr(main.settings.RAG, 'RAG_TOPIC_ROUTING', True)
+    monkeypatch.setattr(main.settings.RAG, 'RAG_HYBRID_RETRIEVAL', False)
+    monkeypatch.setattr(main.settings.RAG, 'RAG_LEAN_RETRIEVAL', True)
+    monkeypatch.setattr(main.settings.RAG, 'RAG_SLIM_PAYLOAD', False)
+
+    results = main.search_qdrant("siapa rektor", top_k=3, query_vec=np.array([0.0, 1.0, 0.0]))
+    assert [r["text"] for r in results] == ["Rektor UIN"]
+    assert filters[0].must[0].match.value == "organisasi" and filters[1] is None